@@ -25,7 +25,9 @@ import ast
 import logging
 import copy
 import csv
-import warnings
+import itertools
+import os
+import tempfile
 import datetime as dt
 from itertools import zip_longest
 import numpy as np
@@ -34,6 +36,8 @@ import matplotlib.pyplot as plt
 import matplotlib.animation as animation
 import pandas as pd
 import xlsxwriter
+import h5py
+from numba import jit
 from tqdm import tqdm
 
 
@@ -43,10 +47,19 @@ from climada.hazard.tag import Tag as TagHaz
 from climada.entity.exposures.base import INDICATOR_IF, INDICATOR_CENTR
 import climada.util.plot as u_plot
 from climada.util.config import CONFIG
+from climada.util.exceedance import local_exceedance
 from climada.util.constants import DEF_CRS
 
 LOGGER = logging.getLogger(__name__)
 
+CALC_ENGINE = ['column', 'row']
+""" Impact calculation engines. 'column' slices the hazard matrices at the
+exposures centroids, 'row' traverses the hazard rows once per impact function
+and gathers the exposures of each centroid. """
+
+IMP_MAT_ENTRY_BYTES = 16
+""" Bytes per stored impact in the chunks impact matrices (value and index) """
+
 class Impact():
     """Impact definition. Compute from an entity (exposures and impact
     functions) and hazard.
@@ -66,6 +79,8 @@ class Impact():
         unit (str): value unit used (given by exposures unit)
         imp_mat (sparse.csr_matrix): matrix num_events x num_exp with impacts.
             only filled if save_mat is True in calc()
+        exc_imp (np.array): exceedance impact map num_return_periods x num_exp.
+            only filled if return_periods are provided in calc()
     """
 
     def __init__(self):
@@ -83,6 +98,7 @@ class Impact():
         self.aai_agg = 0
         self.unit = ''
         self.imp_mat = []
+        self.exc_imp = np.array([])
 
     def calc_freq_curve(self, return_per=None):
         """Compute impact exceedance frequency curve.
@@ -113,7 +129,9 @@ class Impact():
 
         return ifc
 
-    def calc(self, exposures, impact_funcs, hazard, save_mat=False):
+    def calc(self, exposures, impact_funcs, hazard, save_mat=False,
+             engine=CALC_ENGINE[0], pool=None, mem_budget=None,
+             return_periods=None):
         """Compute impact of an hazard to exposures.
 
         Parameters:
@@ -121,6 +139,19 @@ class Impact():
             impact_funcs (ImpactFuncSet): impact functions
             hazard (Hazard): hazard
             self_mat (bool): self impact matrix: events x exposures
+            engine (str, optional): impact calculation engine, one of
+                CALC_ENGINE. 'row' avoids slicing the hazard matrices by
+                columns, which is faster for large exposures. Default: 'column'
+            pool (pathos.pools, optional): pool of processes or threads where
+                the chunks of exposures are computed. Default: sequential
+            mem_budget (float, optional): memory in bytes available for the
+                impact matrices of the chunks of exposures computed at once.
+                The exposures are further split so that the impact matrix of
+                each chunk approximately fits in mem_budget/number of
+                processes. Default: no limit
+            return_periods (np.array, optional): return periods of the
+                exceedance impact map exc_imp, computed for each chunk of
+                exposures without the need of imp_mat. Default: not computed
 
         Examples:
             Use Entity class:
@@ -197,35 +228,185 @@ class Impact():
         and exposures.cover.max():
             insure_flag = True
 
-        if save_mat:
-            self.imp_mat = sparse.lil_matrix((self.date.size, exposures.value.size))
+        if engine not in CALC_ENGINE:
+            LOGGER.error('Impact calculation engine %s not supported. Use one '
+                         'of %s.', engine, CALC_ENGINE)
+            raise ValueError
 
-        # 3. Loop over exposures according to their impact function
+        # 3. Separate exposures in chunks according to their impact function
+        num_proc = 1
+        if pool:
+            # pathos ProcessPool or ThreadPool
+            num_proc = getattr(pool, 'ncpus', None) or pool.nthreads
+            LOGGER.info('Using %s CPUs.', num_proc)
+        exp_step = int(CONFIG['global']['max_matrix_size']/num_events)
+        if not exp_step:
+            LOGGER.error('Increase max_matrix_size configuration parameter'
+                         ' to > %s', str(num_events))
+            raise ValueError
+        max_nnz = None
+        if mem_budget is not None:
+            max_nnz = max(int(mem_budget / num_proc / IMP_MAT_ENTRY_BYTES), 1)
+        # upper bound of the number of impacts of every exposure
+        exp_nnz = np.bincount(hazard.intensity.indices, minlength=\
+            hazard.intensity.shape[1])[exposures[assign_haz].values]
+        chunks = list()
         tot_exp = 0
         for imp_fun in haz_imp:
             # get indices of all the exposures with this impact function
-            exp_iimp = np.where(exposures[if_haz].values[exp_idx] == imp_fun.id)[0]
+            exp_iimp = exp_idx[exposures[if_haz].values[exp_idx] == imp_fun.id]
             tot_exp += exp_iimp.size
-            exp_step = int(CONFIG['global']['max_matrix_size']/num_events)
-            if not exp_step:
-                LOGGER.error('Increase max_matrix_size configuration parameter'
-                             ' to > %s', str(num_events))
-                raise ValueError
-            # separte in chunks
-            chk = -1
-            for chk in range(int(exp_iimp.size/exp_step)):
-                self._exp_impact( \
-                    exp_idx[exp_iimp[chk*exp_step:(chk+1)*exp_step]],\
-                    exposures, hazard, imp_fun, insure_flag)
-            self._exp_impact(exp_idx[exp_iimp[(chk+1)*exp_step:]],\
-                exposures, hazard, imp_fun, insure_flag)
+            if engine == CALC_ENGINE[1]:
+                # no dense matrices in row engine: one chunk per process
+                exp_splits = np.array_split(exp_iimp, num_proc)
+            else:
+                exp_splits = [exp_iimp[chk:chk+exp_step] for chk \
+                              in range(0, exp_iimp.size, exp_step)]
+            for exp_split in exp_splits:
+                chunks.extend([(exp_chk, imp_fun) for exp_chk in _split_nnz( \
+                    exp_split, exp_nnz[exp_split], max_nnz) if exp_chk.size])
 
         if not tot_exp:
             LOGGER.warning('No impact functions match the exposures.')
+
+        # 4. Compute impact of each chunk, in parallel if pool provided
+        icens = exposures[assign_haz].values
+        values = exposures.value.values
+        deductible = cover = [None] * len(chunks)
+        if insure_flag:
+            deductible = [exposures.deductible.values[exp_chk] for exp_chk, _ in chunks]
+            cover = [exposures.cover.values[exp_chk] for exp_chk, _ in chunks]
+        shared_dir = None
+        if pool and hasattr(pool, 'ncpus'):
+            # processes memory-map the hazard written once, threads share it
+            shared_dir = tempfile.TemporaryDirectory()
+            _write_shared_hazard(shared_dir.name, hazard)
+            chunk_fun = _chunk_impact_shared
+            haz_args = (itertools.repeat(shared_dir.name, len(chunks)),)
+        else:
+            chunk_fun = _chunk_impact
+            haz_args = (itertools.repeat(hazard.intensity, len(chunks)),
+                        itertools.repeat(hazard.fraction, len(chunks)),
+                        itertools.repeat(hazard.frequency, len(chunks)))
+        chk_args = (itertools.repeat(engine, len(chunks)),
+                    [icens[exp_chk] for exp_chk, _ in chunks],
+                    [values[exp_chk] for exp_chk, _ in chunks],
+                    deductible, cover, [imp_fun for _, imp_fun in chunks]) + \
+            haz_args + (itertools.repeat(save_mat, len(chunks)),
+                        itertools.repeat(return_periods, len(chunks)))
+        if pool:
+            chunksize = max(min(len(chunks)//num_proc, 1000), 1)
+            imp_chunks = pool.imap(chunk_fun, *chk_args, chunksize=chunksize)
+        else:
+            imp_chunks = map(chunk_fun, *chk_args)
+
+        # 5. Add partial results in order of the chunks. The impact matrix
+        # of every chunk is written into the final CSR as soon as available
+        if save_mat:
+            imp_buf = _imp_mat_alloc(hazard.intensity, icens[np.concatenate( \
+                [exp_chk for exp_chk, _ in chunks] + [np.array([], int)])], \
+                exposures.value.size)
+        if return_periods is not None:
+            self.exc_imp = np.zeros((np.size(return_periods), exposures.value.size))
+        for (exp_chk, _), (at_event, eai_exp, imp_chk, exc_chk) in \
+        zip(chunks, imp_chunks):
+            self.at_event += at_event
+            self.eai_exp[exp_chk] += eai_exp
+            self.tot_value += np.sum(values[exp_chk])
+            if save_mat:
+                _imp_mat_fill(imp_buf, exp_chk, imp_chk)
+            if return_periods is not None:
+                self.exc_imp[:, exp_chk] = exc_chk
+        if shared_dir is not None:
+            shared_dir.cleanup()
         self.aai_agg = sum(self.at_event * hazard.frequency)
 
         if save_mat:
-            self.imp_mat = self.imp_mat.tocsr()
+            self.imp_mat = _imp_mat_to_csr(imp_buf, (self.date.size, \
+                exposures.value.size))
+
+    def calc_batches(self, exposures, impact_funcs, haz_batches,
+                     imp_mat_file=None, **kwargs):
+        """Compute impact of an hazard given by batches of events with the
+        same centroids, e.g. from Hazard.read_hdf5_batches. Only one batch
+        is held in memory at a time. The impact matrix is not kept in memory,
+        but optionally written batch by batch in an hdf5 file.
+
+        Parameters:
+            exposures (Exposures): exposures
+            impact_funcs (ImpactFuncSet): impact functions
+            haz_batches (iterable(Hazard)): hazards with the events of each
+                batch and the same centroids
+            imp_mat_file (str, optional): hdf5 file where the impact matrix
+                events x exposures is written. Default: not written
+            kwargs (optional): arguments for calc(), e.g. engine, pool. Not
+                save_mat, since the impact matrix is only written to
+                imp_mat_file
+
+        Raises:
+            ValueError
+
+        Examples:
+            >>> haz = Hazard('TC')
+            >>> imp = Impact()
+            >>> imp.calc_batches(exp, funcs, haz.read_hdf5_batches(HAZ_FILE, 10000),
+                                 imp_mat_file='imp_mat.h5')
+            >>> imp_mat = Impact.read_sparse_csr('imp_mat.h5')
+        """
+        if kwargs.get('return_periods') is not None:
+            LOGGER.error('Exceedance impact maps need all the events at once.'
+                         ' Use local_exceedance_imp on the written imp_mat.')
+            raise ValueError
+        if 'save_mat' in kwargs:
+            LOGGER.error('save_mat not accepted: the impact matrix is written'
+                         ' in imp_mat_file.')
+            raise ValueError
+        hf_mat = None
+        if imp_mat_file is not None:
+            LOGGER.info('Writing %s', imp_mat_file)
+            hf_mat = h5py.File(imp_mat_file, 'w')
+        try:
+            if hf_mat is not None:
+                for var_name, var_type in zip(['data', 'indices', 'indptr'], \
+                [float, np.int64, np.int64]):
+                    hf_mat.create_dataset(var_name, data=np.zeros(int( \
+                        var_name == 'indptr'), var_type), maxshape=(None,), chunks=True)
+
+            at_event, event_id, event_name, date, frequency = [], [], [], [], []
+            self.aai_agg = 0
+            for haz in haz_batches:
+                imp_bat = Impact()
+                imp_bat.calc(exposures, impact_funcs, haz, save_mat=hf_mat is not None,
+                             **kwargs)
+                if not event_id:
+                    self.eai_exp = np.zeros(imp_bat.eai_exp.size)
+                self.eai_exp += imp_bat.eai_exp
+                self.aai_agg += imp_bat.aai_agg
+                at_event.append(imp_bat.at_event)
+                event_id.append(imp_bat.event_id)
+                event_name.extend(imp_bat.event_name)
+                date.append(imp_bat.date)
+                frequency.append(imp_bat.frequency)
+                if hf_mat is not None:
+                    _append_hdf5_csr_rows(hf_mat, imp_bat.imp_mat)
+            if not event_id:
+                LOGGER.warning('No hazard events.')
+            else:
+                self.unit = imp_bat.unit
+                self.coord_exp = imp_bat.coord_exp
+                self.crs = imp_bat.crs
+                self.tag = imp_bat.tag
+                self.tot_value = imp_bat.tot_value
+                self.at_event = np.concatenate(at_event)
+                self.event_id = np.concatenate(event_id)
+                self.event_name = event_name
+                self.date = np.concatenate(date)
+                self.frequency = np.concatenate(frequency)
+            if hf_mat is not None:
+                hf_mat.attrs['shape'] = (self.at_event.size, self.eai_exp.size)
+        finally:
+            if hf_mat is not None:
+                hf_mat.close()
 
     def calc_risk_transfer(self, attachment, cover):
         """ Compute traaditional risk transfer over impact. Returns new impact
@@ -544,12 +725,15 @@ class Impact():
             year_set[year] = sum(self.at_event[orig_year == year])
         return year_set
 
-    def local_exceedance_imp(self, return_periods=(25, 50, 100, 250)):
+    def local_exceedance_imp(self, return_periods=(25, 50, 100, 250), pool=None):
         """ Compute exceedance impact map for given return periods.
-        Requires attribute imp_mat.
+        Requires attribute imp_mat. To compute the map without keeping
+        imp_mat, use the return_periods parameter of calc().
 
         Parameters:
             return_periods (np.array): return periods to consider
+            pool (pathos.pools, optional): pool of processes where chunks of
+                exposures are computed. Default: sequential
 
         Returns:
             np.array
@@ -562,24 +746,8 @@ class Impact():
             LOGGER.error('attribute imp_mat is empty. Recalculate Impact'\
                          'instance with parameter save_mat=True')
             return []
-        num_cen = self.imp_mat.shape[1]
-        imp_stats = np.zeros((len(return_periods), num_cen))
-        cen_step = int(CONFIG['global']['max_matrix_size']/self.imp_mat.shape[0])
-        if not cen_step:
-            LOGGER.error('Increase max_matrix_size configuration parameter to'\
-                         ' > %s', str(self.imp_mat.shape[0]))
-            raise ValueError
-        # separte in chunks
-        chk = -1
-        for chk in range(int(num_cen/cen_step)):
-            self._loc_return_imp(np.array(return_periods), \
-                self.imp_mat[:, chk*cen_step:(chk+1)*cen_step].todense(), \
-                imp_stats[:, chk*cen_step:(chk+1)*cen_step])
-        self._loc_return_imp(np.array(return_periods), \
-            self.imp_mat[:, (chk+1)*cen_step:].todense(), \
-            imp_stats[:, (chk+1)*cen_step:])
-
-        return imp_stats
+        return local_exceedance(self.imp_mat, self.frequency, 0,
+                                return_periods, pool)
 
     def plot_rp_imp(self, return_periods=(25, 50, 100, 250),
                     log10_scale=True, smooth=True, axis=None, **kwargs):
@@ -625,7 +793,8 @@ class Impact():
 
     @staticmethod
     def read_sparse_csr(file_name):
-        """ Read imp_mat matrix from numpy's npz format.
+        """ Read imp_mat matrix from numpy's npz format, or from hdf5 format
+        as written by calc_batches.
 
         Parameters:
             file_name (str): file name
@@ -634,6 +803,11 @@ class Impact():
             sparse.csr_matrix
         """
         LOGGER.info('Reading %s', file_name)
+        if h5py.is_hdf5(file_name):
+            with h5py.File(file_name, 'r') as hf_mat:
+                return sparse.csr_matrix((hf_mat['data'][:], \
+                    hf_mat['indices'][:], hf_mat['indptr'][:]), \
+                    shape=hf_mat.attrs['shape'])
         loader = np.load(file_name)
         return sparse.csr_matrix((loader['data'], loader['indices'], loader['indptr']),
                                  shape=loader['shape'])
@@ -814,30 +988,6 @@ class Impact():
 
         return imp_list
 
-    def _loc_return_imp(self, return_periods, imp, exc_imp):
-        """ Compute local exceedence impact for given return period.
-
-        Parameters:
-            return_periods (np.array): return periods to consider
-            cen_pos (int): centroid position
-
-        Returns:
-            np.array
-        """
-        # sorted impacts
-        sort_pos = np.argsort(imp, axis=0)[::-1, :]
-        columns = np.ones(imp.shape, int)
-        columns *= np.arange(columns.shape[1])
-        imp_sort = imp[sort_pos, columns]
-        # cummulative frequency at sorted intensity
-        freq_sort = self.frequency[sort_pos]
-        np.cumsum(freq_sort, axis=0, out=freq_sort)
-
-        for cen_idx in range(imp.shape[1]):
-            exc_imp[:, cen_idx] = self._cen_return_imp(
-                imp_sort[:, cen_idx], freq_sort[:, cen_idx],
-                0, return_periods)
-
     def _exp_impact(self, exp_iimp, exposures, hazard, imp_fun, insure_flag):
         """Compute impact for inpute exposure indexes and impact function.
 
@@ -851,30 +1001,18 @@ class Impact():
         if not exp_iimp.size:
             return
 
-        # get assigned centroids
-        icens = exposures[INDICATOR_CENTR + hazard.tag.haz_type].values[exp_iimp]
-
-        # get affected intensities
-        inten_val = hazard.intensity[:, icens]
-        # get affected fractions
-        fract = hazard.fraction[:, icens]
-        # impact = fraction * mdr * value
-        inten_val.data = imp_fun.calc_mdr(inten_val.data)
-        impact = fract.multiply(inten_val).multiply(exposures.value.values[exp_iimp])
-
-        if insure_flag and impact.nonzero()[0].size:
-            inten_val = hazard.intensity[:, icens].todense()
-            paa = np.interp(inten_val, imp_fun.intensity, imp_fun.paa)
-            impact = np.minimum(np.maximum(impact - \
-                exposures.deductible.values[exp_iimp] * paa, 0), \
-                exposures.cover.values[exp_iimp])
-            self.eai_exp[exp_iimp] += np.sum(np.asarray(impact) * \
-                hazard.frequency.reshape(-1, 1), axis=0)
-        else:
-            self.eai_exp[exp_iimp] += np.squeeze(np.asarray(np.sum( \
-                impact.multiply(hazard.frequency.reshape(-1, 1)), axis=0)))
-
-        self.at_event += np.squeeze(np.asarray(np.sum(impact, axis=1)))
+        deductible = cover = None
+        if insure_flag:
+            deductible = exposures.deductible.values[exp_iimp]
+            cover = exposures.cover.values[exp_iimp]
+        at_event, eai_exp, impact = _chunk_impact_cols( \
+            exposures[INDICATOR_CENTR + hazard.tag.haz_type].values[exp_iimp], \
+            exposures.value.values[exp_iimp], deductible, cover, imp_fun, \
+            hazard.intensity, hazard.fraction, hazard.frequency, \
+            not isinstance(self.imp_mat, list))
+
+        self.eai_exp[exp_iimp] += eai_exp
+        self.at_event += at_event
         self.tot_value += np.sum(exposures.value.values[exp_iimp])
         if not isinstance(self.imp_mat, list):
             self.imp_mat[:, exp_iimp] = impact
@@ -908,37 +1046,370 @@ class Impact():
         impact_csr_exp.meta = None
         return impact_csr_exp
 
-    @staticmethod
-    def _cen_return_imp(imp, freq, imp_th, return_periods):
-        """From ordered impact and cummulative frequency at centroid, get
-        exceedance impact at input return periods.
+def _chunk_impact(engine, icens, values, deductible, cover, imp_fun,
+                  intensity, fraction, frequency, save_mat, return_periods=None):
+    """ Compute impact of a chunk of exposures with the same impact function.
+
+    Parameters:
+        engine (str): impact calculation engine, one of CALC_ENGINE
+        icens (np.array): centroid assigned to each exposure
+        values (np.array): value of each exposure
+        deductible (np.array): deductible of each exposure. None if no
+            deductible and cover are applied
+        cover (np.array): cover of each exposure. None if no deductible and
+            cover are applied
+        imp_fun (ImpactFunc): impact function instance
+        intensity (sparse.csr_matrix): hazard intensity
+        fraction (sparse.csr_matrix): hazard fraction
+        frequency (np.array): hazard frequency
+        save_mat (bool): return impact matrix of the chunk
+        return_periods (np.array, optional): return periods of the exceedance
+            impact of each exposure. Default: not computed
+
+    Returns:
+        np.array (impact per event), np.array (expected annual impact per
+        exposure), sparse.csr_matrix (num_events x num_exposures) if save_mat
+        or None otherwise, np.array (num_return_periods x num_exposures) if
+        return_periods or None otherwise
+    """
+    need_mat = save_mat or return_periods is not None
+    if engine == CALC_ENGINE[1]:
+        at_event, eai_exp, impact = _chunk_impact_rows(icens, values, \
+            deductible, cover, imp_fun, intensity, fraction, frequency, need_mat)
+    else:
+        at_event, eai_exp, impact = _chunk_impact_cols(icens, values, \
+            deductible, cover, imp_fun, intensity, fraction, frequency, need_mat)
+
+    exc_imp = None
+    if return_periods is not None:
+        exc_imp = local_exceedance(impact, frequency, 0, return_periods)
+    if not save_mat:
+        impact = None
+    return at_event, eai_exp, impact, exc_imp
+
+def _write_shared_hazard(shared_dir, hazard):
+    """ Write the intensity, fraction and frequency of the hazard to be read
+    by other processes with _read_shared_hazard.
+
+    Parameters:
+        shared_dir (str): existing directory where the files are written
+        hazard (Hazard): hazard
+    """
+    for var_name in ('intensity', 'fraction'):
+        var_mat = sparse.csr_matrix(getattr(hazard, var_name))
+        for arr_name in ('data', 'indices', 'indptr'):
+            np.save(os.path.join(shared_dir, '%s_%s.npy' % (var_name, arr_name)),
+                    getattr(var_mat, arr_name))
+        np.save(os.path.join(shared_dir, '%s_shape.npy' % var_name),
+                np.array(var_mat.shape))
+    np.save(os.path.join(shared_dir, 'frequency.npy'), hazard.frequency)
+
+_SHARED_HAZARD = dict()
+""" Hazard read by the current process with _read_shared_hazard """
+
+def _read_shared_hazard(shared_dir):
+    """ Read the hazard written with _write_shared_hazard. The arrays are
+    memory-mapped and read only once per process. They are mapped copy on
+    write: writeable arrays keep the signatures already compiled by numba.
+
+    Parameters:
+        shared_dir (str): directory of the files
+
+    Returns:
+        sparse.csr_matrix (intensity), sparse.csr_matrix (fraction),
+        np.array (frequency)
+    """
+    if shared_dir not in _SHARED_HAZARD:
+        _SHARED_HAZARD.clear()
+        haz_vars = list()
+        for var_name in ('intensity', 'fraction'):
+            var_arr = [np.asarray(np.load(os.path.join(shared_dir, '%s_%s.npy' % \
+                (var_name, arr_name)), mmap_mode='c')) for arr_name in \
+                ('data', 'indices', 'indptr')]
+            haz_vars.append(sparse.csr_matrix(tuple(var_arr), shape=tuple( \
+                np.load(os.path.join(shared_dir, '%s_shape.npy' % var_name)))))
+        haz_vars.append(np.asarray(np.load(os.path.join(shared_dir, 'frequency.npy'),
+                                           mmap_mode='c')))
+        _SHARED_HAZARD[shared_dir] = tuple(haz_vars)
+    return _SHARED_HAZARD[shared_dir]
+
+def _chunk_impact_shared(engine, icens, values, deductible, cover, imp_fun,
+                         shared_dir, save_mat, return_periods=None):
+    """ _chunk_impact with the hazard written in shared_dir. """
+    intensity, fraction, frequency = _read_shared_hazard(shared_dir)
+    return _chunk_impact(engine, icens, values, deductible, cover, imp_fun,
+                         intensity, fraction, frequency, save_mat, return_periods)
+
+def _chunk_impact_cols(icens, values, deductible, cover, imp_fun, intensity,
+                       fraction, frequency, save_mat):
+    """ Compute impact of a chunk of exposures with the same impact function
+    slicing the columns of the hazard at the exposures centroids. Parameters
+    as in _chunk_impact.
+
+    Returns:
+        np.array (impact per event), np.array (expected annual impact per
+        exposure), sparse.csr_matrix (num_events x num_exposures) if save_mat
+        or None otherwise
+    """
+    # get affected intensities
+    inten_val = intensity[:, icens]
+    # get affected fractions
+    fract = fraction[:, icens]
+    # impact = fraction * mdr * value
+    inten_val.data = imp_fun.calc_mdr(inten_val.data)
+    impact = fract.multiply(inten_val).multiply(values)
+
+    if deductible is not None and impact.nonzero()[0].size:
+        inten_val = intensity[:, icens].todense()
+        paa = np.interp(inten_val, imp_fun.intensity, imp_fun.paa)
+        impact = np.minimum(np.maximum(impact - deductible * paa, 0), cover)
+        eai_exp = np.sum(np.asarray(impact) * frequency.reshape(-1, 1), axis=0)
+    else:
+        eai_exp = np.squeeze(np.asarray(np.sum( \
+            impact.multiply(frequency.reshape(-1, 1)), axis=0)))
+
+    at_event = np.squeeze(np.asarray(np.sum(impact, axis=1)))
+    if not save_mat:
+        return at_event, eai_exp, None
+    return at_event, eai_exp, sparse.csr_matrix(impact)
+
+def _chunk_impact_rows(icens, values, deductible, cover, imp_fun, intensity,
+                       fraction, frequency, save_mat):
+    """ Compute impact of a chunk of exposures with the same impact function
+    traversing the rows of the hazard intensity. The exposures at each
+    centroid are gathered, so that the impact function is evaluated once per
+    nonzero intensity and no column of the hazard is sliced. Parameters and
+    returned values as in _chunk_impact_cols. """
+    # exposures of each centroid: exp_cen[cen_ptr[icen]:cen_ptr[icen+1]]
+    num_cen = intensity.shape[1]
+    exp_cen = np.argsort(icens, kind='stable')
+    cen_ptr = np.zeros(num_cen + 1, int)
+    np.cumsum(np.bincount(icens, minlength=num_cen), out=cen_ptr[1:])
+
+    # impact function evaluated at the intensities of exposed centroids
+    exposed = (cen_ptr[1:] > cen_ptr[:-1])[intensity.indices]
+    mdr = np.zeros(intensity.data.size)
+    mdr[exposed] = imp_fun.calc_mdr(intensity.data[exposed])
+    fract = _fraction_at_intensity(intensity, fraction)
+
+    insure_flag = deductible is not None
+    if insure_flag:
+        paa = np.zeros(intensity.data.size)
+        paa[exposed] = np.interp(intensity.data[exposed], imp_fun.intensity,
+                                 imp_fun.paa)
+        deductible = deductible.astype(float)
+        cover = cover.astype(float)
+    else:
+        paa = deductible = cover = np.zeros(0)
+
+    num_imp = np.sum(np.diff(cen_ptr)[intensity.indices[mdr != 0]]) if save_mat else 0
+    at_event = np.zeros(intensity.shape[0])
+    eai_exp = np.zeros(values.size)
+    imp_rows, imp_cols, imp_vals = np.zeros(num_imp, int), \
+        np.zeros(num_imp, int), np.zeros(num_imp)
+    num_imp = _impact_rows(intensity.indptr, intensity.indices, mdr, fract,
+                           cen_ptr, exp_cen, values.astype(float),
+                           frequency.astype(float), insure_flag, paa,
+                           deductible, cover, at_event, eai_exp, save_mat,
+                           imp_rows, imp_cols, imp_vals)
+    if not save_mat:
+        return at_event, eai_exp, None
+    return at_event, eai_exp, sparse.csr_matrix((imp_vals[:num_imp], \
+        (imp_rows[:num_imp], imp_cols[:num_imp])), shape=(at_event.size, values.size))
+
+def _split_nnz(exp_iimp, exp_nnz, max_nnz):
+    """ Split exposures in consecutive chunks with approximately at most
+    max_nnz impacts each.
+
+    Parameters:
+        exp_iimp (np.array): exposures indexes
+        exp_nnz (np.array): upper bound of the number of impacts of each
+            exposure
+        max_nnz (int): maximum number of impacts per chunk. None for no split
+
+    Returns:
+        list(np.array)
+    """
+    if max_nnz is None or not exp_iimp.size:
+        return [exp_iimp]
+    cum_chk = np.cumsum(exp_nnz) // max_nnz
+    return np.split(exp_iimp, np.flatnonzero(np.diff(cum_chk)) + 1)
+
+def _imp_mat_alloc(intensity, icens, num_exp):
+    """ Allocate the CSR arrays of the impact matrix with enough room in each
+    event for all the exposures at its nonzero intensities.
+
+    Parameters:
+        intensity (sparse.csr_matrix): hazard intensity
+        icens (np.array): centroid of every exposure to compute
+        num_exp (int): total number of exposures
+
+    Returns:
+        dict with CSR row pointers ('indptr'), next free position of every
+        row ('fill'), column indices ('indices') and values ('data')
+    """
+    exp_cen = np.bincount(icens, minlength=intensity.shape[1])
+    row_cap = np.add.reduceat(np.append(exp_cen[intensity.indices], 0),
+                              intensity.indptr[:-1])
+    row_cap[np.diff(intensity.indptr) == 0] = 0
+    num_cap = int(np.sum(row_cap))
+    LOGGER.debug('Allocating impact matrix of at most %s values.', num_cap)
+    idx_type = np.int32 if max(num_cap, num_exp) < np.iinfo(np.int32).max \
+        else np.int64
+    indptr = np.zeros(row_cap.size + 1, idx_type)
+    np.cumsum(row_cap, out=indptr[1:])
+    return {'indptr': indptr, 'fill': indptr[:-1].copy(),
+            'indices': np.empty(num_cap, idx_type),
+            'data': np.empty(num_cap)}
+
+def _imp_mat_fill(imp_buf, exp_chk, imp_chk):
+    """ Write the impact matrix of a chunk of exposures in the allocated
+    impact matrix.
+
+    Parameters:
+        imp_buf (dict): CSR arrays from _imp_mat_alloc, filled
+        exp_chk (np.array): exposures indexes of the chunk
+        imp_chk (sparse.csr_matrix): impact matrix of the chunk
+    """
+    imp_chk = imp_chk.tocsr()
+    _fill_csr_rows(imp_chk.indptr, imp_chk.indices, imp_chk.data, exp_chk,
+                   imp_buf['fill'], imp_buf['indices'], imp_buf['data'])
 
-        Parameters:
-            imp (np.array): sorted impact at centroid
-            freq (np.array): cummulative frequency at centroid
-            imp_th (float): impact threshold
-            return_periods (np.array): return periods
+def _imp_mat_to_csr(imp_buf, shape):
+    """ Remove the unused room of the allocated impact matrix and build the
+    CSR matrix without copying its arrays.
 
-        Returns:
-            np.array
-        """
-        imp_th = np.asarray(imp > imp_th).squeeze()
-        imp_cen = imp[imp_th]
-        freq_cen = freq[imp_th]
-        if not imp_cen.size:
-            return np.zeros((return_periods.size,))
-        try:
-            with warnings.catch_warnings():
-                warnings.simplefilter("ignore")
-                pol_coef = np.polyfit(np.log(freq_cen), imp_cen, deg=1)
-        except ValueError:
-            pol_coef = np.polyfit(np.log(freq_cen), imp_cen, deg=0)
-        imp_fit = np.polyval(pol_coef, np.log(1/return_periods))
-        wrong_inten = np.logical_and(return_periods > np.max(1/freq_cen), \
-                np.isnan(imp_fit))
-        imp_fit[wrong_inten] = 0.
-
-        return imp_fit
+    Parameters:
+        imp_buf (dict): CSR arrays from _imp_mat_alloc, filled
+        shape (tuple): shape of the impact matrix
+
+    Returns:
+        sparse.csr_matrix
+    """
+    indptr, indices, data = imp_buf['indptr'], imp_buf['indices'], imp_buf['data']
+    num_imp = _compact_csr_rows(indptr, imp_buf['fill'], indices, data)
+    imp_buf.clear()
+    indices.resize(num_imp, refcheck=False)
+    data.resize(num_imp, refcheck=False)
+    imp_mat = sparse.csr_matrix((data, indices, indptr), shape=shape, copy=False)
+    imp_mat.sort_indices()
+    return imp_mat
+
+def _append_hdf5_csr_rows(hf_csr, mat):
+    """ Append the rows of a CSR matrix to the CSR data, indices and indptr
+    datasets of an hdf5 file.
+
+    Parameters:
+        hf_csr (h5py.File or h5py.Group): resizable CSR datasets
+        mat (sparse.csr_matrix): rows to append
+    """
+    num_val = hf_csr['data'].size
+    num_row = hf_csr['indptr'].size
+    hf_csr['data'].resize((num_val + mat.nnz,))
+    hf_csr['data'][num_val:] = mat.data
+    hf_csr['indices'].resize((num_val + mat.nnz,))
+    hf_csr['indices'][num_val:] = mat.indices
+    hf_csr['indptr'].resize((num_row + mat.shape[0],))
+    hf_csr['indptr'][num_row:] = mat.indptr[1:].astype(np.int64) + num_val
+
+@jit(nopython=True, nogil=True)
+def _fill_csr_rows(indptr, indices, data, cols, fill, out_indices, out_data):
+    """ Append the nonzero values of each row of a CSR matrix to the rows of
+    the output, mapping its columns with cols. """
+    for i_row in range(indptr.size - 1):
+        pos = fill[i_row]
+        for i_val in range(indptr[i_row], indptr[i_row+1]):
+            if data[i_val] != 0:
+                out_indices[pos] = cols[indices[i_val]]
+                out_data[pos] = data[i_val]
+                pos += 1
+        fill[i_row] = pos
+
+@jit(nopython=True, nogil=True)
+def _compact_csr_rows(indptr, fill, indices, data):
+    """ Move the filled values of every row next to the previous row and
+    update indptr in place. Returns the number of values. """
+    num_val = 0
+    for i_row in range(indptr.size - 1):
+        row_start = indptr[i_row]
+        indptr[i_row] = num_val
+        for i_val in range(row_start, fill[i_row]):
+            indices[num_val] = indices[i_val]
+            data[num_val] = data[i_val]
+            num_val += 1
+    indptr[indptr.size - 1] = num_val
+    return num_val
+
+def _fraction_at_intensity(intensity, fraction):
+    """ Fraction values at the stored entries of the hazard intensity.
+
+    Parameters:
+        intensity (sparse.csr_matrix): hazard intensity
+        fraction (sparse.csr_matrix): hazard fraction
+
+    Returns:
+        np.array of the size of intensity.data
+    """
+    if np.array_equal(intensity.indptr, fraction.indptr) and \
+    np.array_equal(intensity.indices, fraction.indices):
+        return fraction.data.astype(float)
+    rows = np.repeat(np.arange(intensity.shape[0]), np.diff(intensity.indptr))
+    return np.asarray(fraction[rows, intensity.indices.copy()], dtype=float).reshape(-1)
+
+@jit(nopython=True, nogil=True)
+def _impact_rows(indptr, indices, mdr, fract, cen_ptr, exp_cen, values,
+                 frequency, insure_flag, paa, deductible, cover, at_event,
+                 eai_exp, save_mat, imp_rows, imp_cols, imp_vals):
+    """ Accumulate impact per event and expected annual impact per exposure
+    traversing the CSR rows of the hazard intensity.
+
+    Parameters:
+        indptr (np.array): CSR row pointers of the intensity
+        indices (np.array): CSR column indices of the intensity
+        mdr (np.array): mean damage ratio at each intensity entry
+        fract (np.array): fraction at each intensity entry
+        cen_ptr (np.array): pointers of each centroid in exp_cen
+        exp_cen (np.array): exposures positions sorted by centroid
+        values (np.array): value of every exposure
+        frequency (np.array): frequency of every event
+        insure_flag (bool): consider deductible and cover of exposures
+        paa (np.array): percentage of affected assets at each intensity entry
+        deductible (np.array): deductible of every exposure
+        cover (np.array): cover of every exposure
+        at_event (np.array): impact per event, filled
+        eai_exp (np.array): expected annual impact per exposure, filled
+        save_mat (bool): fill imp_rows, imp_cols and imp_vals
+        imp_rows (np.array): event of every nonzero impact, filled
+        imp_cols (np.array): exposure of every nonzero impact, filled
+        imp_vals (np.array): nonzero impacts, filled
+
+    Returns:
+        int: number of nonzero impacts filled
+    """
+    num_imp = 0
+    for i_ev in range(indptr.size - 1):
+        ev_imp = 0.
+        for i_val in range(indptr[i_ev], indptr[i_ev+1]):
+            if mdr[i_val] == 0:
+                continue
+            mdr_frac = fract[i_val] * mdr[i_val]
+            i_cen = indices[i_val]
+            for i_exp in exp_cen[cen_ptr[i_cen]:cen_ptr[i_cen+1]]:
+                imp = mdr_frac * values[i_exp]
+                if insure_flag:
+                    imp = min(max(imp - deductible[i_exp] * paa[i_val], 0.),
+                              cover[i_exp])
+                if imp == 0:
+                    continue
+                ev_imp += imp
+                eai_exp[i_exp] += imp * frequency[i_ev]
+                if save_mat:
+                    imp_rows[num_imp] = i_ev
+                    imp_cols[num_imp] = i_exp
+                    imp_vals[num_imp] = imp
+                    num_imp += 1
+        at_event[i_ev] += ev_imp
+    return num_imp
 
 class ImpactFreqCurve():
     """ Impact exceedence frequency curve.
@@ -19,9 +19,11 @@ with CLIMADA. If not, see <https://www.gnu.org/licenses/>.
 Test Impact class.
 """
 import os
+import tempfile
 import unittest
 import numpy as np
 from scipy import sparse
+import h5py
 
 from climada.entity.tag import Tag
 from climada.hazard.tag import Tag as TagHaz
@@ -242,6 +244,151 @@ class TestCalc(unittest.TestCase):
         self.assertTrue(np.allclose(np.array(np.sum(np.multiply(impact.imp_mat.todense(),
             impact.frequency.reshape(-1, 1)), axis=0)).reshape(-1), impact.eai_exp))
 
+    def test_calc_row_engine_pass(self):
+        """ Test row engine against default column engine """
+        ent = Entity()
+        ent.read_excel(ENT_DEMO_TODAY)
+        ent.check()
+
+        hazard = Hazard('TC')
+        hazard.read_mat(HAZ_TEST_MAT)
+        ent.exposures.assign_centroids(hazard)
+
+        imp_col = Impact()
+        imp_col.calc(ent.exposures, ent.impact_funcs, hazard, save_mat=True)
+        imp_row = Impact()
+        imp_row.calc(ent.exposures, ent.impact_funcs, hazard, save_mat=True,
+                     engine='row')
+
+        self.assertTrue(np.allclose(imp_col.at_event, imp_row.at_event))
+        self.assertTrue(np.allclose(imp_col.eai_exp, imp_row.eai_exp))
+        self.assertAlmostEqual(imp_col.aai_agg, imp_row.aai_agg, 3)
+        self.assertEqual(imp_col.tot_value, imp_row.tot_value)
+        self.assertTrue(isinstance(imp_row.imp_mat, sparse.csr_matrix))
+        self.assertEqual(imp_row.imp_mat.shape, imp_col.imp_mat.shape)
+        self.assertEqual((imp_col.imp_mat != imp_row.imp_mat).nnz, 0)
+
+    def test_calc_pool_pass(self):
+        """ Test parallel computation equals sequential computation """
+        from pathos.pools import ProcessPool as Pool
+        ent = Entity()
+        ent.read_excel(ENT_DEMO_TODAY)
+        ent.check()
+
+        hazard = Hazard('TC')
+        hazard.read_mat(HAZ_TEST_MAT)
+        ent.exposures.assign_centroids(hazard)
+
+        imp_seq = Impact()
+        imp_seq.calc(ent.exposures, ent.impact_funcs, hazard, save_mat=True)
+        imp_row = Impact()
+        imp_row.calc(ent.exposures, ent.impact_funcs, hazard, save_mat=True,
+                     engine='row', return_periods=(10, 40))
+        pool = Pool()
+        imp_par = Impact()
+        imp_par.calc(ent.exposures, ent.impact_funcs, hazard, save_mat=True,
+                     pool=pool)
+        imp_par_row = Impact()
+        imp_par_row.calc(ent.exposures, ent.impact_funcs, hazard, save_mat=True,
+                         engine='row', return_periods=(10, 40), pool=pool)
+        pool.close()
+        pool.join()
+
+        self.assertTrue(np.array_equal(imp_seq.at_event, imp_par.at_event))
+        self.assertTrue(np.array_equal(imp_seq.eai_exp, imp_par.eai_exp))
+        self.assertEqual(imp_seq.aai_agg, imp_par.aai_agg)
+        self.assertEqual(imp_seq.tot_value, imp_par.tot_value)
+        self.assertEqual((imp_seq.imp_mat != imp_par.imp_mat).nnz, 0)
+        self.assertTrue(np.array_equal(imp_row.at_event, imp_par_row.at_event))
+        self.assertTrue(np.array_equal(imp_row.eai_exp, imp_par_row.eai_exp))
+        self.assertTrue(np.array_equal(imp_row.exc_imp, imp_par_row.exc_imp))
+        self.assertEqual((imp_row.imp_mat != imp_par_row.imp_mat).nnz, 0)
+
+    def test_calc_mem_budget_pass(self):
+        """ Test small chunks by memory budget give the same impact matrix """
+        ent = Entity()
+        ent.read_excel(ENT_DEMO_TODAY)
+        ent.check()
+
+        hazard = Hazard('TC')
+        hazard.read_mat(HAZ_TEST_MAT)
+        ent.exposures.assign_centroids(hazard)
+
+        impact = Impact()
+        impact.calc(ent.exposures, ent.impact_funcs, hazard, save_mat=True)
+        imp_bud = Impact()
+        imp_bud.calc(ent.exposures, ent.impact_funcs, hazard, save_mat=True,
+                     mem_budget=1.0e5)
+
+        self.assertTrue(np.allclose(impact.at_event, imp_bud.at_event))
+        self.assertTrue(np.allclose(impact.eai_exp, imp_bud.eai_exp))
+        self.assertTrue(imp_bud.imp_mat.has_sorted_indices)
+        self.assertEqual(imp_bud.imp_mat.nnz, impact.imp_mat.nnz)
+        self.assertTrue(np.allclose(impact.imp_mat.data, imp_bud.imp_mat.data))
+        self.assertTrue(np.array_equal(impact.imp_mat.indices,
+                                       imp_bud.imp_mat.indices))
+
+    def test_calc_batches_pass(self):
+        """ Test impact by batches of events equals impact of all events """
+        ent = Entity()
+        ent.read_excel(ENT_DEMO_TODAY)
+        ent.check()
+
+        hazard = Hazard('TC')
+        hazard.read_mat(HAZ_TEST_MAT)
+        hazard.event_name = list(map(str, hazard.event_name))
+        ent.exposures.assign_centroids(hazard)
+        tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp_dir.cleanup)
+        haz_file = os.path.join(tmp_dir.name, 'test_haz_batches.h5')
+        hazard.write_hdf5(haz_file)
+        mat_file = os.path.join(tmp_dir.name, 'test_imp_mat.h5')
+
+        impact = Impact()
+        impact.calc(ent.exposures, ent.impact_funcs, hazard, save_mat=True)
+        imp_bat = Impact()
+        imp_bat.calc_batches(ent.exposures, ent.impact_funcs,
+                             Hazard('TC').read_hdf5_batches(haz_file, 3000),
+                             imp_mat_file=mat_file)
+        imp_mat = Impact.read_sparse_csr(mat_file)
+
+        self.assertTrue(np.array_equal(impact.event_id, imp_bat.event_id))
+        self.assertEqual(impact.event_name, imp_bat.event_name)
+        self.assertTrue(np.allclose(impact.at_event, imp_bat.at_event))
+        self.assertTrue(np.allclose(impact.eai_exp, imp_bat.eai_exp))
+        self.assertAlmostEqual(impact.aai_agg, imp_bat.aai_agg, 3)
+        self.assertEqual(impact.tot_value, imp_bat.tot_value)
+        self.assertEqual(imp_mat.shape, impact.imp_mat.shape)
+        self.assertTrue(np.allclose(imp_mat.todense(), impact.imp_mat.todense()))
+
+    def test_calc_batches_fail(self):
+        """ Test impact by batches with wrong arguments or failing batch """
+        ent = Entity()
+        ent.read_excel(ENT_DEMO_TODAY)
+        ent.check()
+
+        hazard = Hazard('TC')
+        hazard.read_mat(HAZ_TEST_MAT)
+        ent.exposures.assign_centroids(hazard)
+        tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp_dir.cleanup)
+        mat_file = os.path.join(tmp_dir.name, 'test_imp_mat.h5')
+
+        with self.assertLogs('climada.engine.impact', level='ERROR') as cm:
+            with self.assertRaises(ValueError):
+                Impact().calc_batches(ent.exposures, ent.impact_funcs, [hazard],
+                                      imp_mat_file=mat_file, save_mat=True)
+        self.assertIn('save_mat not accepted', cm.output[0])
+
+        def haz_batches():
+            yield hazard
+            raise ValueError
+        with self.assertRaises(ValueError):
+            Impact().calc_batches(ent.exposures, ent.impact_funcs, haz_batches(),
+                                  imp_mat_file=mat_file)
+        # the file is closed and can be written again
+        h5py.File(mat_file, 'w').close()
+
     def test_calc_if_pass(self):
         """ Execute when no if_HAZ present, but only if_ """
         ent = Entity()
@@ -496,6 +643,33 @@ class TestRPmatrix(unittest.TestCase):
         self.assertAlmostEqual(np.max(impact_rp), 2916964966.388219, places=5)
         self.assertAlmostEqual(np.min(impact_rp), 444457580.131494, places=5)
 
+    def test_local_exceedance_calc_pass(self):
+        """ Test local impacts per return period computed in calc """
+        from pathos.pools import ProcessPool as Pool
+        ent = Entity()
+        ent.read_excel(ENT_DEMO_TODAY)
+        ent.check()
+
+        hazard = Hazard('TC')
+        hazard.read_mat(HAZ_TEST_MAT)
+        ent.exposures.assign_centroids(hazard)
+
+        impact = Impact()
+        impact.calc(ent.exposures, ent.impact_funcs, hazard, save_mat=True)
+        impact_rp = impact.local_exceedance_imp(return_periods=(10, 40))
+        pool = Pool()
+        self.assertTrue(np.array_equal(impact_rp, impact.local_exceedance_imp( \
+            return_periods=(10, 40), pool=pool)))
+        pool.close()
+        pool.join()
+
+        imp_calc = Impact()
+        imp_calc.calc(ent.exposures, ent.impact_funcs, hazard,
+                      return_periods=(10, 40))
+        self.assertEqual(imp_calc.imp_mat, [])
+        self.assertEqual(imp_calc.exc_imp.shape, (2, ent.exposures.value.size))
+        self.assertTrue(np.allclose(imp_calc.exc_imp, impact_rp))
+
 class TestRiskTrans(unittest.TestCase):
     """ Test risk transfer methods """
     def test_risk_trans_pass(self):
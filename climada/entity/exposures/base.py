@@ -215,7 +215,7 @@ class Exposures(GeoDataFrame):
             if np.array_equal(coord, hazard.centroids.coord):
                 assigned = np.arange(self.shape[0])
             else:
-                assigned = interpol_index(hazard.centroids.coord, coord, \
+                assigned = interpol_index(hazard.centroids.spatial_index, coord, \
                     method=method, distance=distance, threshold=threshold)
 
         self[INDICATOR_CENTR + hazard.tag.haz_type] = assigned
@@ -547,7 +547,7 @@ class Exposures(GeoDataFrame):
             raster, meta = co.points_to_raster(self, [value_name], scheduler=scheduler)
             co.write_raster(file_name, raster, meta)
 
-def add_sea(exposures, sea_res):
+def add_sea(exposures, sea_res, precomputed=False):
     """ Add sea to geometry's surroundings with given resolution. region_id
     set to -1 and other variables to 0.
 
@@ -555,6 +555,8 @@ def add_sea(exposures, sea_res):
         sea_res (tuple): (sea_coast_km, sea_res_km), where first parameter
             is distance from coast to fill with water and second parameter
             is resolution between sea points
+        precomputed (bool, optional): find the sea points in the global land
+            mask instead of the land geometry. Default: False
 
     Returns:
         Exposures
@@ -574,7 +576,8 @@ def add_sea(exposures, sea_res):
 
     lon_mgrid, lat_mgrid = np.meshgrid(lon_arr, lat_arr)
     lon_mgrid, lat_mgrid = lon_mgrid.ravel(), lat_mgrid.ravel()
-    on_land = np.logical_not(co.coord_on_land(lat_mgrid, lon_mgrid))
+    on_land = np.logical_not(co.coord_on_land(lat_mgrid, lon_mgrid,
+                                              precomputed=precomputed))
 
     sea_exp = Exposures()
     sea_exp['latitude'] = lat_mgrid[on_land]
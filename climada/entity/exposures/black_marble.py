@@ -29,7 +29,6 @@ import pandas as pd
 import geopandas as gpd
 from scipy import ndimage
 import shapely.vectorized
-from cartopy.io import shapereader
 from iso3166 import countries as iso_cntry
 
 from climada.entity.tag import Tag
@@ -37,7 +36,7 @@ from climada.entity.exposures.base import Exposures, INDICATOR_IF
 from climada.util.constants import SYSTEM_DIR, DEF_CRS
 from climada.entity.exposures import nightlight as nl_utils
 from climada.util.finance import gdp, income_group
-from climada.util.coordinates import pts_to_raster_meta
+from climada.util.coordinates import pts_to_raster_meta, nat_earth_reader
 
 LOGGER = logging.getLogger(__name__)
 
@@ -84,10 +83,7 @@ class BlackMarble(Exposures):
                 [1,x,x^2,...] to apply to nightlight (DEF_POLY_VAL used if not
                 provided). If provided, these are used.
         """
-        shp_file = shapereader.natural_earth(resolution='10m',
-                                             category='cultural',
-                                             name='admin_0_countries')
-        shp_file = shapereader.Reader(shp_file)
+        shp_file = nat_earth_reader(10, 'cultural', 'admin_0_countries')
 
         cntry_info, cntry_admin1 = country_iso_geom(countries, shp_file)
         fill_econ_indicators(ref_year, cntry_info, shp_file, **kwargs)
@@ -192,10 +188,7 @@ def country_iso_geom(countries, shp_file):
         countries = {cntry: [] for cntry in countries}
         admin1_rec = list()
     else:
-        admin1_rec = shapereader.natural_earth(resolution='10m',
-                                               category='cultural',
-                                               name='admin_1_states_provinces')
-        admin1_rec = shapereader.Reader(admin1_rec)
+        admin1_rec = nat_earth_reader(10, 'cultural', 'admin_1_states_provinces')
         admin1_rec = list(admin1_rec.records())
 
     for country_name, prov_list in countries.items():
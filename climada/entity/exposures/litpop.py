@@ -18,6 +18,7 @@ with CLIMADA. If not, see <https://www.gnu.org/licenses/>.
 import logging
 import time
 import os
+import functools
 from sys import stdout
 import numpy as np
 import pandas as pd
@@ -39,7 +40,8 @@ from climada.entity.exposures.base import Exposures, INDICATOR_IF
 from climada.entity.exposures import gpw_import
 from climada.util.finance import gdp, income_group, wealth2gdp, world_bank_wealth_account
 from climada.util.constants import SYSTEM_DIR, DEF_CRS
-from climada.util.coordinates import pts_to_raster_meta, get_resolution
+from climada.util.coordinates import pts_to_raster_meta, get_resolution, \
+nat_earth_reader
 
 logging.root.setLevel(logging.DEBUG)
 LOGGER = logging.getLogger(__name__)
@@ -213,10 +215,7 @@ class LitPop(Exposures):
         LOGGER.info('Generating LitPop data at a resolution of %s arcsec.', str(resolution))
         litpop_data = _get_litpop_box(cut_bbox, resolution, 0, reference_year, \
                                       exponents)
-        shp_file = shapereader.natural_earth(resolution='10m',
-                                             category='cultural',
-                                             name='admin_0_countries')
-        shp_file = shapereader.Reader(shp_file)
+        shp_file = nat_earth_reader(10, 'cultural', 'admin_0_countries')
 
         for cntry_iso, cntry_val in country_info.items():
             if fin_mode == 'pc':
@@ -519,6 +518,37 @@ def _litpop_coords_in_glb_grid(box, resolution):
     return box
     """
 
+class _ShapefileRecords():
+    """ Fields, records and shapes of a shapefile.Reader read at once """
+
+    def __init__(self, reader):
+        self.fields = reader.fields
+        self._records = reader.records()
+        self._shapes = reader.shapes()
+
+    def records(self):
+        """ List of records """
+        return self._records
+
+    def shapes(self):
+        """ List of shapes, in the order of the records """
+        return self._shapes
+
+@functools.lru_cache(maxsize=2)
+def _nat_earth_shapefile(name):
+    """ Natural Earth 1:10.000.000 cultural shape file, parsed the first time
+    and kept in memory.
+
+    Parameters:
+        name (str): 'admin_0_countries' or 'admin_1_states_provinces'
+
+    Returns:
+        _ShapefileRecords
+    """
+    shp_file = shapereader.natural_earth(resolution='10m', category='cultural',
+                                         name=name)
+    return _ShapefileRecords(shapefile.Reader(shp_file))
+
 def _get_country_shape(country_iso, only_geo=0):
     """ Retrieves the shape file or coordinate information of a country.
 
@@ -540,10 +570,7 @@ def _get_country_shape(country_iso, only_geo=0):
                     of the shape (array)
     """
     country_iso = country_iso.casefold()
-    shp = shapereader.natural_earth(resolution='10m',
-                                    category='cultural',
-                                    name='admin_0_countries')
-    shp = shapefile.Reader(shp)
+    shp = _nat_earth_shapefile('admin_0_countries')
     if len(country_iso) == 3:
         for field_num, field in enumerate(shp.fields[1::]):
             # Skip first (index zero) field, because it is DeletionFlag
@@ -934,10 +961,7 @@ def _get_country_info(iso3):
                 lat is a mx1 vector of the latitudinal values of the vertices of the shape (array)
                 lon is a mx1 vector of the longitudinal values of the vertices of the shape (array)
     """
-    shp = shapereader.natural_earth(resolution='10m',
-                                    category='cultural',
-                                    name='admin_0_countries')
-    shp = shapefile.Reader(shp)
+    shp = _nat_earth_shapefile('admin_0_countries')
     for field_num, field in enumerate(shp.fields[1::]):
         # Skip first (index zero) field, because it is DeletionFlag
         if field[0] == 'ADM0_A3':
@@ -956,10 +980,7 @@ def _get_country_info(iso3):
 
     num_codes = [iso3 for iso3 in wb.country_codes if len(iso3) == 3]
 
-    admin1_file = shapereader.natural_earth(resolution='10m',
-                                            category='cultural',
-                                            name='admin_1_states_provinces')
-    admin1_recs = shapefile.Reader(admin1_file)
+    admin1_recs = _nat_earth_shapefile('admin_1_states_provinces')
     country_admin1 = list()
     for rec, rec_shp in zip(admin1_recs.records(), admin1_recs.shapes()):
         if rec['adm0_a3'] == iso3:
@@ -992,10 +1013,7 @@ def _get_iso3(country_name):
             otherwise
     """
     country_name = country_name.casefold()
-    shp = shapereader.natural_earth(resolution='10m',
-                                    category='cultural',
-                                    name='admin_0_countries')
-    shp = shapefile.Reader(shp)
+    shp = _nat_earth_shapefile('admin_0_countries')
     for field_num, field in enumerate(shp.fields[1::]):
         # Skip first (index zero) field, because it is DeletionFlag
         if field[0] == 'ADM0_A3':
@@ -1201,10 +1219,7 @@ def _plot_admin1_shapes(adm0_a3, gray_val=str(0.3)):
                 lon is a mx1 vector of the longitudinal values of the vertices
                     of the shape (array)
     """
-    shp_file = shapereader.natural_earth('10m', category='cultural',\
-                                         name='admin_1_states_provinces')
-    shp = shapefile.Reader(shp_file)
-    del shp_file
+    shp = _nat_earth_shapefile('admin_1_states_provinces')
     for field_num, field in enumerate(shp.fields[1::]):
         # Skip first (index zero) field, because it is DeletionFlag
         if field[0].casefold() == 'ADM0_A3'.casefold():
@@ -1819,10 +1834,7 @@ def admin1_validation(country, methods, exponents, **args):
         LOGGER.error('Country parameter data type not recognised. '\
                      + 'Operation aborted.')
         raise TypeError
-    shp_file = shapereader.natural_earth(resolution='10m',
-                                         category='cultural',
-                                         name='admin_0_countries')
-    shp_file = shapereader.Reader(shp_file)
+    shp_file = nat_earth_reader(10, 'cultural', 'admin_0_countries')
 
     for cntry_iso, cntry_val in country_info.items(): # get GDP value for country
         _, gdp_val = gdp(cntry_iso, reference_year, shp_file)
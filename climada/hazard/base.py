@@ -25,7 +25,6 @@ import copy
 import itertools
 import logging
 import datetime as dt
-import warnings
 import numpy as np
 import pandas as pd
 import geopandas as gpd
@@ -35,6 +34,10 @@ import h5py
 import rasterio
 from rasterio.features import rasterize
 from rasterio.warp import reproject, Resampling, calculate_default_transform
+try:
+    import hdf5plugin
+except ImportError:
+    hdf5plugin = None
 
 from climada.hazard.tag import Tag as TagHazard
 from climada.hazard.centroids.centr import Centroids
@@ -42,6 +45,7 @@ import climada.util.plot as u_plot
 import climada.util.checker as check
 import climada.util.dates_times as u_dt
 from climada.util.config import CONFIG
+from climada.util.exceedance import local_exceedance
 import climada.util.hdf5_handler as hdf5
 import climada.util.coordinates as co
 
@@ -87,6 +91,16 @@ DEF_VAR_MAT = {'field_name': 'hazard',
               }
 """ MATLAB variable names """
 
+HDF5_COMPRESSION = ['gzip', 'lzf', 'blosc']
+""" Compression filters of the matrices in write_hdf5. 'blosc' needs the
+hdf5plugin package. """
+
+HDF5_CHUNK_EVENTS = 256
+""" Default number of events per chunk of the compressed matrices """
+
+HDF5_CHUNK_SIZE = 2**20
+""" Maximum number of values per chunk of the compressed dense matrices """
+
 class Hazard():
     """Contains events of some hazard type defined at centroids. Loads from
     files with format defined in FILE_EXT.
@@ -523,36 +537,11 @@ class Hazard():
             haz = self.__class__()
         except TypeError:
             haz = Hazard(self.tag.haz_type)
-        sel_ev = np.ones(self.event_id.size, bool)
-        sel_cen = np.ones(self.centroids.size, bool)
+        sel_idx = self._select_idx(date, orig, reg_id)
+        if sel_idx is None:
+            return None
+        sel_ev, sel_cen = sel_idx
 
-        # filter events with date
-        if isinstance(date, tuple):
-            date_ini, date_end = date[0], date[1]
-            if isinstance(date_ini, str):
-                date_ini = u_dt.str_to_date(date[0])
-                date_end = u_dt.str_to_date(date[1])
-            sel_ev = np.logical_and(date_ini <= self.date,
-                                    self.date <= date_end)
-            if not np.any(sel_ev):
-                LOGGER.info('No hazard in date range %s.', date)
-                return None
-
-        # filter events hist/synthetic
-        if isinstance(orig, bool):
-            sel_ev = np.logical_and(sel_ev, self.orig.astype(bool) == orig)
-            if not np.any(sel_ev):
-                LOGGER.info('No hazard with %s tracks.', str(orig))
-                return None
-
-        # filter centroids
-        if reg_id is not None:
-            sel_cen = np.argwhere(self.centroids.region_id == reg_id).reshape(-1)
-            if not sel_cen.size:
-                LOGGER.info('No hazard centroids with region %s.', str(reg_id))
-                return None
-
-        sel_ev = np.argwhere(sel_ev).reshape(-1)
         for (var_name, var_val) in self.__dict__.items():
             if isinstance(var_val, np.ndarray) and var_val.ndim == 1 and \
             var_val.size:
@@ -593,22 +582,8 @@ class Hazard():
                 LOGGER.warning('Return period %1.1f exceeds max. event return period.' %(rp))
         LOGGER.info('Computing exceedance intenstiy map for return periods: %s',
                     return_periods)
-        num_cen = self.intensity.shape[1]
-        inten_stats = np.zeros((len(return_periods), num_cen))
-        cen_step = int(CONFIG['global']['max_matrix_size']/self.intensity.shape[0])
-        if not cen_step:
-            LOGGER.error('Increase max_matrix_size configuration parameter to'\
-                         ' > %s', str(self.intensity.shape[0]))
-            raise ValueError
-        # separte in chunks
-        chk = -1
-        for chk in range(int(num_cen/cen_step)):
-            self._loc_return_inten(np.array(return_periods), \
-                self.intensity[:, chk*cen_step:(chk+1)*cen_step].todense(), \
-                inten_stats[:, chk*cen_step:(chk+1)*cen_step])
-        self._loc_return_inten(np.array(return_periods), \
-            self.intensity[:, (chk+1)*cen_step:].todense(), \
-            inten_stats[:, (chk+1)*cen_step:])
+        inten_stats = local_exceedance(self.intensity, self.frequency,
+                                       self.intensity_thres, return_periods)
         # set values below 0 to zero if minimum of hazard.intensity >= 0:
         if self.intensity.min()>=0 and np.min(inten_stats)<0:
             LOGGER.warning('Exceedance intenstiy values below 0 are set to 0. \
@@ -797,7 +772,10 @@ Reason: no negative intensity values were found in hazard.')
         return orig_yearset
 
     def append(self, hazard):
-        """Append events and centroids in hazard.
+        """Append events and centroids in hazard. The centroids of hazard
+        which are not in the current centroids (same coordinates) are
+        appended, and the columns of its intensity and fraction are remapped
+        onto the merged centroids.
 
         Parameters:
             hazard (Hazard): Hazard instance to append to current
@@ -816,54 +794,62 @@ Reason: no negative intensity values were found in hazard.')
 
         if (self.units == '') and (hazard.units != ''):
             LOGGER.info("Initial hazard does not have units.")
-            self.units = hazard.units
         elif hazard.units == '':
             LOGGER.info("Appended hazard does not have units.")
-        elif self.units != hazard.units:
-            LOGGER.error("Hazards with different units can't be appended: "
-                         "%s != %s.", self.units, hazard.units)
-            raise ValueError
+        self.concat([self, hazard])
 
-        self.tag.append(hazard.tag)
-        n_ini_ev = self.event_id.size
-        # append all 1-dim variables
-        for (var_name, var_val), haz_val in zip(self.__dict__.items(),
-                                                hazard.__dict__.values()):
+    def concat(self, list_haz):
+        """Set the events of all the hazards, concatenated in one pass. The
+        centroids of every hazard which are not in the previous ones (same
+        coordinates) are appended, and the columns of its intensity and
+        fraction are remapped onto the merged centroids. The first hazard
+        with events provides the attributes which are not events data.
+
+        Parameters:
+            list_haz (list(Hazard)): Hazard instances to concatenate
+
+        Raises:
+            ValueError
+        """
+        tag = TagHazard()
+        for haz in list_haz:
+            haz._check_events()
+            tag.append(haz.tag)
+        list_haz = [haz for haz in list_haz if haz.event_id.size]
+        if not list_haz:
+            self.clear()
+            self.tag = tag
+            return
+
+        units = ''
+        for haz in list_haz:
+            if units == '':
+                units = haz.units
+            elif haz.units not in ('', units):
+                LOGGER.error("Hazards with different units can't be appended: "
+                             "%s != %s.", units, haz.units)
+                raise ValueError
+
+        centroids, cen_cols = _concat_centroids([haz.centroids for haz in list_haz])
+        haz_vars = dict(list_haz[0].__dict__)
+        for var_name, var_val in haz_vars.items():
             if isinstance(var_val, np.ndarray) and var_val.ndim == 1 and \
             var_val.size:
-                setattr(self, var_name, np.append(var_val, haz_val). \
-                        astype(var_val.dtype, copy=False))
+                haz_vars[var_name] = np.concatenate([getattr(haz, var_name) \
+                    for haz in list_haz]).astype(var_val.dtype, copy=False)
             elif isinstance(var_val, list) and var_val:
-                setattr(self, var_name, var_val + haz_val)
-
-        # append intensity and fraction:
-        # if same centroids, just append events
-        if self.centroids.equal(hazard.centroids):
-            self.intensity = sparse.vstack([self.intensity, hazard.intensity],
-                                           format='csr')
-            self.fraction = sparse.vstack([self.fraction, hazard.fraction],
-                                          format='csr')
-        elif hazard.intensity.size:
-            n_ini_cen = self.centroids.size
-            self.centroids.append(hazard.centroids)
-
-            self.intensity = sparse.hstack([self.intensity, \
-                sparse.lil_matrix((self.intensity.shape[0], \
-                self.centroids.size - n_ini_cen))], format='lil')
-            self.fraction = sparse.hstack([self.fraction, \
-                sparse.lil_matrix((self.fraction.shape[0], \
-                self.centroids.size - n_ini_cen))], format='lil')
-            self.intensity = sparse.vstack([self.intensity, \
-                sparse.lil_matrix((hazard.intensity.shape[0],
-                                   self.intensity.shape[1]))], format='lil')
-            self.fraction = sparse.vstack([self.fraction, \
-                sparse.lil_matrix((hazard.intensity.shape[0],
-                                   self.intensity.shape[1]))], format='lil')
-
-            self.intensity[n_ini_ev:, -hazard.intensity.shape[1]:] = hazard.intensity
-            self.fraction[n_ini_ev:, -hazard.intensity.shape[1]:] = hazard.fraction
-            self.intensity = self.intensity.tocsr()
-            self.fraction = self.fraction.tocsr()
+                haz_vars[var_name] = list(itertools.chain.from_iterable( \
+                    getattr(haz, var_name) for haz in list_haz))
+            elif isinstance(var_val, sparse.csr_matrix):
+                haz_vars[var_name] = _concat_csr([getattr(haz, var_name) \
+                    for haz in list_haz], cen_cols, centroids.size)
+            elif isinstance(var_val, (np.ndarray, list)):
+                haz_vars[var_name] = copy.copy(var_val)
+
+        self.__dict__.update(haz_vars)
+        self.tag = tag
+        self.units = units
+        self.centroids = centroids
 
         # Make event id unique
         if np.unique(self.event_id).size != self.event_id.size:
@@ -926,12 +912,34 @@ Reason: no negative intensity values were found in hazard.')
                         all_touched=True, dtype=profile['dtype'],)
                     dst.write(raster.astype(profile['dtype']), i_ev+1)
 
-    def write_hdf5(self, file_name,todense=False):
+    def write_hdf5(self, file_name, todense=False, compression=None,
+                   chunk_events=HDF5_CHUNK_EVENTS):
         """ Write hazard in hdf5 format.
 
         Parameters:
             file_name (str): file name to write, with h5 format
+            todense (bool, optional): write intensity and fraction as dense
+                matrices. Default: False
+            compression (str, optional): compression filter of intensity and
+                fraction, one of HDF5_COMPRESSION. The matrices are then
+                chunked by events, so that reading a range of events only
+                decompresses its chunks. Default: no compression
+            chunk_events (int, optional): approximate number of events per
+                chunk when compression is used. Default: HDF5_CHUNK_EVENTS
         """
+        comp_args = dict()
+        if compression == 'blosc':
+            if hdf5plugin is None:
+                LOGGER.error('Compression blosc needs the hdf5plugin package.')
+                raise ValueError
+            comp_args = dict(hdf5plugin.Blosc())
+        elif compression in HDF5_COMPRESSION:
+            comp_args = {'compression': compression, 'shuffle': True}
+        elif compression is not None:
+            LOGGER.error('Compression %s not supported. Use one of %s.',
+                         compression, HDF5_COMPRESSION)
+            raise ValueError
+
         LOGGER.info('Writting %s', file_name)
         hf_data = h5py.File(file_name, 'w')
         str_dt = h5py.special_dtype(vlen=str)
@@ -946,14 +954,8 @@ Reason: no negative intensity values were found in hazard.')
                 hf_str = hf_data.create_dataset('description', (1,), dtype=str_dt)
                 hf_str[0] = str(var_val.description)
             elif isinstance(var_val, sparse.csr_matrix):
-                if todense:
-                    hf_data.create_dataset(var_name, data=var_val.todense())
-                else:
-                    hf_csr = hf_data.create_group(var_name)
-                    hf_csr.create_dataset('data', data=var_val.data)
-                    hf_csr.create_dataset('indices', data=var_val.indices)
-                    hf_csr.create_dataset('indptr', data=var_val.indptr)
-                    hf_csr.attrs['shape'] = var_val.shape
+                _write_hdf5_csr(hf_data, var_name, var_val, todense, comp_args,
+                                chunk_events)
             elif isinstance(var_val, str):
                 hf_str = hf_data.create_dataset(var_name, (1,), dtype=str_dt)
                 hf_str[0] = var_val
@@ -965,15 +967,143 @@ Reason: no negative intensity values were found in hazard.')
                 hf_data.create_dataset(var_name, data=var_val)
         hf_data.close()
 
-    def read_hdf5(self, file_name):
-        """ Read hazard in hdf5 format.
+    def read_hdf5(self, file_name, date=None, orig=None, reg_id=None,
+                  event_id=None):
+        """ Read hazard in hdf5 format. If a selection of events or centroids
+        is provided, only their values of intensity and fraction are read
+        from the file.
 
         Parameters:
             file_name (str): file name to read, with h5 format
+            date (tuple(str or int), optional): (initial date, final date) as
+                in select()
+            orig (bool, optional): read only historical (True) or only
+                synthetic (False) events
+            reg_id (int, optional): region identifier of the centroids to read
+            event_id (array-like, optional): identifiers of the events to read
+
+        Examples:
+            >>> haz = Hazard('TC')
+            >>> haz.read_hdf5(HAZ_FILE, date=('2000-01-01', '2010-12-31'), reg_id=840)
         """
         LOGGER.info('Reading %s', file_name)
         self.clear()
         hf_data = h5py.File(file_name, 'r')
+        if date is None and orig is None and reg_id is None and event_id is None:
+            self._read_hdf5_vars(hf_data)
+            hf_data.close()
+            return
+
+        self._read_hdf5_vars(hf_data, read_csr=False)
+        sel_idx = self._select_idx(date, orig, reg_id, event_id)
+        if sel_idx is None:
+            hf_data.close()
+            self.clear()
+            return
+        sel_ev, sel_cen = sel_idx
+        for (var_name, var_val) in self.__dict__.items():
+            if isinstance(var_val, np.ndarray) and var_val.ndim == 1 and \
+            var_val.size:
+                setattr(self, var_name, var_val[sel_ev])
+            elif isinstance(var_val, sparse.csr_matrix):
+                setattr(self, var_name, _read_hdf5_csr_sel(hf_data.get(var_name), \
+                    sel_ev, sel_cen))
+            elif isinstance(var_val, list) and var_val:
+                setattr(self, var_name, [var_val[idx] for idx in sel_ev])
+            elif var_name == 'centroids' and reg_id is not None:
+                setattr(self, var_name, var_val.select(reg_id))
+        hf_data.close()
+
+    def read_hdf5_batches(self, file_name, num_events):
+        """ Read hazard in hdf5 format by batches of events. Only the rows of
+        the intensity and fraction of the batch in process are read from the
+        file. The instance keeps all the attributes but these matrices.
+
+        Parameters:
+            file_name (str): file name to read, with h5 format
+            num_events (int): maximum number of events per batch
+
+        Returns:
+            generator of Hazard (or children) with the events of each batch.
+            The centroids are shared among the batches.
+        """
+        LOGGER.info('Reading %s', file_name)
+        self.clear()
+        with h5py.File(file_name, 'r') as hf_data:
+            self._read_hdf5_vars(hf_data, read_csr=False)
+            num_ev = self.event_id.size
+            for ev_ini in range(0, num_ev, num_events):
+                ev_end = min(ev_ini + num_events, num_ev)
+                haz = copy.copy(self)
+                for (var_name, var_val) in self.__dict__.items():
+                    if isinstance(var_val, np.ndarray) and var_val.ndim == 1 and \
+                    var_val.size:
+                        setattr(haz, var_name, var_val[ev_ini:ev_end])
+                    elif isinstance(var_val, sparse.csr_matrix):
+                        setattr(haz, var_name, _read_hdf5_csr_rows( \
+                            hf_data.get(var_name), ev_ini, ev_end))
+                    elif isinstance(var_val, list) and var_val:
+                        setattr(haz, var_name, var_val[ev_ini:ev_end])
+                yield haz
+
+    def _select_idx(self, date=None, orig=None, reg_id=None, event_id=None):
+        """ Indexes of the events and centroids selected as in select().
+
+        Parameters:
+            date (tuple(str or int), optional): (initial date, final date)
+            orig (bool, optional): select only historical or only synthetic
+            reg_id (int, optional): region identifier of the centroids
+            event_id (array-like, optional): select only these events
+
+        Returns:
+            np.array (events indexes), np.array (centroids indexes or mask),
+            or None if no event or centroid selected
+        """
+        sel_ev = np.ones(self.event_id.size, bool)
+        sel_cen = np.ones(self.centroids.size, bool)
+
+        # filter events with date
+        if isinstance(date, tuple):
+            date_ini, date_end = date[0], date[1]
+            if isinstance(date_ini, str):
+                date_ini = u_dt.str_to_date(date[0])
+                date_end = u_dt.str_to_date(date[1])
+            sel_ev = np.logical_and(date_ini <= self.date,
+                                    self.date <= date_end)
+            if not np.any(sel_ev):
+                LOGGER.info('No hazard in date range %s.', date)
+                return None
+
+        # filter events hist/synthetic
+        if isinstance(orig, bool):
+            sel_ev = np.logical_and(sel_ev, self.orig.astype(bool) == orig)
+            if not np.any(sel_ev):
+                LOGGER.info('No hazard with %s tracks.', str(orig))
+                return None
+
+        # filter events with id
+        if event_id is not None:
+            sel_ev = np.logical_and(sel_ev, np.isin(self.event_id, event_id))
+            if not np.any(sel_ev):
+                LOGGER.info('No hazard with events %s.', str(event_id))
+                return None
+
+        # filter centroids
+        if reg_id is not None:
+            sel_cen = np.argwhere(self.centroids.region_id == reg_id).reshape(-1)
+            if not sel_cen.size:
+                LOGGER.info('No hazard centroids with region %s.', str(reg_id))
+                return None
+
+        return np.argwhere(sel_ev).reshape(-1), sel_cen
+
+    def _read_hdf5_vars(self, hf_data, read_csr=True):
+        """ Read the attributes of the hazard from an open hdf5 file.
+
+        Parameters:
+            hf_data (h5py.File): hdf5 file opened for reading
+            read_csr (bool, optional): read the sparse matrices. Default: True
+        """
         for (var_name, var_val) in self.__dict__.items():
             if var_name == 'centroids':
                 self.centroids.read_hdf5(hf_data.get(var_name))
@@ -984,61 +1114,27 @@ Reason: no negative intensity values were found in hazard.')
             elif isinstance(var_val, np.ndarray) and var_val.ndim == 1:
                 setattr(self, var_name, np.array(hf_data.get(var_name)))
             elif isinstance(var_val, sparse.csr_matrix):
-                hf_csr = hf_data.get(var_name)
-                if isinstance(hf_csr,h5py.Dataset):
-                    setattr(self, var_name, sparse.csr_matrix(hf_csr))
-                else:
-                    setattr(self, var_name, sparse.csr_matrix((hf_csr['data'][:], \
-                        hf_csr['indices'][:], hf_csr['indptr'][:]), hf_csr.attrs['shape']))
+                if read_csr:
+                    setattr(self, var_name, _read_hdf5_csr_rows( \
+                        hf_data.get(var_name)))
             elif isinstance(var_val, str):
                 setattr(self, var_name, hf_data.get(var_name)[0])
             elif isinstance(var_val, list):
                 setattr(self, var_name, np.array(hf_data.get(var_name)).tolist())
             else:
                 setattr(self, var_name, hf_data.get(var_name))
-        hf_data.close()
 
     def _append_all(self, list_haz_ev):
-        """Append event by event with same centroids. Takes centroids and units
-        of first event.
+        """Append event by event with same centroids, in one pass with
+        concat. The centroids are shared with the first event, not copied,
+        and the events are numbered from 1.
 
         Parameters:
             list_haz_ev (list): Hazard instances with one event and same
                 centroids
         """
-        self.clear()
-
-        num_ev = len(list_haz_ev)
-        num_cen = list_haz_ev[0].centroids.size
-
-        # check for new variables
-        for key_new in list_haz_ev[0].__dict__.keys():
-            if key_new not in self.__dict__:
-                self.__dict__[key_new] = list_haz_ev[0].__dict__[key_new]
-
-        for var_name, var_val in self.__dict__.items():
-            if isinstance(var_val, np.ndarray) and var_val.ndim == 1:
-                setattr(self, var_name, np.zeros((num_ev,), dtype=var_val.dtype))
-            elif isinstance(var_val, sparse.csr.csr_matrix):
-                setattr(self, var_name, sparse.lil_matrix((num_ev, num_cen)))
-
-        for i_ev, haz_ev in enumerate(list_haz_ev):
-            for (var_name, var_val), ev_val in zip(self.__dict__.items(),
-                                                   haz_ev.__dict__.values()):
-                if isinstance(var_val, np.ndarray) and var_val.ndim == 1:
-                    var_val[i_ev] = ev_val[0]
-                elif isinstance(var_val, list):
-                    var_val.extend(ev_val)
-                elif isinstance(var_val, sparse.lil_matrix):
-                    var_val[i_ev, :] = ev_val[0, :]
-                elif isinstance(var_val, TagHazard):
-                    var_val.append(ev_val)
-
-        self.centroids = copy.deepcopy(list_haz_ev[0].centroids)
-        self.units = list_haz_ev[0].units
-        self.intensity = self.intensity.tocsr()
-        self.fraction = self.fraction.tocsr()
-        self.event_id = np.arange(1, num_ev+1)
+        self.concat(list_haz_ev)
+        self.event_id = np.arange(1, self.size+1)
 
     def _set_coords_centroids(self):
         """ If centroids are raster, set lat and lon coordinates """
@@ -1152,30 +1248,6 @@ Reason: no negative intensity values were found in hazard.')
         axis.set_xlim([0, len(array_val)])
         return axis
 
-    def _loc_return_inten(self, return_periods, inten, exc_inten):
-        """ Compute local exceedence intensity for given return period.
-
-        Parameters:
-            return_periods (np.array): return periods to consider
-            cen_pos (int): centroid position
-
-        Returns:
-            np.array
-        """
-        # sorted intensity
-        sort_pos = np.argsort(inten, axis=0)[::-1, :]
-        columns = np.ones(inten.shape, int)
-        columns *= np.arange(columns.shape[1])
-        inten_sort = inten[sort_pos, columns]
-        # cummulative frequency at sorted intensity
-        freq_sort = self.frequency[sort_pos]
-        np.cumsum(freq_sort, axis=0, out=freq_sort)
-
-        for cen_idx in range(inten.shape[1]):
-            exc_inten[:, cen_idx] = self._cen_return_inten(
-                inten_sort[:, cen_idx], freq_sort[:, cen_idx],
-                self.intensity_thres, return_periods)
-
     def _check_events(self):
         """ Check that all attributes but centroids contain consistent data.
         Put default date, event_name and orig if not provided. Check not
@@ -1203,38 +1275,6 @@ Reason: no negative intensity values were found in hazard.')
             LOGGER.error("There are events with same date and name.")
             raise ValueError
 
-    @staticmethod
-    def _cen_return_inten(inten, freq, inten_th, return_periods):
-        """From ordered intensity and cummulative frequency at centroid, get
-        exceedance intensity at input return periods.
-
-        Parameters:
-            inten (np.array): sorted intensity at centroid
-            freq (np.array): cummulative frequency at centroid
-            inten_th (float): intensity threshold
-            return_periods (np.array): return periods
-
-        Returns:
-            np.array
-        """
-        inten_th = np.asarray(inten > inten_th).squeeze()
-        inten_cen = inten[inten_th]
-        freq_cen = freq[inten_th]
-        if not inten_cen.size:
-            return np.zeros((return_periods.size,))
-        try:
-            with warnings.catch_warnings():
-                warnings.simplefilter("ignore")
-                pol_coef = np.polyfit(np.log(freq_cen), inten_cen, deg=1)
-        except ValueError:
-            pol_coef = np.polyfit(np.log(freq_cen), inten_cen, deg=0)
-        inten_fit = np.polyval(pol_coef, np.log(1/return_periods))
-        wrong_inten = np.logical_and(return_periods > np.max(1/freq_cen), \
-                np.isnan(inten_fit))
-        inten_fit[wrong_inten] = 0.
-
-        return inten_fit
-
     def _read_att_mat(self, data, file_name, var_names):
         """ Read MATLAB hazard's attributes. """
         self.frequency = np.squeeze(data[var_names['var_name']['freq']])
@@ -1314,3 +1354,223 @@ Reason: no negative intensity values were found in hazard.')
         self.intensity = sparse.csr_matrix(dfr.values[:, 1:num_events+1].transpose())
         self.fraction = sparse.csr_matrix(np.ones(self.intensity.shape,
                                                   dtype=np.float))
+
+def _concat_centroids(list_centr):
+    """ Merge centroids. The points of every centroids which are not in the
+    previous ones (same coordinates) are appended to the first centroids.
+
+    Parameters:
+        list_centr (list(Centroids)): centroids to merge
+
+    Returns:
+        Centroids, list(np.array): merged centroids and, for every input
+        centroids, the column of each of its points in the merged centroids
+        (None if the centroids are equal to the first ones)
+    """
+    centr_ini = list_centr[0]
+    cen_cols = [None] * len(list_centr)
+    diff_pos = [i_centr for i_centr, centr in enumerate(list_centr[1:], 1) \
+                if centr is not centr_ini and not centr_ini.equal(centr)]
+    if not diff_pos:
+        return centr_ini, cen_cols
+
+    for centr in [centr_ini] + [list_centr[i_centr] for i_centr in diff_pos]:
+        if not centr.lat.size or not centr.lon.size:
+            centr.set_meta_to_lat_lon()
+    _, coord_grp = np.unique(np.concatenate([centr_ini.coord] + \
+        [list_centr[i_centr].coord for i_centr in diff_pos]), axis=0,
+                             return_inverse=True)
+    coord_grp = coord_grp.reshape(-1)
+
+    # merged column of every group of equal coordinates, -1 if not present
+    grp_col = np.full(coord_grp.max() + 1, -1, int)
+    grp_col[coord_grp[:centr_ini.size][::-1]] = np.arange(centr_ini.size)[::-1]
+    num_cen, grp_pos = centr_ini.size, centr_ini.size
+    new_centr = list()
+    for i_centr in diff_pos:
+        centr = list_centr[i_centr]
+        centr_grp = coord_grp[grp_pos:grp_pos + centr.size]
+        grp_pos += centr.size
+        # repeated points in one centroids are mapped to different columns
+        _, first_pos = np.unique(centr_grp, return_index=True)
+        cols = np.full(centr.size, -1, int)
+        cols[first_pos] = grp_col[centr_grp[first_pos]]
+        new_pts = cols < 0
+        cols[new_pts] = np.arange(num_cen, num_cen + np.sum(new_pts))
+        num_cen += np.sum(new_pts)
+        new_grp, new_col = centr_grp[new_pts], cols[new_pts]
+        unset = grp_col[new_grp] < 0
+        grp_col[new_grp[unset][::-1]] = new_col[unset][::-1]
+        cen_cols[i_centr] = cols
+        if new_pts.any():
+            new_centr.append(centr.select(sel_cen=new_pts))
+
+    if not new_centr:
+        return centr_ini, cen_cols
+    centroids = copy.deepcopy(centr_ini)
+    for centr in new_centr:
+        centroids.append(centr)
+    return centroids, cen_cols
+
+def _concat_csr(list_mat, cen_cols, num_cen):
+    """ Stack the rows of sparse matrices, mapping their columns to the
+    merged centroids.
+
+    Parameters:
+        list_mat (list(sparse.csr_matrix)): matrices events x centroids
+        cen_cols (list(np.array)): column of every centroid of each matrix
+            in the merged centroids. None if no mapping needed.
+        num_cen (int): number of merged centroids
+
+    Returns:
+        sparse.csr_matrix
+    """
+    list_csr = list()
+    for mat, cols in zip(list_mat, cen_cols):
+        mat = mat.tocsr()
+        if cols is not None:
+            mat = sparse.csr_matrix((mat.data, cols[mat.indices], mat.indptr),
+                                    shape=(mat.shape[0], num_cen))
+        elif mat.shape[1] != num_cen:
+            mat = sparse.csr_matrix((mat.data, mat.indices, mat.indptr),
+                                    shape=(mat.shape[0], num_cen))
+        list_csr.append(mat)
+    mat = sparse.vstack(list_csr, format='csr')
+    mat.sort_indices()
+    return mat
+
+def _check_hdf5_filters(hf_csr):
+    """ Check that the compression filters of a matrix stored in hdf5 are
+    available. Blosc compressed matrices need the hdf5plugin package.
+
+    Parameters:
+        hf_csr (h5py.Group or h5py.Dataset): stored matrix
+
+    Raises:
+        ValueError
+    """
+    hf_dset = hf_csr if isinstance(hf_csr, h5py.Dataset) else hf_csr['data']
+    plist = hf_dset.id.get_create_plist()
+    for i_filt in range(plist.get_nfilters()):
+        filt_id = plist.get_filter(i_filt)[0]
+        if not h5py.h5z.filter_avail(filt_id):
+            LOGGER.error('Compression filter %s of %s not available. Blosc '
+                         'compression needs the hdf5plugin package.', filt_id,
+                         hf_dset.name)
+            raise ValueError
+
+def _read_hdf5_csr_rows(hf_csr, ev_ini=0, ev_end=None):
+    """ Read the rows ev_ini to ev_end of a sparse matrix stored in hdf5,
+    either as CSR group or as dense dataset.
+
+    Parameters:
+        hf_csr (h5py.Group or h5py.Dataset): stored matrix
+        ev_ini (int, optional): first row to read. Default: 0
+        ev_end (int, optional): row after the last one to read. Default: all
+
+    Returns:
+        sparse.csr_matrix
+    """
+    _check_hdf5_filters(hf_csr)
+    if isinstance(hf_csr, h5py.Dataset):
+        return sparse.csr_matrix(hf_csr[ev_ini:ev_end])
+    indptr = hf_csr['indptr'][ev_ini:None if ev_end is None else ev_end+1]
+    return sparse.csr_matrix((hf_csr['data'][indptr[0]:indptr[-1]], \
+        hf_csr['indices'][indptr[0]:indptr[-1]], indptr - indptr[0]), \
+        (indptr.size - 1, hf_csr.attrs['shape'][1]))
+
+def _read_hdf5_csr_sel(hf_csr, sel_ev, sel_cen):
+    """ Read the selected rows and columns of a sparse matrix stored in hdf5,
+    either as CSR group or as dense dataset. The values are read in blocks
+    of at most max_matrix_size of consecutive selected rows.
+
+    Parameters:
+        hf_csr (h5py.Group or h5py.Dataset): stored matrix
+        sel_ev (np.array): sorted indexes of the rows to read
+        sel_cen (np.array): indexes or mask of the columns to read
+
+    Returns:
+        sparse.csr_matrix
+    """
+    _check_hdf5_filters(hf_csr)
+    if isinstance(hf_csr, h5py.Dataset):
+        return sparse.csr_matrix(hf_csr[sel_ev, :])[:, sel_cen]
+    # new position of every column, -1 if not selected
+    col_map = np.full(hf_csr.attrs['shape'][1], -1, np.int64)
+    col_map[sel_cen] = np.arange(col_map[sel_cen].size)
+    all_cen = np.all(col_map >= 0) and np.all(np.diff(col_map) > 0)
+
+    # ranges of values of consecutive selected rows. Ranges separated by less
+    # than a block are read together and the values of other rows dropped
+    indptr = hf_csr['indptr'][:]
+    row_sel = np.zeros(indptr.size - 1, bool)
+    row_sel[sel_ev] = True
+    val_ini, val_end = indptr[sel_ev], indptr[sel_ev + 1]
+    blk_step = max(int(CONFIG['global']['max_matrix_size']), 1)
+    new_run = np.ones(sel_ev.size, bool)
+    new_run[1:] = val_ini[1:] - val_end[:-1] >= blk_step
+    run_end = val_end[np.append(new_run[1:], True)]
+
+    data, indices = [np.array([], hf_csr['data'].dtype)], [np.array([], np.int64)]
+    row_nnz = np.zeros(indptr.size - 1, np.int64)
+    for run_ini, run_fin in zip(val_ini[new_run], run_end):
+        for blk_ini in range(run_ini, run_fin, blk_step):
+            blk_end = min(blk_ini + blk_step, run_fin)
+            blk_data = hf_csr['data'][blk_ini:blk_end]
+            blk_cols = col_map[hf_csr['indices'][blk_ini:blk_end]]
+            blk_rows = np.searchsorted(indptr, np.arange(blk_ini, blk_end), 'right') - 1
+            in_sel = row_sel[blk_rows] & (blk_cols >= 0)
+            if not np.all(in_sel):
+                blk_data, blk_cols, blk_rows = blk_data[in_sel], \
+                    blk_cols[in_sel], blk_rows[in_sel]
+            if not all_cen and blk_rows.size:
+                row_nnz[blk_rows[0]:blk_rows[-1] + 1] += \
+                    np.bincount(blk_rows - blk_rows[0])
+            data.append(blk_data)
+            indices.append(blk_cols)
+    sel_ptr = np.zeros(sel_ev.size + 1, np.int64)
+    if all_cen:
+        np.cumsum(val_end - val_ini, out=sel_ptr[1:])
+    else:
+        np.cumsum(row_nnz[sel_ev], out=sel_ptr[1:])
+    return sparse.csr_matrix((np.concatenate(data), np.concatenate(indices), \
+        sel_ptr), (sel_ev.size, col_map[sel_cen].size))
+
+def _write_hdf5_csr(hf_data, var_name, var_val, todense, comp_args,
+                    chunk_events):
+    """ Write sparse matrix in hdf5 as CSR group (data, indices and indptr,
+    which are the offsets of every row) or as dense dataset. Summary
+    statistics of the matrix are written as attributes.
+
+    Parameters:
+        hf_data (h5py.File or h5py.Group): where to write
+        var_name (str): name of the group or dataset
+        var_val (sparse.csr_matrix): matrix
+        todense (bool): write dense dataset
+        comp_args (dict): compression arguments of h5py. Empty for no
+            compression nor chunking
+        chunk_events (int): approximate number of rows per chunk
+    """
+    num_ev = var_val.shape[0]
+    chunk_events = max(min(chunk_events, num_ev), 1)
+    if todense:
+        dense_args = dict()
+        if comp_args and num_ev and var_val.shape[1]:
+            dense_args = dict(comp_args, chunks=(max(min(chunk_events, \
+                HDF5_CHUNK_SIZE // var_val.shape[1]), 1), var_val.shape[1]))
+        hf_csr = hf_data.create_dataset(var_name, data=var_val.todense(),
+                                        **dense_args)
+    else:
+        hf_csr = hf_data.create_group(var_name)
+        val_args, ptr_args = dict(), dict()
+        if comp_args and var_val.nnz:
+            val_args = dict(comp_args, chunks=(max(min(int(np.ceil( \
+                var_val.nnz / num_ev * chunk_events)), var_val.nnz), 1),))
+            ptr_args = dict(comp_args, chunks=(chunk_events,))
+        hf_csr.create_dataset('data', data=var_val.data, **val_args)
+        hf_csr.create_dataset('indices', data=var_val.indices, **val_args)
+        hf_csr.create_dataset('indptr', data=var_val.indptr, **ptr_args)
+        hf_csr.attrs['shape'] = var_val.shape
+    hf_csr.attrs['nnz'] = var_val.nnz
+    hf_csr.attrs['min'] = var_val.data.min() if var_val.nnz else 0
+    hf_csr.attrs['max'] = var_val.data.max() if var_val.nnz else 0
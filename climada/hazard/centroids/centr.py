@@ -36,8 +36,10 @@ from shapely.geometry.point import Point
 import climada.util.plot as u_plot
 from climada.util.constants import DEF_CRS, ONE_LAT_KM
 import climada.util.hdf5_handler as hdf5
-from climada.util.coordinates import dist_to_coast, get_resolution, coord_on_land, \
-pts_to_raster_meta, read_raster, read_vector, equal_crs, get_country_code
+from climada.util.interpolation import SpatialIndex
+from climada.util.coordinates import dist_to_coast_cached, dist_to_coast_raster, \
+get_resolution, coord_on_land, pts_to_raster_meta, read_raster, read_vector, \
+equal_crs, get_country_code
 from climada.util.coordinates import NE_CRS, TMP_ELEVATION_FILE, DEM_NODATA, \
 MAX_DEM_TILES_DOWN
 
@@ -87,6 +89,8 @@ class Centroids():
         on_land (np.array, optional): on land (True) and on sea (False) of size size
         region_id (np.array, optional): country region code of size size
         elevation (np.array, optional): elevation of size size
+        spatial_index (SpatialIndex): search structures of the points, built
+            when first used
     """
 
     vars_check = {'lat', 'lon', 'geometry', 'area_pixel', 'dist_coast',
@@ -104,6 +108,7 @@ class Centroids():
         self.on_land = np.array([])
         self.region_id = np.array([])
         self.elevation = np.array([])
+        self._spatial_index = None
 
     def check(self):
         """ Check that either raster meta attribute is set or points lat, lon
@@ -368,6 +373,7 @@ class Centroids():
             var_name not in ('lat', 'lon'):
                 setattr(self, var_name, np.append(var_val, centr_val). \
                         astype(var_val.dtype, copy=False))
+        self._spatial_index = None
 
     def get_closest_point(self, x_lon, y_lat, scheduler=None):
         """ Returns closest centroid and its index to a given point.
@@ -375,8 +381,7 @@ class Centroids():
         Parameters:
             x_lon (float): x coord (lon)
             y_lat (float): y coord (lat)
-            scheduler (str): used for dask map_partitions. “threads”,
-                “synchronous” or “processes”
+            scheduler (str): not used, points are searched in spatial_index
 
         Returns:
             x_close (float), y_close (float), idx_close (int)
@@ -388,22 +393,25 @@ class Centroids():
             i_lon = np.floor((x_lon - self.meta['transform'][2])/abs(self.meta['transform'][0]))
             close_idx = int(i_lat*self.meta['width'] + i_lon)
         else:
-            self.set_geometry_points(scheduler)
-            close_idx = self.geometry.distance(Point(x_lon, y_lat)).values.argmin()
+            close_idx = self.spatial_index.nn_planar(y_lat, x_lon)
         return self.lon[close_idx], self.lat[close_idx], close_idx
 
-    def set_region_id(self, scheduler=None):
+    def set_region_id(self, scheduler=None, precomputed=False):
         """ Set region_id as country ISO numeric code attribute for every pixel
         or point
 
         Parameter:
             scheduler (str): used for dask map_partitions. “threads”,
                 “synchronous” or “processes”
+            precomputed (bool, optional): look the points up in the global grid
+                of country codes of resolution COUNTRY_GRID_RES instead of the
+                country geometries. Default: False
         """
         ne_geom = self._ne_crs_geom(scheduler)
         LOGGER.debug('Setting region_id %s points.', str(self.lat.size))
         self.region_id = get_country_code(ne_geom.geometry[:].y.values,
-                                          ne_geom.geometry[:].x.values)
+                                          ne_geom.geometry[:].x.values,
+                                          precomputed=precomputed)
 
     def set_area_pixel(self, min_resol=1.0e-8, scheduler=None):
         """ Set area_pixel attribute for every pixel or point. area in m*m
@@ -476,28 +484,42 @@ class Centroids():
             LOGGER.error('Pixel area of points can not be computed.')
             raise ValueError
 
-    def set_dist_coast(self, scheduler=None):
+    def set_dist_coast(self, scheduler=None, precomputed=False):
         """ Set dist_coast attribute for every pixel or point. Distance to
-        coast is computed in meters.
+        coast is computed in meters. The distances of the exact computation
+        are stored in DIST_COAST_DIR and reused for the same points, see
+        climada.util.coordinates.clear_dist_coast_cache.
 
         Parameter:
             scheduler (str): used for dask map_partitions. “threads”,
                 “synchronous” or “processes”
+            precomputed (bool, optional): interpolate the distances from a
+                global grid of resolution DIST_COAST_GRID_RES instead of
+                computing them exactly. Default: False
         """
         ne_geom = self._ne_crs_geom(scheduler)
         LOGGER.debug('Setting dist_coast %s points.', str(self.lat.size))
-        self.dist_coast = dist_to_coast(ne_geom)
+        if precomputed:
+            self.dist_coast = dist_to_coast_raster(ne_geom.geometry[:].y.values,
+                                                   ne_geom.geometry[:].x.values)
+        else:
+            self.dist_coast = dist_to_coast_cached(ne_geom.geometry[:].y.values,
+                                                   ne_geom.geometry[:].x.values)
 
-    def set_on_land(self, scheduler=None):
+    def set_on_land(self, scheduler=None, precomputed=False):
         """ Set on_land attribute for every pixel or point
 
         Parameter:
             scheduler (str): used for dask map_partitions. “threads”,
                 “synchronous” or “processes”
+            precomputed (bool, optional): look the points up in the global
+                land mask of resolution LAND_MASK_GRID_RES instead of the land
+                geometry. Default: False
         """
         ne_geom = self._ne_crs_geom(scheduler)
         LOGGER.debug('Setting on_land %s points.', str(self.lat.size))
-        self.on_land = coord_on_land(ne_geom.geometry[:].y.values, ne_geom.geometry[:].x.values)
+        self.on_land = coord_on_land(ne_geom.geometry[:].y.values, ne_geom.geometry[:].x.values,
+                                     precomputed=precomputed)
 
     def remove_duplicate_points(self, scheduler=None):
         """ Return Centroids with removed duplicated points
@@ -510,9 +532,9 @@ class Centroids():
             Centroids
         """
         self.set_geometry_points(scheduler)
-        geom_wkb = self.geometry.apply(lambda geom: geom.wkb)
-        sel_cen = geom_wkb.drop_duplicates().index
-        return self.select(sel_cen=sel_cen)
+        _, sel_cen = np.unique(np.stack([self.geometry.x.values, \
+            self.geometry.y.values], axis=1), axis=0, return_index=True)
+        return self.select(sel_cen=np.sort(sel_cen))
 
     def select(self, reg_id=None, sel_cen=None):
         """ Return Centroids with points in the given reg_id or within mask
@@ -566,6 +588,7 @@ class Centroids():
         self.lon = x_grid.flatten()
         self.lat = y_grid.flatten()
         self.geometry = GeoSeries(crs=self.meta['crs'])
+        self._spatial_index = None
 
     def plot(self, axis=None, **kwargs):
         """ Plot centroids scatter points over earth.
@@ -610,7 +633,8 @@ class Centroids():
         self.geometry = GeoSeries(crs=self.geometry.crs)
 
     def write_hdf5(self, file_data):
-        """ Write centroids attributes into hdf5 format.
+        """ Write centroids attributes into hdf5 format. The spatial_index is
+        written too if it has been built.
 
         Parameter:
             file_data (str or h5): if string, path to write data. if h5 object,
@@ -639,6 +663,8 @@ class Centroids():
                             value.c, value.d, value.e, value.f], dtype=float)
         hf_str = data.create_dataset('crs', (1,), dtype=str_dt)
         hf_str[0] = str(dict(self.crs))
+        if self._spatial_index is not None:
+            self.spatial_index.write_hdf5(data)
 
         if isinstance(file_data, str):
             data.close()
@@ -675,8 +701,10 @@ class Centroids():
                     self.meta[key] = Affine(value[0], value[1], value[2],
                                             value[3], value[4], value[5])
         for centr_name in data.keys():
-            if centr_name not in ('crs', 'lat', 'lon', 'meta'):
+            if centr_name not in ('crs', 'lat', 'lon', 'meta', 'spatial_index'):
                 setattr(self, centr_name, np.array(data.get(centr_name)))
+        if data.get('spatial_index') is not None:
+            self.spatial_index.read_hdf5(data)
         if isinstance(file_data, str):
             data.close()
 
@@ -720,6 +748,18 @@ class Centroids():
         """ Get [lat, lon] array. Might take some time. """
         return np.array([self.lat, self.lon]).transpose()
 
+    @property
+    def spatial_index(self):
+        """ Get SpatialIndex of the points. It is built when first used and
+        rebuilt if lat or lon change. """
+        if not self.lat.size or not self.lon.size:
+            self.set_meta_to_lat_lon()
+        sp_idx = getattr(self, '_spatial_index', None)
+        if sp_idx is None or not np.array_equal(sp_idx.coord[:, 0], self.lat) \
+        or not np.array_equal(sp_idx.coord[:, 1], self.lon):
+            self._spatial_index = SpatialIndex(self.coord)
+        return self._spatial_index
+
     def set_geometry_points(self, scheduler=None):
         """ Set geometry attribute of GeoSeries with Points from latitude and
         longitude attributes if geometry not present.
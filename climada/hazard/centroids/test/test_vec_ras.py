@@ -23,6 +23,7 @@ from cartopy.io import shapereader
 from fiona.crs import from_epsg
 import geopandas as gpd
 import unittest
+import h5py
 import numpy as np
 from rasterio.windows import Window
 from rasterio.warp import Resampling
@@ -32,6 +33,7 @@ from shapely.geometry.polygon import Polygon
 from climada.hazard.centroids.centr import Centroids, DEM_NODATA
 from climada.util.constants import HAZ_DEMO_FL, DEF_CRS
 from climada.util.coordinates import NE_EPSG, equal_crs
+from climada.util.interpolation import SpatialIndex
 
 DATA_DIR = os.path.join(os.path.dirname(__file__), 'data')
 
@@ -704,6 +706,38 @@ class TestCentroidsFuncs(unittest.TestCase):
         self.assertEqual(fil_centr.lon[1], VEC_LON[200])
         self.assertTrue(np.array_equal(fil_centr.region_id, np.ones(2)*10))
 
+    def test_spatial_index_pass(self):
+        """ Test spatial_index is kept, rebuilt and written """
+        file_name = os.path.join(DATA_DIR, 'test_centr.h5')
+        centr = Centroids()
+        centr.set_lat_lon(VEC_LAT, VEC_LON)
+        sp_idx = centr.spatial_index
+        self.assertIs(centr.spatial_index, sp_idx)
+        self.assertEqual(sp_idx.size, VEC_LAT.size)
+        coord = np.array([[12.3, -59.1], [14, -60.5]])
+        neigh = sp_idx.nn_aprox(coord)
+
+        centr.write_hdf5(file_name)
+        centr_read = Centroids()
+        centr_read.read_hdf5(file_name)
+        self.assertIsNotNone(centr_read._spatial_index._bands)
+        self.assertTrue(np.array_equal(centr_read.spatial_index.nn_aprox(coord),
+                                       neigh))
+        with h5py.File(file_name, 'r') as hf_data:
+            self.assertIsInstance(hf_data['spatial_index'], h5py.Group)
+            self.assertEqual(hf_data['spatial_index/bands/cen'].size, VEC_LAT.size)
+            sp_other = SpatialIndex(np.column_stack((VEC_LAT, VEC_LON + 1)))
+            sp_other.read_hdf5(hf_data)
+        self.assertIsNone(sp_other._bands)
+
+        centr_read.lat = centr_read.lat + 1
+        self.assertIsNone(centr_read.spatial_index._bands)
+        centr_app = Centroids()
+        centr_app.set_lat_lon(VEC_LAT + 1, VEC_LON)
+        centr.append(centr_app)
+        self.assertIsNone(centr._spatial_index)
+        self.assertEqual(centr.spatial_index.size, 2 * VEC_LAT.size)
+
 # Execute Tests
 if __name__ == "__main__":
     TESTS = unittest.TestLoader().loadTestsFromTestCase(TestRaster)
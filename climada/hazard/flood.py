@@ -353,7 +353,8 @@ class RiverFlood(Hazard):
             MemoryError
         """
         if centr_indices is None:
-            centr_indices = interpol_index(self.centroids.coord, coordinates)
+            centr_indices = interpol_index(self.centroids.spatial_index,
+                                           coordinates)
         self.centroids.set_area_pixel()
         area_centr = self.centroids.area_pixel[centr_indices]
         event_years = np.array([date.fromordinal(self.date[i]).year
@@ -123,13 +123,15 @@ class StormEurope(Hazard):
 
         LOGGER.info('Commencing to iterate over netCDF files.')
 
+        list_haz = list()
         for file_name in file_names:
             if any(fo in file_name for fo in files_omit):
                 LOGGER.info("Omitting file %s", file_name)
                 continue
             new_haz = self._read_one_nc(file_name, centroids)
             if new_haz is not None:
-                self.append(new_haz)
+                list_haz.append(new_haz)
+        self.concat(list_haz)
 
         self.event_id = np.arange(1, len(self.event_id)+1)
         self.frequency = np.divide(
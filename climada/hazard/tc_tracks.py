@@ -19,12 +19,14 @@ with CLIMADA. If not, see <https://www.gnu.org/licenses/>.
 Define TCTracks: IBTracs reader and tracks manager.
 """
 
-__all__ = ['SAFFIR_SIM_CAT', 'TCTracks', 'set_category']
+__all__ = ['SAFFIR_SIM_CAT', 'TCTracks', 'TrackColumns', 'set_category',
+           'clear_ibtracs_cache']
 
 import os
 import glob
 import shutil
 import logging
+import hashlib
 import datetime as dt
 import array
 import itertools
@@ -37,11 +39,11 @@ import matplotlib.pyplot as plt
 import cartopy.crs as ccrs
 import pandas as pd
 import xarray as xr
-from sklearn.neighbors import DistanceMetric
+import h5py
 import netCDF4 as nc
-from numba import jit
 from pint import UnitRegistry
 import scipy.io.matlab as matlab
+from scipy.interpolate import interp1d
 
 from climada.util.config import CONFIG
 import climada.util.coordinates as coord_util
@@ -71,6 +73,267 @@ IBTRACS_FILE = 'IBTrACS.ALL.v04r00.nc'
 DEF_ENV_PRESSURE = 1010
 """ Default environmental pressure """
 
+TRACK_COORDS = ['time', 'lat', 'lon']
+""" Coordinates of the nodes of a track """
+
+HDF5_NODE_CHUNK = 2**16
+""" Number of nodes per chunk of the node variables in hdf5 files """
+
+HDF5_TRACK_CHUNK = 2**10
+""" Number of tracks per chunk of the track attributes in hdf5 files """
+
+IBTRACS_CACHE_DIR = os.path.join(SYSTEM_DIR, 'ibtracs_cache')
+""" Directory of the tracks read from IBTrACS files with read_ibtracs_netcdf """
+
+IBTRACS_CACHE_MAX_MB = 2000
+""" Maximum size of IBTRACS_CACHE_DIR in MB. The least recently used tracks
+are removed when it is exceeded. """
+
+IBTRACS_CACHE_VERSION = 1
+""" Version of the tracks stored in IBTRACS_CACHE_DIR. Increase it when the
+IBTrACS reader or the hdf5 format of TrackColumns change, so that tracks
+cached by older versions are not used. """
+
+class TrackColumns():
+    """Tropical cyclone tracks stored column-wise: the values of the nodes of
+    all the tracks are concatenated in one array per variable, and the
+    attributes of the tracks are stored in one array per attribute.
+
+    Attributes:
+        node (dict): key = node variable (time, lat, lon, time_step,
+            radius_max_wind, ...), value = np.array with the values of all
+            the nodes, track after track
+        attrs (dict): key = track attribute (name, sid, orig_event_flag,
+            ...), value = np.array of objects with one value per track
+        offsets (np.array): position of the first node of every track in the
+            node arrays, and total number of nodes as last element
+    """
+    def __init__(self):
+        """ Empty constructor. """
+        self.node = dict()
+        self.attrs = dict()
+        self.offsets = np.zeros(1, int)
+
+    @staticmethod
+    def from_datasets(tracks):
+        """ Concatenate tracks. The variables and attributes kept are the
+        ones of the first track which are in all the tracks.
+
+        Parameters:
+            tracks (list(xr.Dataset)): tracks
+
+        Returns:
+            TrackColumns
+        """
+        columns = TrackColumns()
+        if not tracks:
+            return columns
+        node_vars = TRACK_COORDS + [var for var in tracks[0].data_vars
+                                    if tracks[0][var].dims == ('time',) and
+                                    all(var in track.data_vars for track in tracks)]
+        for var in node_vars:
+            columns.node[var] = np.concatenate([track[var].values for track in tracks])
+        for key in tracks[0].attrs:
+            if all(key in track.attrs for track in tracks):
+                columns.attrs[key] = np.empty(len(tracks), dtype=object)
+                for i_track, track in enumerate(tracks):
+                    columns.attrs[key][i_track] = track.attrs[key]
+        columns.offsets = np.cumsum([0] + [track.time.size for track in tracks])
+        return columns
+
+    @staticmethod
+    def concatenate(columns_list):
+        """ Concatenate the tracks of several TrackColumns. The variables and
+        attributes kept are the ones of the first which are in all of them.
+
+        Parameters:
+            columns_list (list(TrackColumns)): tracks
+
+        Returns:
+            TrackColumns
+        """
+        columns = TrackColumns()
+        if not columns_list:
+            return columns
+        for var in columns_list[0].node:
+            if all(var in col.node for col in columns_list):
+                columns.node[var] = np.concatenate([col.node[var] for col in columns_list])
+        for key in columns_list[0].attrs:
+            if all(key in col.attrs for col in columns_list):
+                columns.attrs[key] = np.concatenate([col.attrs[key] for col in columns_list])
+        columns.offsets = np.cumsum(np.concatenate([[0]] + \
+            [col.num_nodes for col in columns_list])).astype(int)
+        return columns
+
+    @property
+    def size(self):
+        """ Number of tracks """
+        return self.offsets.size - 1
+
+    @property
+    def num_nodes(self):
+        """ Number of nodes of every track """
+        return np.diff(self.offsets)
+
+    def nodes(self, i_track):
+        """ Node values of one track, without copy.
+
+        Parameters:
+            i_track (int): track position
+
+        Returns:
+            dict: key = node variable, value = np.array
+        """
+        node_sl = slice(self.offsets[i_track], self.offsets[i_track+1])
+        return {var: val[node_sl] for var, val in self.node.items()}
+
+    def to_dataset(self, i_track):
+        """ Track as xr.Dataset. The values of the variables are views of
+        the node arrays.
+
+        Parameters:
+            i_track (int): track position
+
+        Returns:
+            xr.Dataset
+        """
+        track_nodes = self.nodes(i_track)
+        track = xr.Dataset({var: ('time', val) for var, val in track_nodes.items()
+                            if var not in TRACK_COORDS},
+                           coords={'time': track_nodes['time'],
+                                   'lat': ('time', track_nodes['lat']),
+                                   'lon': ('time', track_nodes['lon'])})
+        track.attrs = {key: val[i_track] for key, val in self.attrs.items()}
+        return track
+
+    def to_datasets(self):
+        """ All the tracks as xr.Dataset, see to_dataset.
+
+        Returns:
+            list(xr.Dataset)
+        """
+        return [self.to_dataset(i_track) for i_track in range(self.size)]
+
+    def write_hdf5(self, file_name, append=False):
+        """ Write tracks in one hdf5 file: offsets, one dataset per node
+        variable in group node, one per track attribute in group attrs and
+        the year of the first node of every track in index/year. The datasets
+        are chunked and extendable, so that tracks can be appended to the file
+        without rewriting it.
+
+        Parameters:
+            file_name (str): file name to write, with h5 format
+            append (bool, optional): append the tracks to the ones of an
+                existing file written with write_hdf5. The node variables and
+                the attributes have to be the same. Default: False
+
+        Raises:
+            ValueError
+        """
+        node_val = {var: val.view('i8') if val.dtype.kind == 'M' else val
+                    for var, val in self.node.items()}
+        attrs_val = {key: _hdf5_attr_values(key, val) for key, val in self.attrs.items()}
+        year = np.full(self.size, -1)
+        if 'time' in self.node:
+            year[self.num_nodes > 0] = self.node['time'][self.offsets[:-1][ \
+                self.num_nodes > 0]].astype('datetime64[Y]').astype(int) + 1970
+
+        if append and os.path.isfile(file_name):
+            with h5py.File(file_name, 'a') as hf_data:
+                if hf_data['offsets'].size > 1:
+                    if set(hf_data['node']) != set(node_val) or \
+                    set(hf_data['attrs']) != set(attrs_val):
+                        LOGGER.error('Tracks with different variables than %s.',
+                                     file_name)
+                        raise ValueError
+                    LOGGER.info('Appending %s tracks to %s', self.size, file_name)
+                    _append_hdf5(hf_data['offsets'], self.offsets[1:] + \
+                                 hf_data['offsets'][-1])
+                    for var, val in node_val.items():
+                        _append_hdf5(hf_data['node'][var], val)
+                    for key, val in attrs_val.items():
+                        _append_hdf5(hf_data['attrs'][key], val)
+                    _append_hdf5(hf_data['index']['year'], year)
+                    return
+
+        LOGGER.info('Writting %s', file_name)
+        with h5py.File(file_name, 'w') as hf_data:
+            _create_hdf5_ext(hf_data, 'offsets', self.offsets, HDF5_TRACK_CHUNK)
+            hf_node = hf_data.create_group('node', track_order=True)
+            for var, val in node_val.items():
+                hf_var = _create_hdf5_ext(hf_node, var, val, HDF5_NODE_CHUNK)
+                if self.node[var].dtype.kind == 'M':
+                    hf_var.attrs['datetime'] = str(self.node[var].dtype)
+            hf_attrs = hf_data.create_group('attrs', track_order=True)
+            for key, val in attrs_val.items():
+                _create_hdf5_ext(hf_attrs, key, val, HDF5_TRACK_CHUNK)
+            _create_hdf5_ext(hf_data.create_group('index'), 'year', year,
+                             HDF5_TRACK_CHUNK)
+
+    def read_hdf5(self, file_name, sid=None, basin=None, year_range=None):
+        """ Read tracks written with write_hdf5. If a selection is provided,
+        only the nodes of the selected tracks are read from the file.
+
+        Parameters:
+            file_name (str): file name to read, with h5 format
+            sid (str or list(str), optional): sid of the tracks to read
+            basin (str or list(str), optional): basin of the tracks to read
+            year_range (tuple, optional): (min_year, max_year) of the first
+                node of the tracks to read
+
+        Raises:
+            ValueError
+        """
+        LOGGER.info('Reading %s', file_name)
+        self.__init__()
+        with h5py.File(file_name, 'r') as hf_data:
+            offsets = hf_data['offsets'][:]
+            sel_tracks = np.ones(offsets.size - 1, bool)
+            for key, sel_val in (('sid', sid), ('basin', basin)):
+                if sel_val is None:
+                    continue
+                if key not in hf_data['attrs']:
+                    LOGGER.error('Tracks in %s without attribute %s.', file_name, key)
+                    raise ValueError
+                if not isinstance(sel_val, list):
+                    sel_val = [sel_val]
+                sel_tracks &= np.isin(_read_hdf5_attr(hf_data['attrs'][key]), sel_val)
+            if year_range is not None:
+                year = hf_data['index']['year'][:]
+                sel_tracks &= (year >= year_range[0]) & (year <= year_range[1])
+
+            num_nodes = np.diff(offsets)[sel_tracks]
+            self.offsets = np.cumsum(np.concatenate([[0], num_nodes])).astype(int)
+            self.attrs = {key: _read_hdf5_attr(hf_key, sel_tracks) \
+                          for key, hf_key in hf_data['attrs'].items()}
+            node_idx = None
+            if not sel_tracks.all():
+                node_idx = np.arange(self.offsets[-1]) + np.repeat( \
+                    offsets[:-1][sel_tracks] - self.offsets[:-1], num_nodes)
+            for var, hf_var in hf_data['node'].items():
+                self.node[var] = _read_hdf5_nodes(hf_var, node_idx)
+                if 'datetime' in hf_var.attrs:
+                    self.node[var] = self.node[var].view(hf_var.attrs['datetime'])
+
+    def select(self, sel_tracks):
+        """ Tracks in the given positions, with copied values.
+
+        Parameters:
+            sel_tracks (np.array): positions of the tracks (int) or mask (bool)
+
+        Returns:
+            TrackColumns
+        """
+        sel_tracks = np.arange(self.size)[sel_tracks]
+        num_nodes = self.num_nodes[sel_tracks]
+        columns = TrackColumns()
+        columns.offsets = np.cumsum(np.concatenate([[0], num_nodes])).astype(int)
+        node_idx = np.arange(columns.offsets[-1]) + np.repeat( \
+            self.offsets[sel_tracks] - columns.offsets[:-1], num_nodes)
+        columns.node = {var: val[node_idx] for var, val in self.node.items()}
+        columns.attrs = {key: val[sel_tracks] for key, val in self.attrs.items()}
+        return columns
+
 class TCTracks():
     """Contains tropical cyclone tracks.
 
@@ -97,16 +360,46 @@ class TCTracks():
             computed during processing:
                 - on_land
                 - dist_since_lf
+        columns (TrackColumns): the same tracks stored column-wise. data and
+            columns are converted into each other when needed. Get data again
+            after columns to modify the tracks.
     """
     def __init__(self, pool=None):
         """Empty constructor. Read csv IBTrACS files if provided. """
-        self.data = list()
+        self._data = list()
+        self._columns = None
         if pool:
             self.pool = pool
             LOGGER.debug('Using %s CPUs.', self.pool.ncpus)
         else:
             self.pool = None
 
+    @property
+    def data(self):
+        """ Tracks as list of xarray.Dataset """
+        if self._data is None:
+            self._data = self._columns.to_datasets()
+        # the tracks might be modified through the list
+        self._columns = None
+        return self._data
+
+    @data.setter
+    def data(self, tracks):
+        self._data = tracks
+        self._columns = None
+
+    @property
+    def columns(self):
+        """ Tracks as TrackColumns """
+        if self._columns is None:
+            self._columns = TrackColumns.from_datasets(self._data)
+        return self._columns
+
+    @columns.setter
+    def columns(self, columns):
+        self._columns = columns
+        self._data = None
+
     def append(self, tracks):
         """Append tracks to current.
 
@@ -132,6 +425,17 @@ class TCTracks():
                 return self.data[0]
             return self.data
 
+        if self._data is None:
+            track_pos = np.zeros(self.size, bool)
+            for key in ('name', 'sid'):
+                if key in self._columns.attrs:
+                    track_pos |= self._columns.attrs[key] == track_name
+            track_pos = track_pos.nonzero()[0]
+            if track_pos.size:
+                return self._columns.to_dataset(track_pos[0])
+            LOGGER.info('No track with name or sid %s found.', track_name)
+            return []
+
         for track in self.data:
             if track.name == track_name:
                 return track
@@ -143,7 +447,8 @@ class TCTracks():
 
     def read_ibtracs_netcdf(self, provider='usa', storm_id=None,
                             year_range=(1980, 2018), basin=None,
-                            file_name='IBTrACS.ALL.v04r00.nc', correct_pres=True):
+                            file_name='IBTrACS.ALL.v04r00.nc', correct_pres=True,
+                            cache=True):
         """Fill from raw ibtracs v04. Removes nans in coordinates, central
         pressure and removes repeated times data. Fills nans of environmental_pressure
         and radius_max_wind. Checks environmental_pressure > central_pressure.
@@ -159,6 +464,13 @@ class TCTracks():
                 at climada/data/system. Default: 'IBTrACS.ALL.v04r00.nc'.
             correct_pres (bool, optional): correct central pressure if missing
                 values. Default: False
+            cache (bool, optional): reuse the tracks read before with the same
+                file content and parameters, stored in IBTRACS_CACHE_DIR. See
+                clear_ibtracs_cache. Default: True
+
+        The variables of all the selected storms are read at once and
+        processed as arrays. If a pool is set, chunks of storms are read by
+        the processes.
         """
         self.data = list()
         fn_nc = os.path.join(os.path.abspath(SYSTEM_DIR), file_name)
@@ -172,13 +484,34 @@ class TCTracks():
                              'climada_python/data/system/', IBTRACS_URL)
                 raise err
 
-        sel_tracks = self._filter_ibtracs(fn_nc, storm_id, year_range, basin)
-        nc_data = nc.Dataset(fn_nc)
-        all_tracks = []
-        for i_track in sel_tracks:
-            all_tracks.append(self._read_one_raw(nc_data, i_track, provider,
-                                                 correct_pres))
-        self.data = [track for track in all_tracks if track is not None]
+        if cache:
+            cache_file = _ibtracs_cache_file(fn_nc, provider, storm_id,
+                                             year_range, basin, correct_pres)
+            if os.path.isfile(cache_file):
+                columns = TrackColumns()
+                columns.read_hdf5(cache_file)
+                # access time for the removal of the least recently used
+                os.utime(cache_file)
+                self.columns = columns
+                return
+
+        with nc.Dataset(fn_nc) as nc_data:
+            sel_tracks = self._filter_ibtracs(nc_data, storm_id, year_range, basin)
+            if self.pool and sel_tracks.size > 1:
+                chunksize = max(min(sel_tracks.size//self.pool.ncpus, 1000), 1)
+                sel_chunks = [sel_tracks[i_chk:i_chk+chunksize] \
+                              for i_chk in range(0, sel_tracks.size, chunksize)]
+                columns = TrackColumns.concatenate(self.pool.map( \
+                    _read_ibtracs_file, itertools.repeat(fn_nc, len(sel_chunks)),
+                    sel_chunks, itertools.repeat(provider, len(sel_chunks)),
+                    itertools.repeat(correct_pres, len(sel_chunks))))
+            else:
+                columns = _read_ibtracs_tracks(nc_data, sel_tracks, provider,
+                                               correct_pres)
+        LOGGER.info('Read %s tracks.', columns.size)
+        self.columns = columns
+        if cache:
+            _write_ibtracs_cache(columns, cache_file)
 
     def read_processed_ibtracs_csv(self, file_names):
         """Fill from processed ibtracs csv file.
@@ -255,7 +588,8 @@ class TCTracks():
                     tr_ds['radius_max_wind'] *= 2
                 self.data.append(tr_ds)
 
-    def equal_timestep(self, time_step_h=1, land_params=False):
+    def equal_timestep(self, time_step_h=1, land_params=False,
+                       precomputed_land=False):
         """ Generate interpolated track values to time steps of min_time_step.
 
         Parameters:
@@ -263,30 +597,34 @@ class TCTracks():
                 interpolate. Default: 1.
             land_params (bool, optional): compute on_land and dist_since_lf at
                 each node. Default: False.
+            precomputed_land (bool, optional): use the global land mask
+                instead of the land geometry for on_land. Default: False.
         """
         LOGGER.info('Interpolating %s tracks to %sh time steps.', self.size,
                     time_step_h)
 
+        columns = self.columns
         if land_params:
-            land_geom = _calc_land_geom(self.data)
+            land_geom = _calc_land_geom(columns, precomputed_land)
         else:
             land_geom = None
 
-        if self.pool:
-            chunksize = min(self.size//self.pool.ncpus, 1000)
-            self.data = self.pool.map(self._one_interp_data, self.data,
-                                      itertools.repeat(time_step_h, self.size),
-                                      itertools.repeat(land_geom, self.size),
-                                      chunksize=chunksize)
+        if self.pool and self.size > 1:
+            chunksize = max(min(self.size//self.pool.ncpus, 1000), 1)
+            track_chunks = [columns.select(slice(i_chk, i_chk+chunksize)) \
+                            for i_chk in range(0, self.size, chunksize)]
+            columns = TrackColumns.concatenate(self.pool.map(_interp_columns, \
+                track_chunks, itertools.repeat(time_step_h, len(track_chunks))))
         else:
-            new_data = list()
-            for track in self.data:
-                new_data.append(self._one_interp_data(track, time_step_h,
-                                                      land_geom))
-            self.data = new_data
+            columns = _interp_columns(columns, time_step_h)
+
+        if land_geom is not None:
+            _columns_land_params(columns, land_geom)
+        self.columns = columns
 
     def calc_random_walk(self, ens_size=9, ens_amp0=1.5, max_angle=np.pi/10, \
-        ens_amp=0.1, seed=CONFIG['trop_cyclone']['random_seed'], decay=True):
+        ens_amp=0.1, seed=CONFIG['trop_cyclone']['random_seed'], decay=True,
+        precomputed_land=False):
         """ Generate synthetic tracks. An ensamble of tracks is computed for
         every track contained.
 
@@ -303,6 +641,8 @@ class TCTracks():
                 value if you don't want to use it. Default: configuration file
             decay (bool, optional): compute land decay in probabilistic tracks.
                 Default: True
+            precomputed_land (bool, optional): use the global land mask
+                instead of the land geometry in the land decay. Default: False
         """
         LOGGER.info('Computing %s synthetic tracks.', ens_size*self.size)
 
@@ -312,31 +652,15 @@ class TCTracks():
         if seed >= 0:
             np.random.seed(seed)
 
-        random_vec = list()
-        for track in self.data:
-            random_vec.append(np.random.uniform(size=ens_size*(2+track.time.size)))
-
-        num_tracks = self.size
-        new_ens = list()
-        if self.pool:
-            chunksize = min(num_tracks//self.pool.ncpus, 1000)
-            new_ens = self.pool.map(self._one_rnd_walk, self.data,
-                                    itertools.repeat(ens_size, num_tracks),
-                                    itertools.repeat(ens_amp0, num_tracks),
-                                    itertools.repeat(ens_amp, num_tracks),
-                                    itertools.repeat(max_angle, num_tracks),
-                                    random_vec, chunksize=chunksize)
-        else:
-            for i_track, track in enumerate(self.data):
-                new_ens.append(self._one_rnd_walk(track, ens_size, ens_amp0, \
-                               ens_amp, max_angle, random_vec[i_track]))
-        self.data = list()
-        for ens_track in new_ens:
-            self.data.extend(ens_track)
+        # same random numbers as drawn track after track
+        random_vec = np.random.uniform(size=int(np.sum(ens_size * \
+            (2 + self.columns.num_nodes))))
+        self.columns = _rnd_walk_columns(self.columns, ens_size, ens_amp0,
+                                         ens_amp, max_angle, random_vec)
 
         if decay:
             try:
-                land_geom = _calc_land_geom(self.data)
+                land_geom = _calc_land_geom(self.columns, precomputed_land)
                 v_rel, p_rel = self._calc_land_decay(land_geom)
                 self._apply_land_decay(v_rel, p_rel, land_geom)
             except ValueError as err:
@@ -346,7 +670,9 @@ class TCTracks():
     @property
     def size(self):
         """ Get longitude from coord array """
-        return len(self.data)
+        if self._data is None:
+            return self._columns.size
+        return len(self._data)
 
     def plot(self, axis=None, **kwargs):
         """Track over earth. Historical events are blue, probabilistic black.
@@ -421,6 +747,7 @@ class TCTracks():
 
     def write_netcdf(self, folder_name):
         """ Write a netcdf file per track with track.sid name in given folder.
+        Use write_hdf5 to write many tracks in one file.
 
         Parameter:
             folder_name (str): folder name where to write files
@@ -447,97 +774,32 @@ class TCTracks():
             track.attrs['orig_event_flag'] = bool(track.orig_event_flag)
             self.data.append(track)
 
-    @staticmethod
-    @jit(parallel=True)
-    def _one_rnd_walk(track, ens_size, ens_amp0, ens_amp, max_angle, rnd_vec):
-        """ Interpolate values of one track.
+    def write_hdf5(self, file_name, append=False):
+        """ Write all the tracks in one hdf5 file, see TrackColumns.write_hdf5.
 
         Parameters:
-            track (xr.Dataset): track data
-
-        Returns:
-            list(xr.Dataset)
+            file_name (str): file name to write, with h5 format
+            append (bool, optional): append the tracks to the ones of the
+                existing file. Default: False
         """
-        ens_track = list()
-        n_dat = track.time.size
-        rand_unif_ini = rnd_vec[:2*ens_size].reshape((2, ens_size))
-        rand_unif_ang = rnd_vec[2*ens_size:]
+        self.columns.write_hdf5(file_name, append)
 
-        xy_ini = ens_amp0 * (rand_unif_ini - 0.5)
-        tmp_ang = np.cumsum(2 * max_angle * rand_unif_ang - max_angle)
-        coord_xy = np.empty((2, ens_size * n_dat))
-        coord_xy[0] = np.cumsum(ens_amp * np.sin(tmp_ang))
-        coord_xy[1] = np.cumsum(ens_amp * np.cos(tmp_ang))
-
-        ens_track.append(track)
-        for i_ens in range(ens_size):
-            i_track = track.copy(True)
-
-            d_xy = coord_xy[:, i_ens * n_dat: (i_ens + 1) * n_dat] - \
-                np.expand_dims(coord_xy[:, i_ens * n_dat], axis=1)
-            # change sign of latitude change for southern hemishpere:
-            d_xy = np.sign(track.lat.values[0]) * d_xy 
-
-            d_lat_lon = d_xy + np.expand_dims(xy_ini[:, i_ens], axis=1)
-
-            i_track.lon.values = i_track.lon.values + d_lat_lon[0, :]
-            i_track.lat.values = i_track.lat.values + d_lat_lon[1, :]
-            i_track.attrs['orig_event_flag'] = False
-            i_track.attrs['name'] = i_track.attrs['name'] + '_gen' + str(i_ens+1)
-            i_track.attrs['sid'] = i_track.attrs['sid'] + '_gen' + str(i_ens+1)
-            i_track.attrs['id_no'] = i_track.attrs['id_no'] + (i_ens+1)/100
-
-            ens_track.append(i_track)
-
-        return ens_track
-
-    @staticmethod
-    @jit(parallel=True)
-    def _one_interp_data(track, time_step_h, land_geom=None):
-        """ Interpolate values of one track.
+    def read_hdf5(self, file_name, sid=None, basin=None, year_range=None):
+        """ Read tracks written with write_hdf5. Only the nodes of the
+        selected tracks are read from the file.
 
         Parameters:
-            track (xr.Dataset): track data
-
-        Returns:
-            xr.Dataset
+            file_name (str): file name to read, with h5 format
+            sid (str or list(str), optional): sid of the tracks to read.
+                Default: all
+            basin (str or list(str), optional): basin of the tracks to read.
+                Default: all
+            year_range (tuple, optional): (min_year, max_year) of the first
+                node of the tracks to read. Default: all
         """
-        if track.time.size > 3:
-            time_step = str(time_step_h) + 'H'
-            track_int = track.resample(time=time_step).interpolate('linear')
-            track_int['time_step'] = ('time', track_int.time.size * [time_step_h])
-            # handle change of sign in longitude
-            pos_lon = track.coords['lon'].values > 0
-            neg_lon = track.coords['lon'].values <= 0
-            if neg_lon.any() and pos_lon.any() and \
-            np.any(abs(track.coords['lon'].values[pos_lon]) > 170):
-                if neg_lon[0]:
-                    track.coords['lon'].values[pos_lon] -= 360
-                    track_int.coords['lon'] = track.lon.resample(time=time_step).\
-                    interpolate('cubic')
-                    track_int.coords['lon'][track_int.coords['lon'] < -180] += 360
-                else:
-                    track.coords['lon'].values[neg_lon] += 360
-                    track_int.coords['lon'] = track.lon.resample(time=time_step).\
-                    interpolate('cubic')
-                    track_int.coords['lon'][track_int.coords['lon'] > 180] -= 360
-            else:
-                track_int.coords['lon'] = track.lon.resample(time=time_step).\
-                    interpolate('cubic')
-            track_int.coords['lat'] = track.lat.resample(time=time_step).\
-                                      interpolate('cubic')
-            track_int.attrs = track.attrs
-            track_int.attrs['category'] = set_category( \
-                track.max_sustained_wind.values, \
-                track.max_sustained_wind_unit)
-        else:
-            LOGGER.warning('Track interpolation not done. ' \
-                           'Not enough elements for %s', track.name)
-            track_int = track
-
-        if land_geom:
-            _track_land_params(track_int, land_geom)
-        return track_int
+        columns = TrackColumns()
+        columns.read_hdf5(file_name, sid, basin, year_range)
+        self.columns = columns
 
     def _calc_land_decay(self, land_geom, s_rel=True, check_plot=False):
         """Compute wind and pressure decay coefficients for every TC category
@@ -546,7 +808,8 @@ class TCTracks():
             - pressure decay = S-(S-1)*exp(-x*B)
 
         Parameters:
-            land_geom (shapely.geometry.multipolygon.MultiPolygon): land geometry
+            land_geom (shapely.geometry.multipolygon.MultiPolygon or np.array):
+            land geometry or land mask
             s_rel (bool, optional): use environmental presure to calc S value
                 (true) or central presure (false)
             check_plot (bool, optional): visualize computed coefficients.
@@ -555,8 +818,9 @@ class TCTracks():
         Returns:
             v_rel (dict(category: A)), p_rel (dict(category: (S, B)))
         """
-        hist_tracks = [track for track in self.data if track.orig_event_flag]
-        if not hist_tracks:
+        columns = self.columns
+        hist_tracks = columns.attrs['orig_event_flag'].astype(bool)
+        if not hist_tracks.any():
             LOGGER.error('No historical tracks contained. Historical tracks' \
                          ' are needed.')
             raise ValueError
@@ -570,22 +834,13 @@ class TCTracks():
         # x-scale values to compute landfall decay
         x_val = dict()
 
-        dec_val = list()
-        if self.pool:
-            chunksize = min(len(hist_tracks)//self.pool.ncpus, 1000)
-            dec_val = self.pool.map(_decay_values, hist_tracks, itertools.repeat(land_geom),
-                                    itertools.repeat(s_rel), chunksize=chunksize)
-        else:
-            for track in hist_tracks:
-                dec_val.append(_decay_values(track, land_geom, s_rel))
-
-        for (tv_lf, tp_lf, tx_val) in dec_val:
-            for key in tv_lf.keys():
-                v_lf.setdefault(key, []).extend(tv_lf[key])
-                p_lf.setdefault(key, ([], []))
-                p_lf[key][0].extend(tp_lf[key][0])
-                p_lf[key][1].extend(tp_lf[key][1])
-                x_val.setdefault(key, []).extend(tx_val[key])
+        _columns_land_params(columns, land_geom, hist_tracks)
+        self.columns = columns
+        tv_lf, tp_lf, tx_val = _columns_decay_values(columns, hist_tracks, s_rel)
+        for key in tv_lf.keys():
+            v_lf[key] = list(tv_lf[key])
+            p_lf[key] = (list(tp_lf[key][0]), list(tp_lf[key][1]))
+            x_val[key] = list(tx_val[key])
 
         v_rel, p_rel = _decay_calc_coeff(x_val, v_lf, p_lf)
         if check_plot:
@@ -601,13 +856,15 @@ class TCTracks():
             v_rel (dict): {category: A}, where wind decay = exp(-x*A)
             p_rel (dict): (category: (S, B)}, where pressure decay
                 = S-(S-1)*exp(-x*B)
-            land_geom (shapely.geometry.multipolygon.MultiPolygon): land geometry
+            land_geom (shapely.geometry.multipolygon.MultiPolygon or np.array):
+            land geometry or land mask
             s_rel (bool, optional): use environmental presure to calc S value
                 (true) or central presure (false)
             check_plot (bool, optional): visualize computed changes
         """
-        sy_tracks = [track for track in self.data if not track.orig_event_flag]
-        if not sy_tracks:
+        columns = self.columns
+        sy_tracks = ~columns.attrs['orig_event_flag'].astype(bool)
+        if not sy_tracks.any():
             LOGGER.error('No synthetic tracks contained. Synthetic tracks' \
                          ' are needed.')
             raise ValueError
@@ -618,22 +875,13 @@ class TCTracks():
 
         if check_plot:
             orig_wind, orig_pres = [], []
-            for track in sy_tracks:
-                orig_wind.append(np.copy(track.max_sustained_wind.values))
-                orig_pres.append(np.copy(track.central_pressure.values))
-
-        if self.pool:
-            chunksize = min(self.size//self.pool.ncpus, 1000)
-            self.data = self.pool.map(_apply_decay_coeffs, self.data,
-                                      itertools.repeat(v_rel), itertools.repeat(p_rel),
-                                      itertools.repeat(land_geom), itertools.repeat(s_rel),
-                                      chunksize=chunksize)
-        else:
-            new_data = list()
-            for track in self.data:
-                new_data.append(_apply_decay_coeffs(track, v_rel, p_rel, \
-                    land_geom, s_rel))
-            self.data = new_data
+            for i_track in sy_tracks.nonzero()[0]:
+                orig_wind.append(np.copy(columns.nodes(i_track)['max_sustained_wind']))
+                orig_pres.append(np.copy(columns.nodes(i_track)['central_pressure']))
+
+        _columns_land_params(columns, land_geom, sy_tracks)
+        _columns_apply_decay(columns, sy_tracks, v_rel, p_rel, s_rel)
+        self.columns = columns
 
         if check_plot:
             _check_apply_decay_plot(self.data, orig_wind, orig_pres)
@@ -699,7 +947,7 @@ class TCTracks():
         """ Select tracks from input conditions.
 
         Parameters:
-            fn_nc (str): ibtracs netcdf data file name
+            fn_nc (str or nc.Dataset): ibtracs netcdf data file name or data
             storm_id (str os list): ibtrac id of the storm
             year_range(tuple): (min_year, max_year)
             basin (str): e.g. US, SA, NI, SI, SP, WP, EP, NA
@@ -707,20 +955,24 @@ class TCTracks():
         Returns:
             np.array
         """
-        nc_data = nc.Dataset(fn_nc)
-        storm_ids = [''.join(name.astype(str))
-                     for name in nc_data.variables['sid']]
-        sel_tracks = []
+        if isinstance(fn_nc, str):
+            with nc.Dataset(fn_nc) as nc_data:
+                return TCTracks._filter_ibtracs(nc_data, storm_id, year_range, basin)
+        nc_data = fn_nc
+        storm_ids = _char_to_str(nc_data.variables['sid'][:])
         # filter name
         if storm_id:
             if not isinstance(storm_id, list):
                 storm_id = [storm_id]
-            for storm in storm_id:
-                sel_tracks.append(storm_ids.index(storm))
-            sel_tracks = np.array(sel_tracks)
+            storm_pos = {sid: pos for pos, sid in enumerate(storm_ids)}
+            try:
+                sel_tracks = np.array([storm_pos[storm] for storm in storm_id])
+            except KeyError as err:
+                LOGGER.error('Storm %s not found.', err)
+                raise ValueError
         else:
             # filter years
-            years = np.array([int(iso_name[:4]) for iso_name in storm_ids])
+            years = storm_ids.astype('U4').astype(int)
             sel_tracks = np.argwhere(np.logical_and(years >= year_range[0], \
                 years <= year_range[1])).reshape(-1)
             if not sel_tracks.size:
@@ -729,128 +981,12 @@ class TCTracks():
                 return sel_tracks
             # filter basin
             if basin:
-                basin0 = np.array([''.join(bas.astype(str)) \
-                    for bas in nc_data.variables['basin'][:, 0, :]])[sel_tracks]
-                sel_bas = np.argwhere(basin0 == basin).reshape(-1)
+                basin0 = _char_to_str(nc_data.variables['basin'][:, 0, :])[sel_tracks]
+                sel_tracks = sel_tracks[basin0 == basin]
                 if not sel_tracks.size:
                     LOGGER.info('No tracks in basin %s.', basin)
-                    return sel_tracks
-                sel_tracks = sel_tracks[sel_bas]
         return sel_tracks
 
-    def _read_one_raw(self, nc_data, i_track, provider, correct_pres=False):
-        """Fill given track.
-
-            Parameters:
-            nc_data (Dataset): netcdf data set
-            i_track (int): track position in netcdf data
-            provider (str): data provider. e.g. usa, newdelhi, bom, cma, tokyo
-        """
-        name = ''.join(nc_data.variables['name'][i_track] \
-            [nc_data.variables['name'][i_track].mask == False].data.astype(str))
-        sid = ''.join(nc_data.variables['sid'][i_track].astype(str))
-        basin = ''.join(nc_data.variables['basin'][i_track, 0, :].astype(str))
-        LOGGER.info('Reading %s: %s', sid, name)
-
-        isot = nc_data.variables['iso_time'][i_track, :, :]
-        val_len = isot.mask[isot.mask == False].shape[0]//isot.shape[1]
-        datetimes = list()
-        for date_time in isot[:val_len]:
-            datetimes.append(dt.datetime.strptime(''.join(date_time.astype(str)),
-                                                  '%Y-%m-%d %H:%M:%S'))
-
-        id_no = float(sid.replace('N', '0').replace('S', '1'))
-        lat = nc_data.variables[provider + '_lat'][i_track, :][:val_len]
-        lon = nc_data.variables[provider + '_lon'][i_track, :][:val_len]
-
-        max_sus_wind = nc_data.variables[provider + '_wind'][i_track, :]. \
-            data[:val_len].astype(float)
-        cen_pres = nc_data.variables[provider + '_pres'][i_track, :]. \
-            data[:val_len].astype(float)
-
-        if correct_pres:
-            cen_pres = _missing_pressure(cen_pres, max_sus_wind, lat, lon)
-
-        if np.all(lon == nc_data.variables[provider + '_lon']._FillValue) or \
-        (np.any(lon == nc_data.variables[provider + '_lon']._FillValue) and \
-        np.all(max_sus_wind == nc_data.variables[provider + '_wind']._FillValue) \
-        and np.all(cen_pres == nc_data.variables[provider + '_pres']._FillValue)):
-            LOGGER.warning('Skipping %s. It does not contain valid values. ' +\
-                           'Try another provider.', sid)
-            return None
-
-        try:
-            rmax = nc_data.variables[provider + '_rmw'][i_track, :][:val_len]
-        except KeyError:
-            LOGGER.info('%s: No rmax for given provider %s. Set to default.',
-                        sid, provider)
-            rmax = np.zeros(lat.size)
-        try:
-            penv = nc_data.variables[provider + '_poci'][i_track, :][:val_len]
-        except KeyError:
-            LOGGER.info('%s: No penv for given provider %s. Set to default.',
-                        sid, provider)
-            penv = np.ones(lat.size)*self._set_penv(basin)
-
-        tr_ds = pd.DataFrame({'time': datetimes, 'lat': lat, 'lon':lon, \
-            'radius_max_wind': rmax.astype('float'), 'max_sustained_wind': max_sus_wind, \
-            'central_pressure': cen_pres, 'environmental_pressure': penv.astype('float')})
-
-        # deal with nans
-        tr_ds = self._deal_nans(tr_ds, nc_data, provider, datetimes, basin)
-        if not tr_ds.shape[0]:
-            LOGGER.warning('Skipping %s. No usable data.', sid)
-            return None
-        # ensure environmental pressure > central pressure
-        chg_pres = (tr_ds.central_pressure > tr_ds.environmental_pressure).values
-        tr_ds.environmental_pressure.values[chg_pres] = tr_ds.central_pressure.values[chg_pres]
-
-        # construct xarray
-        tr_ds = xr.Dataset.from_dataframe(tr_ds.set_index('time'))
-        tr_ds.coords['lat'] = ('time', tr_ds.lat)
-        tr_ds.coords['lon'] = ('time', tr_ds.lon)
-        tr_ds.attrs = {'max_sustained_wind_unit': 'kn', 'central_pressure_unit': 'mb', \
-            'name': name, 'sid': sid, 'orig_event_flag': True, 'data_provider': provider, \
-            'basin': basin, 'id_no': id_no, 'category': set_category(max_sus_wind, 'kn')}
-        return tr_ds
-
-    def _deal_nans(self, tr_ds, nc_data, provider, datetimes, basin):
-        """ Remove or substitute fill values of netcdf variables. """
-        # remove nan coordinates
-        tr_ds.drop(tr_ds[tr_ds.lat == nc_data.variables[provider + '_lat']. \
-            _FillValue].index, inplace=True)
-        tr_ds.drop(tr_ds[np.isnan(tr_ds.lat.values)].index, inplace=True)
-        tr_ds.drop(tr_ds[tr_ds.lon == nc_data.variables[provider + '_lon']. \
-            _FillValue].index, inplace=True)
-        tr_ds.drop(tr_ds[np.isnan(tr_ds.lon.values)].index, inplace=True)
-        # remove nan central pressures
-        tr_ds.drop(tr_ds[tr_ds.central_pressure == nc_data.variables[provider + '_pres']. \
-            _FillValue].index, inplace=True)
-        # remove repeated dates
-        tr_ds.drop_duplicates('time', inplace=True)
-        # fill nans of environmental_pressure and radius_max_wind
-        try:
-            tr_ds.environmental_pressure.values[tr_ds.environmental_pressure == \
-                nc_data.variables[provider + '_poci']._FillValue] = np.nan
-            tr_ds.environmental_pressure = tr_ds.environmental_pressure.ffill(limit=4). \
-                bfill(limit=4).fillna(self._set_penv(basin))
-        except KeyError:
-            pass
-        try:
-            tr_ds.radius_max_wind.values[tr_ds.radius_max_wind == \
-                nc_data.variables[provider + '_rmw']._FillValue] = np.nan
-            tr_ds['radius_max_wind'] = tr_ds.radius_max_wind.ffill(limit=1).bfill(limit=1).fillna(0)
-        except KeyError:
-            pass
-        # set time steps
-        tr_ds['time_step'] = np.zeros(tr_ds.shape[0])
-        for i_time, time in enumerate(tr_ds.time[1:], 1):
-            tr_ds.time_step.values[i_time] = (time - datetimes[i_time-1]).total_seconds()/3600
-        if tr_ds.shape[0]:
-            tr_ds.time_step.values[0] = tr_ds.time_step.values[-1]
-
-        return tr_ds
-
     @staticmethod
     def _set_penv(basin):
         """ Set environmental pressure depending on basin """
@@ -862,24 +998,541 @@ class TCTracks():
         return penv
 
 
-def _calc_land_geom(ens_track):
-    """Compute land geometry used for land distance computations.
+def _char_to_str(chars):
+    """ Join the characters of the last dimension of a netcdf character
+    array. Masked characters are ignored.
+
+    Parameters:
+        chars (np.ma.array): characters (dtype S1)
 
     Returns:
-        shapely.geometry.multipolygon.MultiPolygon
+        np.array of str
     """
-    deg_buffer = 0.1
-    min_lat = np.min([np.min(track.lat.values) for track in ens_track])
-    min_lat = max(min_lat-deg_buffer, -90)
+    chars = np.ascontiguousarray(np.ma.filled(chars, b''))
+    return chars.view('S%s' % chars.shape[-1])[..., 0].astype(str)
+
+def _fill_track_gaps(values, offsets, limit, default):
+    """ Fill the nans of every track as pandas ffill(limit).bfill(limit) and
+    then with default.
+
+    Parameters:
+        values (np.array): node values of all the tracks, filled in place
+        offsets (np.array): TrackColumns offsets
+        limit (int): maximum number of consecutive nodes filled
+        default (np.array): value of every node used if no valid value found
+    """
+    num_nodes = np.diff(offsets)
+    node_pos = np.arange(values.size)
+    prev_valid = np.maximum.accumulate(np.where(np.isnan(values), -1, node_pos))
+    fill = np.isnan(values) & (prev_valid >= np.repeat(offsets[:-1], num_nodes)) \
+        & (node_pos - prev_valid <= limit)
+    values[fill] = values[prev_valid[fill]]
+    next_valid = np.minimum.accumulate(np.where(np.isnan(values), values.size,
+                                                node_pos)[::-1])[::-1]
+    fill = np.isnan(values) & (next_valid < np.repeat(offsets[1:], num_nodes)) \
+        & (next_valid - node_pos <= limit)
+    values[fill] = values[next_valid[fill]]
+    fill = np.isnan(values)
+    values[fill] = default[fill]
+
+def _read_ibtracs_file(fn_nc, sel_tracks, provider, correct_pres):
+    """ _read_ibtracs_tracks from file name. """
+    with nc.Dataset(fn_nc) as nc_data:
+        return _read_ibtracs_tracks(nc_data, sel_tracks, provider, correct_pres)
+
+def _read_ibtracs_tracks(nc_data, sel_tracks, provider, correct_pres):
+    """ Read the given storms of an IBTrACS netcdf. The variables of all the
+    storms are read at once. Nodes with missing coordinates or central
+    pressure and repeated times are removed, missing environmental pressures
+    and radius of maximum wind are filled and the environmental pressure is
+    made greater than the central pressure. Storms without valid nodes are
+    skipped.
+
+    Parameters:
+        nc_data (nc.Dataset): ibtracs netcdf data
+        sel_tracks (np.array): storm positions in the netcdf
+        provider (str): data provider. e.g. usa, newdelhi, bom, cma, tokyo
+        correct_pres (bool): correct central pressure if missing values
+
+    Returns:
+        TrackColumns
+    """
+    # read increasing storm positions
+    sel_read, sel_order = np.unique(sel_tracks, return_inverse=True)
+    if not sel_read.size:
+        return TrackColumns()
+    isot = nc_data.variables['iso_time'][sel_read][sel_order]
+    num_times = np.sum(~np.ma.getmaskarray(isot), axis=(1, 2)) // isot.shape[2]
+    max_times = max(num_times.max(), 1)
+    node_ok = np.arange(max_times) < num_times[:, np.newaxis]
+    times = np.full(node_ok.shape, np.datetime64('NaT'), 'datetime64[ns]')
+    times[node_ok] = _char_to_str(isot[:, :max_times][node_ok]).astype('datetime64[ns]')
+
+    def read_var(var_name, fill_nan=True):
+        """ Variable of the selected storms, fill values as nan """
+        var_val = nc_data.variables[var_name][sel_read, :max_times][sel_order]
+        if not fill_nan:
+            return np.ma.getdata(var_val)
+        var_val = np.ma.filled(var_val.astype(float), np.nan)
+        var_val[var_val == nc_data.variables[var_name]._FillValue] = np.nan
+        return var_val
+
+    sid = _char_to_str(nc_data.variables['sid'][sel_read][sel_order])
+    name = _char_to_str(nc_data.variables['name'][sel_read][sel_order])
+    basin = _char_to_str(nc_data.variables['basin'][sel_read, 0][sel_order])
+    lat = nc_data.variables[provider + '_lat'][sel_read, :max_times][sel_order]
+    lon = nc_data.variables[provider + '_lon'][sel_read, :max_times][sel_order]
+    max_sus_wind = read_var(provider + '_wind', False).astype(float)
+    cen_pres = read_var(provider + '_pres', False).astype(float)
+    if correct_pres:
+        pres_corr = np.any(node_ok & (cen_pres <= 0), axis=1)
+        cen_pres[pres_corr] = _missing_pressure(cen_pres[pres_corr], \
+            max_sus_wind[pres_corr], np.ma.getdata(lat)[pres_corr],
+            np.ma.getdata(lon)[pres_corr])
+
+    # remove nan coordinates and central pressures and repeated dates
+    valid = node_ok & (cen_pres != nc_data.variables[provider + '_pres']._FillValue)
+    for coord, var_name in ((lat, provider + '_lat'), (lon, provider + '_lon')):
+        valid &= ~np.ma.getmaskarray(coord) & ~np.isnan(np.ma.getdata(coord)) & \
+            (np.ma.getdata(coord) != nc_data.variables[var_name]._FillValue)
+    track_nodes = valid.sum(axis=1)
+    track_id = np.repeat(np.arange(sid.size), track_nodes)
+    track_time = times[valid]
+    sort_pos = np.lexsort((track_time, track_id))
+    repeated = np.zeros(track_time.size, bool)
+    repeated[sort_pos[1:]] = (track_id[sort_pos[1:]] == track_id[sort_pos[:-1]]) & \
+        (track_time[sort_pos[1:]] == track_time[sort_pos[:-1]])
+    np.subtract.at(track_nodes, track_id[repeated], 1)
+    valid[valid] = ~repeated
+
+    columns = TrackColumns()
+    columns.offsets = np.cumsum(np.concatenate([[0], track_nodes]))
+    columns.node['time'] = times[valid]
+    columns.node['lat'] = np.ma.getdata(lat)[valid]
+    columns.node['lon'] = np.ma.getdata(lon)[valid]
+    penv_basin = np.array([TCTracks._set_penv(bas) for bas in basin], float)
+    if provider + '_rmw' in nc_data.variables:
+        rmax = read_var(provider + '_rmw')[valid]
+        _fill_track_gaps(rmax, columns.offsets, 1, np.zeros(rmax.size))
+    else:
+        LOGGER.info('No rmax for given provider %s. Set to default.', provider)
+        rmax = np.zeros(columns.offsets[-1])
+    if provider + '_poci' in nc_data.variables:
+        penv = read_var(provider + '_poci')[valid]
+        _fill_track_gaps(penv, columns.offsets, 4, np.repeat(penv_basin, track_nodes))
+    else:
+        LOGGER.info('No penv for given provider %s. Set to default.', provider)
+        penv = np.repeat(penv_basin, track_nodes)
+    columns.node['radius_max_wind'] = rmax
+    columns.node['max_sustained_wind'] = max_sus_wind[valid]
+    columns.node['central_pressure'] = cen_pres[valid]
+    # ensure environmental pressure > central pressure
+    columns.node['environmental_pressure'] = np.where( \
+        columns.node['central_pressure'] > penv, columns.node['central_pressure'], penv)
+    # time steps in hours, first one as the last one
+    time_step = np.zeros(columns.offsets[-1])
+    time_step[1:] = np.diff(columns.node['time']) / np.timedelta64(1, 'h')
+    time_step[columns.offsets[:-1][track_nodes > 0]] = 0
+    time_step[columns.offsets[:-1][track_nodes > 0]] = \
+        time_step[columns.offsets[1:][track_nodes > 0] - 1]
+    columns.node['time_step'] = time_step
+
+    max_wind = np.max(np.where(node_ok, max_sus_wind, -np.inf), axis=1)
+    track_attrs = {'max_sustained_wind_unit': ['kn'] * sid.size,
+                   'central_pressure_unit': ['mb'] * sid.size,
+                   'name': name, 'sid': sid,
+                   'orig_event_flag': [True] * sid.size,
+                   'data_provider': [provider] * sid.size, 'basin': basin,
+                   'id_no': [float(track_sid.replace('N', '0').replace('S', '1')) \
+                             for track_sid in sid],
+                   'category': [set_category(track_wind, 'kn') for track_wind in max_wind]}
+    for key, val in track_attrs.items():
+        columns.attrs[key] = np.empty(sid.size, dtype=object)
+        columns.attrs[key][:] = np.array(val).tolist()
+
+    for track_sid in sid[track_nodes == 0]:
+        LOGGER.warning('Skipping %s. No usable data.', track_sid)
+    return columns.select(track_nodes > 0)
+
+def _hdf5_attr_values(key, values):
+    """ Values of a track attribute as array to be written in hdf5.
+
+    Parameters:
+        key (str): attribute name
+        values (np.array): object array with the values of the tracks
+
+    Returns:
+        np.array
+
+    Raises:
+        ValueError
+    """
+    if all(isinstance(elem, str) for elem in values):
+        return values.astype(object)
+    values = np.array(values.tolist())
+    if values.dtype.kind not in 'biuf':
+        LOGGER.error('Attribute %s of mixed types not supported.', key)
+        raise ValueError
+    return values
+
+def _read_hdf5_attr(hf_key, sel_tracks=None):
+    """ Values of a track attribute written with _hdf5_attr_values as object
+    array, of all the tracks or the selected ones (bool mask). """
+    values = hf_key[:]
+    if sel_tracks is not None:
+        values = values[sel_tracks]
+    obj_values = np.empty(values.size, dtype=object)
+    obj_values[:] = [elem.decode() if isinstance(elem, bytes) else elem \
+                     for elem in values.tolist()]
+    return obj_values
+
+def _create_hdf5_ext(hf_group, name, values, chunk):
+    """ Create an extendable hdf5 dataset. Numeric values are compressed.
+
+    Parameters:
+        hf_group (h5py.Group): group where the dataset is created
+        name (str): dataset name
+        values (np.array): values, one dimension. Objects are strings
+        chunk (int): chunk size
+
+    Returns:
+        h5py.Dataset
+    """
+    if values.dtype.kind == 'O':
+        comp_args = {'dtype': h5py.special_dtype(vlen=str)}
+    else:
+        comp_args = {'compression': 'lzf', 'shuffle': True}
+    return hf_group.create_dataset(name, data=values, maxshape=(None,),
+                                   chunks=(chunk,), **comp_args)
+
+def _append_hdf5(hf_var, values):
+    """ Append values to an extendable hdf5 dataset. """
+    hf_var.resize((hf_var.shape[0] + values.size,))
+    if values.size:
+        hf_var[-values.size:] = values
 
-    max_lat = np.max([np.max(track.lat.values) for track in ens_track])
-    max_lat = min(max_lat+deg_buffer, 90)
+def _read_hdf5_nodes(hf_var, node_idx):
+    """ Read the given positions of an hdf5 dataset. Only the chunks
+    containing them are read.
 
-    min_lon = np.min([np.min(track.lon.values) for track in ens_track])
-    min_lon = max(min_lon-deg_buffer, -180)
+    Parameters:
+        hf_var (h5py.Dataset): dataset, one dimension
+        node_idx (np.array): increasing positions to read. All if None
+
+    Returns:
+        np.array
+    """
+    if node_idx is None or hf_var.chunks is None:
+        return hf_var[:] if node_idx is None else hf_var[:][node_idx]
+    chunk = hf_var.chunks[0]
+    read_chk = np.unique(node_idx // chunk)
+    values = np.concatenate([np.zeros(0, hf_var.dtype)] + \
+        [hf_var[i_chk*chunk:(i_chk+1)*chunk] for i_chk in read_chk])
+    return values[np.searchsorted(read_chk, node_idx // chunk) * chunk + node_idx % chunk]
+
+def clear_ibtracs_cache(file_name=None):
+    """ Remove the tracks stored in IBTRACS_CACHE_DIR by read_ibtracs_netcdf
+    and the checksums of the IBTrACS files.
 
-    max_lon = np.max([np.max(track.lon.values) for track in ens_track])
-    max_lon = min(max_lon+deg_buffer, 180)
+    Parameters:
+        file_name (str, optional): remove only the tracks read from the
+            current content of this IBTrACS file and its checksum.
+            Default: remove all
+    """
+    if file_name is None:
+        cache_files = glob.glob(os.path.join(IBTRACS_CACHE_DIR, '*.h5')) + \
+            glob.glob(os.path.join(IBTRACS_CACHE_DIR, 'sha1_*.txt'))
+    else:
+        cache_files = glob.glob(os.path.join(IBTRACS_CACHE_DIR, \
+            _file_checksum(file_name) + '*.h5')) + [_checksum_file(file_name)]
+    for cache_file in cache_files:
+        if os.path.isfile(cache_file):
+            LOGGER.info('Removing %s', cache_file)
+            os.remove(cache_file)
+
+def _checksum_file(file_name):
+    """ File in IBTRACS_CACHE_DIR with the sha1 of the content of a file,
+    named after its path, size and modification time. """
+    file_stat = os.stat(file_name)
+    return os.path.join(IBTRACS_CACHE_DIR, 'sha1_%s.txt' % hashlib.sha1( \
+        repr((os.path.abspath(file_name), file_stat.st_size, \
+        file_stat.st_mtime_ns)).encode()).hexdigest())
+
+def _file_checksum(file_name):
+    """ sha1 of the content of a file. It is stored in IBTRACS_CACHE_DIR and
+    computed again only if the size or the modification time of the file
+    change.
+
+    Parameters:
+        file_name (str): file name
+
+    Returns:
+        str
+    """
+    sum_file = _checksum_file(file_name)
+    if os.path.isfile(sum_file):
+        with open(sum_file) as file:
+            return file.read()
+    LOGGER.info('Computing checksum of %s', file_name)
+    file_sum = hashlib.sha1()
+    with open(file_name, 'rb') as file:
+        for file_chk in iter(lambda: file.read(2**24), b''):
+            file_sum.update(file_chk)
+    os.makedirs(IBTRACS_CACHE_DIR, exist_ok=True)
+    with open(sum_file, 'w') as file:
+        file.write(file_sum.hexdigest())
+    return file_sum.hexdigest()
+
+def _ibtracs_cache_file(fn_nc, provider, storm_id, year_range, basin, correct_pres):
+    """ File in IBTRACS_CACHE_DIR of the tracks read with the parameters of
+    read_ibtracs_netcdf. The name contains the checksum of the IBTrACS file
+    followed by the hash of IBTRACS_CACHE_VERSION and the parameters. """
+    if storm_id:
+        if not isinstance(storm_id, list):
+            storm_id = [storm_id]
+        # not used by _filter_ibtracs
+        year_range, basin = None, None
+    else:
+        storm_id = None
+        year_range = tuple(int(year) for year in year_range)
+    read_args = (IBTRACS_CACHE_VERSION, provider, storm_id, year_range, basin or None,
+                 bool(correct_pres))
+    return os.path.join(IBTRACS_CACHE_DIR, '%s_%s.h5' % (_file_checksum(fn_nc), \
+        hashlib.sha1(repr(read_args).encode()).hexdigest()))
+
+def _write_ibtracs_cache(columns, cache_file):
+    """ Write the tracks in IBTRACS_CACHE_DIR and remove the least recently
+    used tracks if the directory exceeds IBTRACS_CACHE_MAX_MB.
+
+    Parameters:
+        columns (TrackColumns): tracks read
+        cache_file (str): file name given by _ibtracs_cache_file
+    """
+    try:
+        # other processes only see the complete file
+        tmp_file = '%s.%s.tmp' % (cache_file, os.getpid())
+        columns.write_hdf5(tmp_file)
+        os.replace(tmp_file, cache_file)
+    except OSError as err:
+        LOGGER.warning('Tracks not cached: %s', err)
+        return
+    cache_files = sorted(glob.glob(os.path.join(IBTRACS_CACHE_DIR, '*.h5')),
+                         key=os.path.getmtime, reverse=True)
+    cache_size = np.cumsum([os.path.getsize(file) for file in cache_files])
+    for file in np.array(cache_files)[1:][cache_size[1:] > IBTRACS_CACHE_MAX_MB*2**20]:
+        LOGGER.info('Removing %s', file)
+        os.remove(file)
+
+def _interp_columns(columns, time_step_h):
+    """ Interpolate the tracks to time steps of time_step_h hours, as xarray's
+    resample(time=time_step).interpolate(): the new times are the ones of
+    the resampling bins, lat and lon are interpolated with cubic splines
+    and the other numeric variables linearly (as np.interp). Longitudes of
+    tracks crossing the antimeridian are unwrapped before the interpolation.
+    The category is computed again. Tracks with less than 4 nodes are not
+    interpolated.
+
+    Parameters:
+        columns (TrackColumns): tracks
+        time_step_h (float): time step in hours
+
+    Returns:
+        TrackColumns
+    """
+    num_nodes = columns.num_nodes
+    interp_tr = num_nodes > 3
+    for name in columns.attrs.get('name', columns.attrs.get('sid', []))[~interp_tr]:
+        LOGGER.warning('Track interpolation not done. Not enough elements for %s', name)
+    if not interp_tr.any():
+        return columns
+    node_vars = [var for var in columns.node if var not in TRACK_COORDS and \
+                 var != 'time_step' and columns.node[var].dtype.kind in 'uifc']
+
+    # new times: resampling bins anchored at the start of the day
+    time = columns.node['time'].astype('datetime64[ns]').view('i8')
+    step = pd.to_timedelta(str(time_step_h) + 'H').value
+    day = np.timedelta64(1, 'D') // np.timedelta64(1, 'ns')
+    first = time[columns.offsets[:-1][interp_tr]]
+    last = time[columns.offsets[1:][interp_tr] - 1]
+    new_first = first - first % day + (first % day) // step * step
+    new_nodes = num_nodes.copy()
+    new_nodes[interp_tr] = (last - (first - first % day)) // step - \
+        (new_first - (first - first % day)) // step + 1
+    interp = TrackColumns()
+    interp.attrs = {key: val.copy() for key, val in columns.attrs.items()}
+    interp.offsets = np.cumsum(np.concatenate([[0], new_nodes])).astype(int)
+
+    # old nodes (x) and new nodes (x_new) of the interpolated tracks, in ns
+    # since the first node
+    old_idx = np.repeat(interp_tr, num_nodes).nonzero()[0]
+    new_idx = np.repeat(interp_tr, new_nodes).nonzero()[0]
+    old_tr = np.repeat(np.arange(interp_tr.sum()), num_nodes[interp_tr])
+    new_tr = np.repeat(np.arange(interp_tr.sum()), new_nodes[interp_tr])
+    x_old = (time[old_idx] - np.repeat(first, num_nodes[interp_tr])).astype(float)
+    x_new_ns = np.repeat(new_first - first, new_nodes[interp_tr]) + (new_idx - \
+        np.repeat(interp.offsets[:-1][interp_tr], new_nodes[interp_tr])) * step
+    x_new = x_new_ns.astype(float)
+
+    # position of the last old node <= new node, as np.interp
+    old_offsets = np.cumsum(np.concatenate([[0], num_nodes[interp_tr]]))
+    all_tr = np.concatenate([old_tr, new_tr])
+    sort_pos = np.lexsort((np.concatenate([np.zeros(old_tr.size, int),
+                                           np.ones(new_tr.size, int)]),
+                           np.concatenate([x_old, x_new]), all_tr))
+    num_old = np.cumsum(sort_pos < old_tr.size)
+    pos_lo = np.empty(new_tr.size, int)
+    pos_lo[sort_pos[sort_pos >= old_tr.size] - old_tr.size] = \
+        num_old[sort_pos >= old_tr.size] - 1
+    in_range = (pos_lo >= old_offsets[new_tr]) & (pos_lo < old_offsets[new_tr + 1] - 1)
+    on_last = (pos_lo == old_offsets[new_tr + 1] - 1) & (x_new == x_old[pos_lo])
+    pos_lo = np.clip(pos_lo, old_offsets[new_tr], old_offsets[new_tr + 1] - 2)
+
+    interp.node['time'] = np.empty(interp.offsets[-1], columns.node['time'].dtype)
+    interp.node['time'][new_idx] = np.repeat(first, new_nodes[interp_tr]) + x_new_ns
+    for var in ['lat', 'lon'] + node_vars:
+        interp.node[var] = np.empty(interp.offsets[-1])
+    interp.node['time_step'] = np.full(interp.offsets[-1], time_step_h)
+    if not interp_tr.all():
+        interp.node['time_step'] = interp.node['time_step'].astype(np.result_type( \
+            interp.node['time_step'], columns.node['time_step']))
+    for var in interp.node:
+        interp.node[var][~np.repeat(interp_tr, new_nodes)] = \
+            columns.node[var][~np.repeat(interp_tr, num_nodes)]
+
+    for var in node_vars:
+        y_old = columns.node[var][old_idx].astype(float)
+        slope = (y_old[pos_lo + 1] - y_old[pos_lo]) / (x_old[pos_lo + 1] - x_old[pos_lo])
+        y_new = slope * (x_new - x_old[pos_lo]) + y_old[pos_lo]
+        y_nan = np.isnan(y_new)
+        y_new[y_nan] = slope[y_nan] * (x_new[y_nan] - x_old[pos_lo[y_nan] + 1]) + \
+            y_old[pos_lo[y_nan] + 1]
+        y_new[np.isnan(y_new) & (y_old[pos_lo] == y_old[pos_lo + 1])] = \
+            y_old[pos_lo][np.isnan(y_new) & (y_old[pos_lo] == y_old[pos_lo + 1])]
+        y_new[on_last] = y_old[pos_lo[on_last] + 1]
+        y_new[~in_range & ~on_last] = np.nan
+        interp.node[var][new_idx] = y_new
+
+    # unwrap longitudes crossing the antimeridian
+    lon = columns.node['lon'][old_idx].copy()
+    pos_lon, neg_lon = lon > 0, lon <= 0
+    cross = np.logical_or.reduceat(pos_lon, old_offsets[:-1]) & \
+        np.logical_or.reduceat(neg_lon, old_offsets[:-1]) & \
+        np.logical_or.reduceat(pos_lon & (np.abs(lon) > 170), old_offsets[:-1])
+    west = cross & neg_lon[old_offsets[:-1]]
+    lon[np.repeat(west, num_nodes[interp_tr]) & pos_lon] -= 360
+    lon[np.repeat(cross & ~west, num_nodes[interp_tr]) & neg_lon] += 360
+
+    # cubic splines of the tracks with the same old and new nodes together
+    spline_tr = dict()
+    for i_tr in range(interp_tr.sum()):
+        x_tr = x_old[old_offsets[i_tr]:old_offsets[i_tr + 1]]
+        spline_tr.setdefault((x_tr.tobytes(), new_first[i_tr] - first[i_tr],
+                              new_nodes[interp_tr][i_tr]), []).append(i_tr)
+    new_offsets = np.cumsum(np.concatenate([[0], new_nodes[interp_tr]]))
+    for sel_tr in spline_tr.values():
+        sel_old = np.concatenate([np.arange(old_offsets[i_tr], old_offsets[i_tr + 1]) \
+                                  for i_tr in sel_tr])
+        sel_new = np.concatenate([np.arange(new_offsets[i_tr], new_offsets[i_tr + 1]) \
+                                  for i_tr in sel_tr])
+        x_tr = x_old[old_offsets[sel_tr[0]]:old_offsets[sel_tr[0] + 1]]
+        x_new_tr = x_new[new_offsets[sel_tr[0]]:new_offsets[sel_tr[0] + 1]]
+        for var, y_old in (('lat', columns.node['lat'][old_idx]), ('lon', lon)):
+            y_new = interp1d(x_tr, y_old[sel_old].reshape(len(sel_tr), -1),
+                             kind='cubic', bounds_error=False,
+                             assume_sorted=True)(x_new_tr)
+            interp.node[var][new_idx[sel_new]] = y_new.reshape(-1)
+
+    lon = interp.node['lon'][new_idx]
+    lon[np.repeat(west, new_nodes[interp_tr]) & (lon < -180)] += 360
+    lon[np.repeat(cross & ~west, new_nodes[interp_tr]) & (lon > 180)] -= 360
+    interp.node['lon'][new_idx] = lon
+
+    if 'category' in interp.attrs and 'max_sustained_wind' in columns.node:
+        for i_tr in interp_tr.nonzero()[0]:
+            interp.attrs['category'][i_tr] = set_category( \
+                columns.nodes(i_tr)['max_sustained_wind'],
+                interp.attrs['max_sustained_wind_unit'][i_tr])
+    return interp
+
+def _rnd_walk_columns(columns, ens_size, ens_amp0, ens_amp, max_angle, random_vec):
+    """ Generate the synthetic tracks of every track. Every track is followed
+    by its ens_size synthetic tracks, whose coordinates are shifted by a
+    random walk.
+
+    Parameters:
+        columns (TrackColumns): historical tracks
+        ens_size (int): number of synthetic tracks per track
+        ens_amp0 (float): amplitude of max random starting point shift
+        ens_amp (float): amplitude of random walk wiggles
+        max_angle (float): maximum angle of variation
+        random_vec (np.array): uniform random numbers, ens_size*(2+nodes)
+            consecutive values for every track
+
+    Returns:
+        TrackColumns
+    """
+    num_ens = ens_size + 1
+    ens_tracks = columns.select(np.repeat(np.arange(columns.size), num_ens))
+    ens_lat, ens_lon = ens_tracks.node['lat'], ens_tracks.node['lon']
+    rnd_pos = 0
+    for i_track, n_dat in enumerate(columns.num_nodes):
+        rnd_vec = random_vec[rnd_pos:rnd_pos + ens_size * (2 + n_dat)]
+        rnd_pos += ens_size * (2 + n_dat)
+        if not n_dat or not ens_size:
+            continue
+        track_nodes = columns.nodes(i_track)
+        rand_unif_ini = rnd_vec[:2*ens_size].reshape((2, ens_size))
+        rand_unif_ang = rnd_vec[2*ens_size:]
+
+        xy_ini = ens_amp0 * (rand_unif_ini - 0.5)
+        tmp_ang = np.cumsum(2 * max_angle * rand_unif_ang - max_angle)
+        coord_xy = np.empty((2, ens_size * n_dat))
+        coord_xy[0] = np.cumsum(ens_amp * np.sin(tmp_ang))
+        coord_xy[1] = np.cumsum(ens_amp * np.cos(tmp_ang))
+
+        coord_xy = coord_xy.reshape((2, ens_size, n_dat))
+        d_xy = coord_xy - coord_xy[:, :, :1]
+        # change sign of latitude change for southern hemishpere:
+        d_xy = np.sign(track_nodes['lat'][0]) * d_xy
+        d_lat_lon = d_xy + xy_ini[:, :, np.newaxis]
+
+        ens_nodes = slice(ens_tracks.offsets[i_track * num_ens + 1],
+                          ens_tracks.offsets[(i_track + 1) * num_ens])
+        ens_lon[ens_nodes] = (track_nodes['lon'] + d_lat_lon[0]).reshape(-1)
+        ens_lat[ens_nodes] = (track_nodes['lat'] + d_lat_lon[1]).reshape(-1)
+
+    ens_num = np.tile(np.arange(num_ens), columns.size)
+    for i_track in (ens_num > 0).nonzero()[0]:
+        i_ens = int(ens_num[i_track])
+        ens_tracks.attrs['orig_event_flag'][i_track] = False
+        ens_tracks.attrs['name'][i_track] += '_gen' + str(i_ens)
+        ens_tracks.attrs['sid'][i_track] += '_gen' + str(i_ens)
+        ens_tracks.attrs['id_no'][i_track] += i_ens / 100
+    return ens_tracks
+
+def _calc_land_geom(ens_track, precomputed=False):
+    """Compute land geometry used for land distance computations.
+
+    Parameters:
+        ens_track (TrackColumns or list(xr.Dataset)): tracks
+        precomputed (bool, optional): return the global land mask of
+            coord_util.get_land_mask instead. Default: False
+
+    Returns:
+        shapely.geometry.multipolygon.MultiPolygon or np.array
+    """
+    if precomputed:
+        return coord_util.get_land_mask()
+    if isinstance(ens_track, TrackColumns):
+        lat, lon = ens_track.node['lat'], ens_track.node['lon']
+    else:
+        lat = np.concatenate([track.lat.values for track in ens_track])
+        lon = np.concatenate([track.lon.values for track in ens_track])
+    deg_buffer = 0.1
+    min_lat = max(np.min(lat)-deg_buffer, -90)
+    max_lat = min(np.max(lat)+deg_buffer, 90)
+    min_lon = max(np.min(lon)-deg_buffer, -180)
+    max_lon = min(np.max(lon)+deg_buffer, 180)
 
     return coord_util.get_land_geometry(extent=(min_lon, max_lon, \
         min_lat, max_lat), resolution=10)
@@ -889,12 +1542,38 @@ def _track_land_params(track, land_geom):
 
     Parameters:
         track (xr.Dataset): track values
-        land_geom (shapely.geometry.multipolygon.MultiPolygon): land geometry
+        land_geom (shapely.geometry.multipolygon.MultiPolygon or np.array):
+            land geometry or land mask
     """
     track['on_land'] = ('time', coord_util.coord_on_land(track.lat.values, \
          track.lon.values, land_geom))
     track['dist_since_lf'] = ('time', _dist_since_lf(track))
 
+def _columns_land_params(columns, land_geom, sel_tracks=None):
+    """ Compute on_land and dist_since_lf of the nodes of the selected tracks.
+    The other tracks keep their values, or get False and nan if the
+    variables are new.
+
+    Parameters:
+        columns (TrackColumns): tracks, modified
+        land_geom (shapely.geometry.multipolygon.MultiPolygon or np.array):
+            land geometry or land mask
+        sel_tracks (np.array, optional): mask of the tracks. Default: all
+    """
+    if sel_tracks is None:
+        sel_tracks = np.ones(columns.size, bool)
+    sel_nodes = np.repeat(sel_tracks, columns.num_nodes)
+    if 'on_land' not in columns.node:
+        columns.node['on_land'] = np.zeros(columns.offsets[-1], bool)
+    if 'dist_since_lf' not in columns.node:
+        columns.node['dist_since_lf'] = np.full(columns.offsets[-1], np.nan)
+    columns.node['on_land'][sel_nodes] = coord_util.coord_on_land( \
+        columns.node['lat'][sel_nodes], columns.node['lon'][sel_nodes], land_geom)
+    columns.node['dist_since_lf'][sel_nodes] = _dist_since_lf_nodes( \
+        columns.node['lat'][sel_nodes], columns.node['lon'][sel_nodes],
+        columns.node['on_land'][sel_nodes],
+        np.cumsum(np.concatenate([[0], columns.num_nodes[sel_tracks]])))
+
 def _dist_since_lf(track):
     """ Compute the distance to landfall in km point for every point on land.
     Points on water get nan values.
@@ -905,58 +1584,116 @@ def _dist_since_lf(track):
     Returns:
         np.arrray
     """
-    dist_since_lf = np.zeros(track.time.values.shape)
-
-    # Index in sea that follows a land index
-    sea_land_idx = np.where(np.diff(track.on_land.astype(int)) == 1)[0]
-    if not sea_land_idx.size:
-        return (dist_since_lf+1)*np.nan
-
-    # Index in sea that comes from previous land index
-    land_sea_idx = np.where(np.diff(track.on_land.astype(int)) == -1)[0] + 1
-    if track.on_land[-1]:
-        land_sea_idx = np.append(land_sea_idx, track.time.size)
-    orig_lf = _calc_orig_lf(track, sea_land_idx)
-
-    dist = DistanceMetric.get_metric('haversine')
-    nodes1 = np.radians(np.array([track.lat.values[1:],
-                                  track.lon.values[1:]]).transpose())
-    nodes0 = np.radians(np.array([track.lat.values[:-1],
-                                  track.lon.values[:-1]]).transpose())
-    dist_since_lf[1:] = dist.pairwise(nodes1, nodes0).diagonal()
-    dist_since_lf[np.logical_not(track.on_land.values)] = 0.0
-    nodes1 = np.array([track.lat.values[sea_land_idx+1],
-                       track.lon.values[sea_land_idx+1]]).transpose()/180*np.pi
-    dist_since_lf[sea_land_idx+1] = \
-        dist.pairwise(nodes1, orig_lf/180*np.pi).diagonal()
-    for sea_land, land_sea in zip(sea_land_idx, land_sea_idx):
-        dist_since_lf[sea_land+1:land_sea] = \
-            np.cumsum(dist_since_lf[sea_land+1:land_sea])
+    return _dist_since_lf_nodes(track.lat.values, track.lon.values,
+                                track.on_land.values, np.array([0, track.time.size]))
 
-    dist_since_lf *= EARTH_RADIUS_KM
-    dist_since_lf[np.logical_not(track.on_land.values)] = np.nan
+def _dist_since_lf_nodes(lat, lon, on_land, offsets):
+    """ Compute the distance to landfall in km of the nodes of several tracks,
+    as _dist_since_lf for every track. Nodes on water, and all the nodes of
+    tracks without landfall, get nan values.
 
+    Parameters:
+        lat (np.array): latitude of the nodes, track after track
+        lon (np.array): longitude of the nodes
+        on_land (np.array): bool of the nodes on land
+        offsets (np.array): first node of every track and number of nodes
+
+    Returns:
+        np.array
+    """
+    on_land = np.asarray(on_land, bool)
+    first = np.zeros(lat.size, bool)
+    first[offsets[:-1][offsets[:-1] < lat.size]] = True
+    prev = np.maximum(np.arange(lat.size) - 1, 0)
+    track_pos = np.repeat(np.arange(offsets.size - 1), np.diff(offsets))
+
+    # distance to the previous node, and to the coast in landfalls
+    dist_since_lf = _haversine_rad(lat, lon, lat[prev], lon[prev])
+    dist_since_lf[first] = 0.0
+    dist_since_lf[~on_land] = 0.0
+    sea_land = on_land & ~on_land[prev] & ~first
+    orig_lf = _calc_orig_lf(lat, lon, sea_land.nonzero()[0] - 1)
+    dist_since_lf[sea_land] = _haversine_rad(lat[sea_land], lon[sea_land],
+                                             orig_lf[:, 0], orig_lf[:, 1])
+
+    # accumulate along the nodes on land after every landfall, one node of
+    # all the runs at a time
+    run_start = on_land & (first | ~on_land[prev])
+    run_pos = np.cumsum(run_start) - 1
+    in_lf_run = on_land.copy()
+    in_lf_run[on_land] = sea_land[run_start.nonzero()[0]][run_pos[on_land]]
+    lf_nodes = in_lf_run.nonzero()[0]
+    run_step = lf_nodes - run_start.nonzero()[0][run_pos[lf_nodes]]
+    lf_nodes = lf_nodes[np.argsort(run_step, kind='stable')]
+    step_end = np.cumsum(np.bincount(run_step))
+    for step_ini, step_fin in zip(step_end[:-1], step_end[1:]):
+        step_nodes = lf_nodes[step_ini:step_fin]
+        dist_since_lf[step_nodes] += dist_since_lf[step_nodes-1]
+
+    dist_since_lf *= EARTH_RADIUS_KM
+    dist_since_lf[~on_land] = np.nan
+    dist_since_lf[~np.bincount(track_pos[sea_land], minlength=offsets.size - 1) \
+                  .astype(bool)[track_pos]] = np.nan
     return dist_since_lf
 
-def _calc_orig_lf(track, sea_land_idx):
+def _haversine_rad(lat_0, lon_0, lat_1, lon_1):
+    """ Haversine distance in radians between points given in degrees """
+    lat_0, lon_0, lat_1, lon_1 = [np.radians(np.asarray(val, float)) \
+                                  for val in (lat_0, lon_0, lat_1, lon_1)]
+    return 2 * np.arcsin(np.sqrt(np.sin((lat_1 - lat_0) / 2)**2 + np.cos(lat_0) * \
+        np.cos(lat_1) * np.sin((lon_1 - lon_0) / 2)**2))
+
+def _calc_orig_lf(lat, lon, sea_land_idx):
     """ Approximate coast coordinates in landfall as the middle point
     before landfall and after.
 
     Parameters:
-        track (xr.Dataset): TC track
+        lat (np.array): latitude of the track nodes
+        lon (np.array): longitude of the track nodes
         sea_land_idx (np.array): array position of sea before landfall
 
     Returns:
         np.array (first column lat and second lon of each landfall coord)
     """
-    # TODO change to pos where landfall (v_landfall)??
-    orig_lf = np.empty((sea_land_idx.size, 2))
-    for i_lf, lf_point in enumerate(sea_land_idx):
-        orig_lf[i_lf][0] = track.lat[lf_point] + \
-            (track.lat[lf_point+1] - track.lat[lf_point])/2
-        orig_lf[i_lf][1] = track.lon[lf_point] + \
-            (track.lon[lf_point+1] - track.lon[lf_point])/2
-    return orig_lf
+    lat, lon = np.asarray(lat), np.asarray(lon)
+    return np.column_stack((
+        lat[sea_land_idx] + (lat[sea_land_idx+1] - lat[sea_land_idx])/2,
+        lon[sea_land_idx] + (lon[sea_land_idx+1] - lon[sea_land_idx])/2))
+
+def _columns_landfalls(columns, sel_tracks):
+    """ Landfalls of the selected tracks which start on water: first node on
+    land and first node on water after it (or end of track), in track order.
+
+    Parameters:
+        columns (TrackColumns): tracks with on_land node values
+        sel_tracks (np.array): mask of the tracks
+
+    Returns:
+        sea_land (np.array), land_sea (np.array), track position (np.array)
+    """
+    on_land = columns.node['on_land'].astype(bool)
+    num_nodes = columns.num_nodes
+    sel_tracks = sel_tracks & (num_nodes > 0)
+    sel_tracks[sel_tracks] = ~on_land[columns.offsets[:-1][sel_tracks]]
+    first = np.zeros(on_land.size, bool)
+    first[columns.offsets[:-1][num_nodes > 0]] = True
+    last = np.zeros(on_land.size, bool)
+    last[columns.offsets[1:][num_nodes > 0] - 1] = True
+    sel_nodes = np.repeat(sel_tracks, num_nodes)
+    prev = np.maximum(np.arange(on_land.size) - 1, 0)
+    nxt = np.minimum(np.arange(on_land.size) + 1, on_land.size - 1)
+    sea_land = (sel_nodes & on_land & ~on_land[prev] & ~first).nonzero()[0]
+    land_sea = (sel_nodes & on_land & (last | ~on_land[nxt])).nonzero()[0] + 1
+    track_pos = np.repeat(np.arange(columns.size), num_nodes)[sea_land]
+    return sea_land, land_sea, track_pos
+
+def _run_nodes(ini, end):
+    """ Positions of the nodes in every range [ini, end), range after range,
+    and range of every node. """
+    length = end - ini
+    range_pos = np.repeat(np.arange(ini.size), length)
+    return np.arange(length.sum()) + np.repeat(ini - np.cumsum(length) + length, length), \
+        range_pos
 
 def _decay_v_function(a_coef, x_val):
     """Decay function used for wind after landfall."""
@@ -975,19 +1712,13 @@ def _solve_decay_p_function(ps_y, p_y, x_val):
     Get B coefficient."""
     return -np.log((ps_y - p_y)/(ps_y - 1.0)) / x_val
 
-def _calc_decay_ps_value(track, p_landfall, pos, s_rel):
-    if s_rel:
-        p_land_s = track.environmental_pressure[pos].values
-    else:
-        p_land_s = track.central_pressure[pos].values
-    return float(p_land_s / p_landfall)
-
-def _decay_values(track, land_geom, s_rel):
-    """ Compute wind and pressure relative to landafall values.
+def _columns_decay_values(columns, sel_tracks, s_rel):
+    """ Compute wind and pressure relative to landafall values of the
+    selected tracks.
 
     Parameters:
-        track (xr.Dataset): track
-        land_geom (shapely.geometry.multipolygon.MultiPolygon): land geometry
+        columns (TrackColumns): tracks with on_land and dist_since_lf
+        sel_tracks (np.array): mask of the tracks
         s_rel (bool): use environmental presure for S value (true) or
             central presure (false)
 
@@ -1005,45 +1736,32 @@ def _decay_values(track, land_geom, s_rel):
     p_lf = dict()
     x_val = dict()
 
-    _track_land_params(track, land_geom)
-    # Index in land that comes from previous sea index
-    sea_land_idx = np.where(np.diff(track.on_land.astype(int)) == 1)[0] + 1
-    # Index in sea that comes from previous land index
-    land_sea_idx = np.where(np.diff(track.on_land.astype(int)) == -1)[0] + 1
-    if track.on_land[-1]:
-        land_sea_idx = np.append(land_sea_idx, track.time.size)
-    if sea_land_idx.size and land_sea_idx.size <= sea_land_idx.size:
-        for sea_land, land_sea in zip(sea_land_idx, land_sea_idx):
-            v_landfall = track.max_sustained_wind[sea_land-1].values
-            ss_scale_idx = np.where(v_landfall < SAFFIR_SIM_CAT)[0][0]+1
-
-            v_land = track.max_sustained_wind[sea_land-1:land_sea].values
-            if v_land[0] > 0:
-                v_land = (v_land[1:]/v_land[0]).tolist()
-            else:
-                v_land = v_land[1:].tolist()
-
-            p_landfall = float(track.central_pressure[sea_land-1].values)
-            p_land = track.central_pressure[sea_land-1:land_sea].values
-            p_land = (p_land[1:]/p_land[0]).tolist()
-
-            p_land_s = _calc_decay_ps_value(track, p_landfall, land_sea-1, s_rel)
-            p_land_s = len(p_land)*[p_land_s]
-
-            if ss_scale_idx not in v_lf:
-                v_lf[ss_scale_idx] = array.array('f', v_land)
-                p_lf[ss_scale_idx] = (array.array('f', p_land_s),
-                                      array.array('f', p_land))
-                x_val[ss_scale_idx] = array.array('f', \
-                                      track.dist_since_lf[sea_land:land_sea])
-            else:
-                v_lf[ss_scale_idx].extend(v_land)
-                p_lf[ss_scale_idx][0].extend(p_land_s)
-                p_lf[ss_scale_idx][1].extend(p_land)
-                x_val[ss_scale_idx].extend(track.dist_since_lf[ \
-                                           sea_land:land_sea])
+    sea_land, land_sea, _ = _columns_landfalls(columns, sel_tracks)
+    wind = columns.node['max_sustained_wind']
+    pres = columns.node['central_pressure']
+    p_s = columns.node['environmental_pressure'] if s_rel else pres
+    ss_scale = np.searchsorted(SAFFIR_SIM_CAT, wind[sea_land-1], 'right') + 1
+    lf_nodes, lf_pos = _run_nodes(sea_land, land_sea)
+    v_landfall = wind[sea_land-1][lf_pos]
+    v_land = np.where(v_landfall > 0, wind[lf_nodes] / np.where(v_landfall > 0, \
+        v_landfall, 1), wind[lf_nodes])
+    p_land = pres[lf_nodes] / pres[sea_land-1][lf_pos]
+    p_land_s = (p_s[land_sea-1] / pres[sea_land-1])[lf_pos]
+
+    # categories in order of appearance
+    _, scale_ini = np.unique(ss_scale, return_index=True)
+    for scale in ss_scale[np.sort(scale_ini)]:
+        scale_nodes = ss_scale[lf_pos] == scale
+        v_lf[scale] = _float32_array(v_land[scale_nodes])
+        p_lf[scale] = (_float32_array(p_land_s[scale_nodes]),
+                       _float32_array(p_land[scale_nodes]))
+        x_val[scale] = _float32_array(columns.node['dist_since_lf'][lf_nodes][scale_nodes])
     return v_lf, p_lf, x_val
 
+def _float32_array(values):
+    """ array.array of floats of the values """
+    return array.array('f', np.asarray(values, np.float32).tobytes())
+
 def _decay_calc_coeff(x_val, v_lf, p_lf):
     """ From track's relative velocity and pressure, compute the decay
     coefficients.
@@ -1129,78 +1847,67 @@ def _check_decay_values_plot(x_val, v_lf, p_lf, v_rel, p_rel):
         axes[1].plot(x_eval, _decay_p_function(p_rel[track_cat][0], \
                      p_rel[track_cat][1], x_eval), '-', c=color)
 
-def _apply_decay_coeffs(track, v_rel, p_rel, land_geom, s_rel):
-    """ Change track's max sustained wind and central pressure using the land
-    decay coefficients.
+def _columns_apply_decay(columns, sel_tracks, v_rel, p_rel, s_rel):
+    """ Change the max sustained wind and central pressure of the selected
+    tracks using the land decay coefficients.
 
     Parameters:
-        track (xr.Dataset): TC track
+        columns (TrackColumns): tracks with on_land and dist_since_lf,
+            modified
+        sel_tracks (np.array): mask of the tracks
         v_rel (dict): {category: A}, where wind decay = exp(-x*A)
         p_rel (dict): (category: (S, B)},
             where pressure decay = S-(S-1)*exp(-x*B)
-        land_geom (shapely.geometry.multipolygon.MultiPolygon): land geometry
         s_rel (bool): use environmental presure for S value (true) or
             central presure (false)
-
-    Returns:
-        xr.Dataset
     """
-    # return if historical track
-    if track.orig_event_flag:
-        return track
-
-    _track_land_params(track, land_geom)
-    # Index in land that comes from previous sea index
-    sea_land_idx = np.where(np.diff(track.on_land.astype(int)) == 1)[0] + 1
-    # Index in sea that comes from previous land index
-    land_sea_idx = np.where(np.diff(track.on_land.astype(int)) == -1)[0] + 1
-    if track.on_land[-1]:
-        land_sea_idx = np.append(land_sea_idx, track.time.size)
-    if not sea_land_idx.size or land_sea_idx.size > sea_land_idx.size:
-        return track
-    for idx, (sea_land, land_sea) \
-    in enumerate(zip(sea_land_idx, land_sea_idx)):
-        v_landfall = track.max_sustained_wind[sea_land-1].values
-        p_landfall = float(track.central_pressure[sea_land-1].values)
+    sea_land, land_sea, track_pos = _columns_landfalls(columns, sel_tracks)
+    wind = columns.node['max_sustained_wind']
+    pres = columns.node['central_pressure']
+    env_pres = columns.node['environmental_pressure']
+    p_s = env_pres if s_rel else pres
+    dist = columns.node['dist_since_lf']
+    # next landfall of the same track
+    next_sl = np.where(np.append(track_pos[1:] == track_pos[:-1], False),
+                       np.append(sea_land[1:], 0), 0)
+    np.warnings.filterwarnings('ignore')
+    for i_sl, i_ls, i_next in zip(sea_land, land_sea, next_sl):
+        v_landfall = wind[i_sl-1]
+        p_landfall = float(pres[i_sl-1])
         try:
             ss_scale_idx = np.where(v_landfall < SAFFIR_SIM_CAT)[0][0]+1
         except IndexError:
             continue
-        if land_sea - sea_land == 1:
+        if i_ls - i_sl == 1:
             continue
-        p_decay = _calc_decay_ps_value(track, p_landfall, land_sea-1, s_rel)
-        p_decay = _decay_p_function(p_decay, p_rel[ss_scale_idx][1], \
-            track.dist_since_lf[sea_land:land_sea].values)
+        p_decay = _decay_p_function(float(p_s[i_ls-1] / p_landfall), \
+            p_rel[ss_scale_idx][1], dist[i_sl:i_ls])
         # dont applay decay if it would decrease central pressure
-        p_decay[p_decay < 1] = track.central_pressure[sea_land:land_sea][p_decay < 1]/p_landfall
-        track.central_pressure[sea_land:land_sea] = p_landfall * p_decay
+        p_decay[p_decay < 1] = pres[i_sl:i_ls][p_decay < 1]/p_landfall
+        pres[i_sl:i_ls] = p_landfall * p_decay
 
-        v_decay = _decay_v_function(v_rel[ss_scale_idx], \
-            track.dist_since_lf[sea_land:land_sea].values)
+        v_decay = _decay_v_function(v_rel[ss_scale_idx], dist[i_sl:i_ls])
         # dont applay decay if it would increas wind speeds
-        v_decay[v_decay > 1] = track.max_sustained_wind[sea_land:land_sea][v_decay > 1]/v_landfall
-        track.max_sustained_wind[sea_land:land_sea] = v_landfall * v_decay
+        v_decay[v_decay > 1] = wind[i_sl:i_ls][v_decay > 1]/v_landfall
+        wind[i_sl:i_ls] = v_landfall * v_decay
 
         # correct values of sea between two landfalls
-        if land_sea < track.time.size and idx+1 < sea_land_idx.size:
+        if i_next:
             rndn = 0.1 * float(np.abs(np.random.normal(size=1)*5)+6)
-            r_diff = track.central_pressure[land_sea].values - \
-                track.central_pressure[land_sea-1].values + rndn
-            track.central_pressure[land_sea:sea_land_idx[idx+1]] += - r_diff
-
+            pres[i_ls:i_next] -= pres[i_ls] - pres[i_ls-1] + rndn
             rndn = rndn * 10 # mean value 10
-            r_diff = track.max_sustained_wind[land_sea].values - \
-                track.max_sustained_wind[land_sea-1].values - rndn
-            track.max_sustained_wind[land_sea:sea_land_idx[idx+1]] += - r_diff
+            wind[i_ls:i_next] -= wind[i_ls] - wind[i_ls-1] - rndn
 
     # correct limits
-    np.warnings.filterwarnings('ignore')
-    cor_p = track.central_pressure.values > track.environmental_pressure.values
-    track.central_pressure[cor_p] = track.environmental_pressure[cor_p]
-    track.max_sustained_wind[track.max_sustained_wind < 0] = 0
-    track.attrs['category'] = set_category(track.max_sustained_wind.values,
-                                           track.max_sustained_wind_unit)
-    return track
+    lf_tracks = np.unique(track_pos)
+    cor_nodes = np.repeat(np.isin(np.arange(columns.size), lf_tracks), columns.num_nodes)
+    cor_p = cor_nodes & (pres > env_pres)
+    pres[cor_p] = env_pres[cor_p]
+    wind[cor_nodes & (wind < 0)] = 0
+    for i_track in lf_tracks:
+        columns.attrs['category'][i_track] = set_category( \
+            columns.nodes(i_track)['max_sustained_wind'],
+            columns.attrs['max_sustained_wind_unit'][i_track])
 
 def _check_apply_decay_plot(all_tracks, syn_orig_wind, syn_orig_pres):
     """ Plot wind and presure before and after correction for synthetic tracks.
@@ -24,6 +24,11 @@ import unittest
 import datetime as dt
 import numpy as np
 from scipy import sparse
+import h5py
+try:
+    import hdf5plugin
+except ImportError:
+    hdf5plugin = None
 
 from climada.hazard.base import Hazard
 from climada.hazard.centroids.centr import Centroids
@@ -668,6 +673,64 @@ class TestAppend(unittest.TestCase):
         self.assertEqual(haz1.tag.description, \
                          [haz1_ori.tag.description, haz2.tag.description])
 
+    def test_append_overlap_centroids(self):
+        """Append hazard whose centroids are partly in the initial ones."""
+        haz1 = dummy_hazard()
+        haz2 = dummy_hazard()
+        haz2.tag.file_name = 'file2.mat'
+        haz2.event_name = ['ev5', 'ev6', 'ev7', 'ev8']
+        haz2.centroids = Centroids()
+        haz2.centroids.set_lat_lon(np.array([7, 5, 1]), np.array([8, 6, 2]))
+        haz1.append(haz2)
+        haz1.check()
+
+        haz1_orig = dummy_hazard()
+        self.assertEqual(haz1.centroids.size, 4)
+        self.assertTrue(np.array_equal(haz1.centroids.lat, np.array([1, 3, 5, 7])))
+        self.assertTrue(np.array_equal(haz1.centroids.lon, np.array([2, 4, 6, 8])))
+        self.assertTrue(sparse.isspmatrix_csr(haz1.intensity))
+        exp_inten = np.zeros((8, 4))
+        exp_inten[:4, :3] = haz1_orig.intensity.toarray()
+        exp_inten[4:, [3, 2, 0]] = haz1_orig.intensity.toarray()
+        self.assertTrue(np.array_equal(haz1.intensity.toarray(), exp_inten))
+        exp_frac = np.zeros((8, 4))
+        exp_frac[:4, :3] = haz1_orig.fraction.toarray()
+        exp_frac[4:, [3, 2, 0]] = haz1_orig.fraction.toarray()
+        self.assertTrue(np.array_equal(haz1.fraction.toarray(), exp_frac))
+        self.assertTrue(np.array_equal(haz1.event_id, np.arange(1, 9)))
+
+    def test_concat_pass(self):
+        """Concatenate several hazards with different centroids."""
+        haz1 = dummy_hazard()
+        haz2 = dummy_hazard()
+        haz2.tag.file_name = 'file2.mat'
+        haz2.event_name = ['ev5', 'ev6', 'ev7', 'ev8']
+        haz2.centroids = Centroids()
+        haz2.centroids.set_lat_lon(np.array([7, 5, 1]), np.array([8, 6, 2]))
+        haz3 = dummy_hazard()
+        haz3.tag.file_name = 'file3.mat'
+        haz3.event_name = ['ev9', 'ev10', 'ev11', 'ev12']
+
+        haz = Hazard('TC')
+        haz.concat([haz1, Hazard('TC'), haz2, haz3])
+        haz.check()
+
+        haz_seq = dummy_hazard()
+        haz_seq.append(haz2)
+        haz_seq.append(haz3)
+        self.assertEqual(haz.size, 12)
+        self.assertEqual(haz.centroids.size, 4)
+        self.assertTrue(np.array_equal(haz.centroids.coord, haz_seq.centroids.coord))
+        self.assertTrue(np.array_equal(haz.intensity.toarray(), haz_seq.intensity.toarray()))
+        self.assertTrue(np.array_equal(haz.fraction.toarray(), haz_seq.fraction.toarray()))
+        self.assertEqual(haz.event_name, haz_seq.event_name)
+        self.assertTrue(np.array_equal(haz.event_id, np.arange(1, 13)))
+        self.assertTrue(np.array_equal(haz.frequency, np.tile(haz1.frequency, 3)))
+        self.assertEqual(haz.tag.file_name, ['file1.mat', 'file2.mat', 'file3.mat'])
+        self.assertEqual(haz.units, 'm/s')
+        self.assertEqual(haz1.size, 4)
+        self.assertEqual(haz1.centroids.size, 3)
+
     def test_append_all_pass(self):
         """Test _append_all function."""
         haz_1 = Hazard('TC')
@@ -718,6 +781,8 @@ class TestAppend(unittest.TestCase):
         self.assertTrue(np.array_equal(haz.date, np.array([1, 2])))
         self.assertTrue(np.array_equal(haz.event_id, np.array([1, 2])))
         self.assertTrue(haz.event_name, ['ev1', 'ev2'])
+        self.assertEqual(haz_1.event_name, ['ev1'])
+        self.assertIs(haz.centroids, haz_1.centroids)
         self.assertTrue(np.array_equal(haz.centroids.coord, haz_1.centroids.coord))
         self.assertTrue(np.array_equal(haz.centroids.coord, haz_2.centroids.coord))
         self.assertTrue(haz.tag, 'file_1.mat + file_2.mat')
@@ -741,6 +806,38 @@ class TestAppend(unittest.TestCase):
         app_haz._append_all([haz])
         self.assertIn('new_var', app_haz.__dict__)
 
+    def test_append_all_many_pass(self):
+        """ Append many single events. """
+        haz = dummy_hazard()
+        list_haz_ev = list()
+        for i_ev in range(haz.size):
+            haz_ev = Hazard('TC')
+            haz_ev.tag.file_name = 'file%s.mat' % i_ev
+            haz_ev.centroids = haz.centroids
+            haz_ev.event_id = np.array([1])
+            haz_ev.event_name = [haz.event_name[i_ev]]
+            haz_ev.date = haz.date[[i_ev]]
+            haz_ev.orig = haz.orig[[i_ev]]
+            haz_ev.frequency = haz.frequency[[i_ev]]
+            haz_ev.intensity = haz.intensity[i_ev, :]
+            haz_ev.fraction = haz.fraction[i_ev, :]
+            haz_ev.units = haz.units
+            list_haz_ev.append(haz_ev)
+
+        app_haz = Hazard('TC')
+        app_haz._append_all(list_haz_ev)
+        app_haz.check()
+        self.assertEqual(app_haz.size, haz.size)
+        self.assertTrue(np.array_equal(app_haz.event_id, np.arange(1, haz.size+1)))
+        self.assertEqual(app_haz.event_name, haz.event_name)
+        self.assertTrue(np.array_equal(app_haz.date, haz.date))
+        self.assertTrue(np.array_equal(app_haz.orig, haz.orig))
+        self.assertTrue(np.array_equal(app_haz.frequency, haz.frequency))
+        self.assertTrue(sparse.isspmatrix_csr(app_haz.intensity))
+        self.assertTrue(np.array_equal(app_haz.intensity.toarray(), haz.intensity.toarray()))
+        self.assertTrue(np.array_equal(app_haz.fraction.toarray(), haz.fraction.toarray()))
+        self.assertEqual(app_haz.tag.file_name, ['file%s.mat' % i_ev for i_ev in range(haz.size)])
+
 class TestStats(unittest.TestCase):
     """Test return period statistics"""
 
@@ -956,6 +1053,157 @@ class TestHDF5(unittest.TestCase):
             self.assertTrue(np.array_equal(hazard.fraction.todense(), haz_read.fraction.todense()))
             self.assertIsInstance(haz_read.fraction, sparse.csr_matrix)
 
+    def test_read_batches_pass(self):
+        ''' Read a hazard hdf5 file by batches of events.'''
+        file_name = os.path.join(DATA_DIR, 'test_haz.h5')
+
+        hazard = dummy_hazard()
+        for todense_flag in [False, True]:
+            hazard.write_hdf5(file_name, todense=todense_flag)
+
+            haz_read = Hazard('TC')
+            haz_bat = list(haz_read.read_hdf5_batches(file_name, 3))
+            self.assertEqual(len(haz_bat), 2)
+            self.assertEqual(haz_bat[-1].size, 1)
+            self.assertEqual(haz_read.intensity.nnz, 0)
+            self.assertTrue(np.array_equal(hazard.centroids.coord,
+                                           haz_bat[0].centroids.coord))
+            self.assertIs(haz_bat[0].centroids, haz_bat[-1].centroids)
+            self.assertTrue(np.array_equal(hazard.event_id, np.concatenate(
+                [haz.event_id for haz in haz_bat])))
+            self.assertTrue(np.array_equal(hazard.frequency, np.concatenate(
+                [haz.frequency for haz in haz_bat])))
+            self.assertEqual(hazard.event_name, sum([haz.event_name for haz in haz_bat], []))
+            self.assertTrue(np.array_equal(hazard.orig, np.concatenate(
+                [haz.orig for haz in haz_bat])))
+            self.assertTrue(np.array_equal(hazard.intensity.todense(), sparse.vstack(
+                [haz.intensity for haz in haz_bat]).todense()))
+            self.assertTrue(np.array_equal(hazard.fraction.todense(), sparse.vstack(
+                [haz.fraction for haz in haz_bat]).todense()))
+
+    def test_write_read_compressed_pass(self):
+        ''' Write compressed and chunked matrices and read them back.'''
+        file_name = os.path.join(DATA_DIR, 'test_haz.h5')
+
+        hazard = dummy_hazard()
+        for todense_flag in [False, True]:
+            for compression in ['gzip', 'lzf']:
+                hazard.write_hdf5(file_name, todense=todense_flag,
+                                  compression=compression, chunk_events=2)
+
+                with h5py.File(file_name, 'r') as hf_data:
+                    hf_inten = hf_data['intensity']
+                    self.assertEqual(hf_inten.attrs['nnz'], 12)
+                    self.assertAlmostEqual(hf_inten.attrs['max'], 5.3)
+                    self.assertAlmostEqual(hf_inten.attrs['min'], 0.01)
+                    if todense_flag:
+                        self.assertEqual(hf_inten.compression, compression)
+                        self.assertEqual(hf_inten.chunks, (2, 3))
+                    else:
+                        self.assertEqual(hf_inten['data'].compression, compression)
+                        self.assertEqual(hf_inten['indptr'].chunks, (2,))
+
+                haz_read = Hazard('TC')
+                haz_read.read_hdf5(file_name)
+                self.assertTrue(np.array_equal(hazard.intensity.todense(),
+                                               haz_read.intensity.todense()))
+                self.assertTrue(np.array_equal(hazard.fraction.todense(),
+                                               haz_read.fraction.todense()))
+                haz_bat = list(haz_read.read_hdf5_batches(file_name, 3))
+                self.assertTrue(np.array_equal(hazard.intensity[3:].todense(),
+                                               haz_bat[1].intensity.todense()))
+
+    @unittest.skipUnless(hdf5plugin, 'needs hdf5plugin')
+    def test_write_read_blosc_pass(self):
+        ''' Write blosc compressed matrices and read them back.'''
+        file_name = os.path.join(DATA_DIR, 'test_haz.h5')
+
+        hazard = dummy_hazard()
+        for todense_flag in [False, True]:
+            hazard.write_hdf5(file_name, todense=todense_flag,
+                              compression='blosc', chunk_events=2)
+
+            haz_read = Hazard('TC')
+            haz_read.read_hdf5(file_name)
+            self.assertTrue(np.array_equal(hazard.intensity.todense(),
+                                           haz_read.intensity.todense()))
+            self.assertTrue(np.array_equal(hazard.fraction.todense(),
+                                           haz_read.fraction.todense()))
+            haz_read = Hazard('TC')
+            haz_read.read_hdf5(file_name, event_id=[1, 4])
+            self.assertTrue(np.array_equal(haz_read.intensity.todense(),
+                                           hazard.intensity[[0, 3], :].todense()))
+            haz_bat = list(haz_read.read_hdf5_batches(file_name, 3))
+            self.assertTrue(np.array_equal(hazard.intensity[3:].todense(),
+                                           haz_bat[1].intensity.todense()))
+
+    def test_read_filter_fail(self):
+        ''' Read matrices compressed with a filter that is not available.'''
+        file_name = os.path.join(DATA_DIR, 'test_haz.h5')
+        dummy_hazard().write_hdf5(file_name)
+        # store intensity data with an unregistered filter, as optional
+        # filter so that it can be written without the filter
+        with h5py.File(file_name, 'a') as hf_data:
+            data = hf_data['intensity/data'][:]
+            del hf_data['intensity/data']
+            dcpl = h5py.h5p.create(h5py.h5p.DATASET_CREATE)
+            dcpl.set_chunk(data.shape)
+            dcpl.set_filter(305, h5py.h5z.FLAG_OPTIONAL, ())
+            h5py.h5d.create(hf_data['intensity'].id, b'data',
+                            h5py.h5t.py_create(data.dtype),
+                            h5py.h5s.create_simple(data.shape), dcpl=dcpl)
+            hf_data['intensity/data'][:] = data
+
+        with self.assertLogs('climada.hazard.base', level='ERROR') as cm:
+            with self.assertRaises(ValueError):
+                Hazard('TC').read_hdf5(file_name)
+        self.assertIn('Compression filter 305 of /intensity/data not available',
+                      cm.output[0])
+
+    def test_write_compression_fail(self):
+        ''' Wrong compression filter.'''
+        file_name = os.path.join(DATA_DIR, 'test_haz.h5')
+        with self.assertLogs('climada.hazard.base', level='ERROR') as cm:
+            with self.assertRaises(ValueError):
+                dummy_hazard().write_hdf5(file_name, compression='zip')
+        self.assertIn('Compression zip not supported.', cm.output[0])
+
+    def test_read_select_pass(self):
+        ''' Read only selected events and centroids of a hazard hdf5 file.'''
+        file_name = os.path.join(DATA_DIR, 'test_haz.h5')
+
+        hazard = dummy_hazard()
+        hazard.centroids.region_id = np.array([1, 2, 1])
+        for todense_flag in [False, True]:
+            hazard.write_hdf5(file_name, todense=todense_flag)
+
+            haz_read = Hazard('TC')
+            haz_read.read_hdf5(file_name, date=(2, 4), reg_id=1)
+            haz_sel = hazard.select(date=(2, 4), reg_id=1)
+            self.assertTrue(np.array_equal(haz_read.event_id, np.array([2, 3, 4])))
+            self.assertEqual(haz_read.event_name, ['ev2', 'ev3', 'ev4'])
+            self.assertTrue(np.array_equal(haz_read.centroids.coord,
+                                           haz_sel.centroids.coord))
+            self.assertTrue(np.array_equal(haz_read.intensity.todense(),
+                                           haz_sel.intensity.todense()))
+            self.assertTrue(np.array_equal(haz_read.fraction.todense(),
+                                           haz_sel.fraction.todense()))
+
+            haz_read = Hazard('TC')
+            haz_read.read_hdf5(file_name, event_id=[4, 1])
+            self.assertTrue(np.array_equal(haz_read.event_id, np.array([1, 4])))
+            self.assertTrue(np.array_equal(haz_read.intensity.todense(),
+                                           hazard.intensity[[0, 3], :].todense()))
+
+            haz_read = Hazard('TC')
+            haz_read.read_hdf5(file_name, event_id=[1, 3], reg_id=1)
+            self.assertTrue(np.array_equal(haz_read.fraction.todense(),
+                                           hazard.fraction[[0, 2], :][:, [0, 2]].todense()))
+
+            haz_read = Hazard('TC')
+            haz_read.read_hdf5(file_name, reg_id=5)
+            self.assertEqual(haz_read.size, 0)
+
 class TestCentroids(unittest.TestCase):
     """Test return period statistics"""
 
@@ -20,6 +20,8 @@ Test tc_tracks module.
 """
 
 import os
+import glob
+import tempfile
 import unittest
 import array
 import xarray as xr
@@ -89,6 +91,22 @@ class TestFuncs(unittest.TestCase):
         basin = 'EP'
         self.assertEqual(tc_track._set_penv(basin), 1010)
 
+    def test_fill_track_gaps_pass(self):
+        """ Test _fill_track_gaps as pandas ffill and bfill per track."""
+        values = np.array([np.nan, 1, np.nan, np.nan, np.nan, 2,
+                           np.nan, np.nan, 3, np.nan, np.nan, np.nan])
+        offsets = np.array([0, 6, 7, 12])
+        ref_val = np.array([1, 1, 1, np.nan, 2, 2, np.nan, 3, 3, 3, np.nan, np.nan])
+        tc._fill_track_gaps(values, offsets, 1, np.arange(12)*10.)
+        ref_val[np.isnan(ref_val)] = [30, 60, 100, 110]
+        self.assertTrue(np.array_equal(values, ref_val))
+
+    def test_char_to_str_pass(self):
+        """ Test _char_to_str with masked characters."""
+        chars = np.ma.masked_array(np.array([[b'A', b'B', b'C'], [b'N', b'A', b'']]),
+                                   mask=[[False, False, False], [False, False, True]])
+        self.assertEqual(tc._char_to_str(chars).tolist(), ['ABC', 'NA'])
+
     def test_get_track_pass(self):
         """ Test get_track."""
         tc_track = TCTracks()
@@ -102,6 +120,114 @@ class TestFuncs(unittest.TestCase):
         self.assertIsInstance(tc_track.get_track(), list)
         self.assertIsInstance(tc_track.get_track('1951239N12334'), xr.Dataset)
 
+    def test_columns_pass(self):
+        """ Test conversion between data and columns."""
+        tc_track = TCTracks()
+        tc_track.read_processed_ibtracs_csv(TEST_TRACK_SHORT)
+        tc_track_bis = TCTracks()
+        tc_track_bis.read_processed_ibtracs_csv(TEST_TRACK)
+        tc_track.append(tc_track_bis.data)
+        tracks = [track.copy(True) for track in tc_track.data]
+
+        columns = tc_track.columns
+        self.assertEqual(columns.size, 2)
+        self.assertEqual(columns.offsets.tolist(), [0, 9, 47])
+        self.assertEqual(columns.node['lat'].size, 47)
+        self.assertEqual(columns.attrs['sid'].tolist(), ['1951239N12334'] * 2)
+        self.assertTrue(np.array_equal(columns.nodes(1)['lon'], tracks[1].lon.values))
+
+        sel_columns = columns.select(np.array([False, True]))
+        self.assertEqual(sel_columns.offsets.tolist(), [0, 38])
+        sel_columns.node['lat'][0] = 0
+        self.assertEqual(columns.node['lat'][9], tracks[1].lat.values[0])
+
+        tc_track.columns = columns
+        self.assertEqual(tc_track.size, 2)
+        self.assertIsInstance(tc_track.get_track('1951239N12334'), xr.Dataset)
+        for track, track_ref in zip(tc_track.data, tracks):
+            self.assertTrue(track.equals(track_ref))
+            self.assertEqual(track.attrs.keys(), track_ref.attrs.keys())
+            self.assertEqual(track.name, track_ref.name)
+
+    def test_columns_hdf5_pass(self):
+        """ Test write_hdf5 and read_hdf5 of TrackColumns."""
+        tc_track = TCTracks()
+        tc_track.read_processed_ibtracs_csv(TEST_TRACK)
+        tc_track.calc_random_walk(ens_size=2, decay=False)
+        file_name = os.path.join(DATA_DIR, 'test_tracks.h5')
+        tc_track.columns.write_hdf5(file_name)
+
+        columns = tc.TrackColumns()
+        columns.read_hdf5(file_name)
+        os.remove(file_name)
+        self.assertEqual(list(columns.node), list(tc_track.columns.node))
+        self.assertEqual(list(columns.attrs), list(tc_track.columns.attrs))
+        tc_read = TCTracks()
+        tc_read.columns = columns
+        for track, track_ref in zip(tc_read.data, tc_track.data):
+            self.assertTrue(track.identical(track_ref))
+        self.assertEqual(tc_read.data[1].sid, '1951239N12334_gen1')
+        self.assertIsInstance(tc_read.data[1].orig_event_flag, bool)
+
+    def test_write_read_hdf5_pass(self):
+        """ Test write_hdf5 with append and read_hdf5 with selection."""
+        tc_track = TCTracks()
+        tc_track.read_processed_ibtracs_csv(TEST_TRACK)
+        tc_track.calc_random_walk(ens_size=2, decay=False)
+        tc_short = TCTracks()
+        tc_short.read_processed_ibtracs_csv(TEST_TRACK_SHORT)
+        tc_short.data[0].attrs['sid'] = 'short'
+        file_name = os.path.join(DATA_DIR, 'test_tracks.h5')
+        tc_track.write_hdf5(file_name)
+        tc_short.write_hdf5(file_name, append=True)
+
+        tc_read = TCTracks()
+        tc_read.read_hdf5(file_name)
+        self.assertEqual(tc_read.size, 4)
+        self.assertEqual(tc_read.columns.offsets.tolist(), [0, 38, 76, 114, 123])
+        self.assertTrue(tc_read.data[3].identical(tc_short.data[0]))
+
+        tc_read.read_hdf5(file_name, sid=['short', '1951239N12334_gen2'])
+        self.assertEqual(tc_read.size, 2)
+        self.assertTrue(tc_read.data[0].identical(tc_track.data[2]))
+        self.assertTrue(tc_read.data[1].identical(tc_short.data[0]))
+
+        tc_read.read_hdf5(file_name, year_range=(1952, 1960))
+        self.assertEqual(tc_read.size, 0)
+        tc_read.read_hdf5(file_name, sid='1951239N12334', year_range=(1951, 1951))
+        self.assertEqual(tc_read.size, 1)
+        self.assertTrue(tc_read.data[0].identical(tc_track.data[0]))
+        os.remove(file_name)
+
+    def test_ibtracs_cache_pass(self):
+        """ Test cache file names of read_ibtracs_netcdf and clear_ibtracs_cache."""
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            cache_dir = tc.IBTRACS_CACHE_DIR
+            tc.IBTRACS_CACHE_DIR = os.path.join(tmp_dir, 'cache')
+            self.addCleanup(setattr, tc, 'IBTRACS_CACHE_DIR', cache_dir)
+            fn_nc = os.path.join(tmp_dir, 'ibtracs.nc')
+            with open(fn_nc, 'wb') as file:
+                file.write(b'ibtracs')
+
+            cache_file = tc._ibtracs_cache_file(fn_nc, 'usa', None, (1980, 2018), 'NA', False)
+            self.assertEqual(os.path.dirname(cache_file), tc.IBTRACS_CACHE_DIR)
+            self.assertEqual(cache_file, tc._ibtracs_cache_file( \
+                fn_nc, 'usa', None, [1980., 2018.], 'NA', 0))
+            self.assertEqual(len(glob.glob(os.path.join(tc.IBTRACS_CACHE_DIR, 'sha1_*.txt'))), 1)
+            version = tc.IBTRACS_CACHE_VERSION
+            tc.IBTRACS_CACHE_VERSION = version + 1
+            self.addCleanup(setattr, tc, 'IBTRACS_CACHE_VERSION', version)
+            self.assertNotEqual(cache_file, tc._ibtracs_cache_file( \
+                fn_nc, 'usa', None, (1980, 2018), 'NA', False))
+
+            open(cache_file, 'w').close()
+            tc.clear_ibtracs_cache(fn_nc)
+            self.assertEqual(os.listdir(tc.IBTRACS_CACHE_DIR), [])
+            open(tc._ibtracs_cache_file(fn_nc, 'usa', None, (1980, 2018), 'NA', False), \
+                 'w').close()
+            tc.clear_ibtracs_cache()
+            self.assertEqual(os.listdir(tc.IBTRACS_CACHE_DIR), [])
+
     def test_interp_track_pass(self):
         """ Interpolate track to min_time_step. Compare to MATLAB reference."""
         tc_track = TCTracks()
@@ -222,6 +348,41 @@ class TestFuncs(unittest.TestCase):
         self.assertEqual(tc_track.data[0].id_no, 1951239012334)
         self.assertEqual(tc_track.data[0].category, 1)
 
+    def test_interp_columns_pass(self):
+        """ Interpolate several tracks at once as one by one """
+        tc_track = TCTracks()
+        tc_track.read_processed_ibtracs_csv(TEST_TRACK)
+        track_shift = tc_track.data[0].copy(deep=True)
+        track_shift['time'] = track_shift.time + np.timedelta64(90, 'm')
+        track_shift['max_sustained_wind'] = track_shift.max_sustained_wind * 2
+        track_am = tc_track.data[0].copy(deep=True)
+        track_am.lon.values = np.linspace(175, 185, track_am.lon.size)
+        track_am.lon.values[track_am.lon.values > 180] -= 360
+        track_short = tc_track.data[0].isel(time=slice(0, 3))
+        tc_track.data = [tc_track.data[0], track_short, track_shift, track_am]
+
+        tc_one = list()
+        for track in tc_track.data:
+            tc_one.append(TCTracks())
+            tc_one[-1].data = [track.copy(deep=True)]
+            tc_one[-1].equal_timestep(time_step_h=1)
+        tc_track.equal_timestep(time_step_h=1)
+
+        self.assertEqual(tc_track.size, 4)
+        for track, one in zip(tc_track.data, tc_one):
+            self.assertEqual(track.time.size, one.data[0].time.size)
+            for var in one.data[0].variables:
+                self.assertTrue(np.allclose(track[var].values.astype(float),
+                                            one.data[0][var].values.astype(float),
+                                            equal_nan=True))
+            self.assertEqual(track.category, one.data[0].category)
+        self.assertEqual(tc_track.data[1].time.size, 3)
+        self.assertEqual(tc_track.data[2].time.size, tc_track.data[0].time.size)
+        self.assertEqual(tc_track.data[2].time.values[0] - tc_track.data[0].time.values[0],
+                         np.timedelta64(1, 'h'))
+        self.assertEqual(tc_track.data[2].category, 5)
+        self.assertTrue(np.all(np.abs(tc_track.data[3].lon.values) <= 180))
+        self.assertTrue(np.all(np.abs(tc_track.data[3].lon.values) >= 175))
 
     def test_random_no_landfall_pass(self):
         """ Test calc_random_walk with decay and no historical tracks with landfall """
@@ -288,8 +449,7 @@ class TestFuncs(unittest.TestCase):
         """ Test _calc_land_decay with no historical tracks with landfall """
         tc_track = TCTracks()
         tc_track.read_processed_ibtracs_csv(TEST_TRACK_SHORT)
-        land_geom = tc._calc_land_geom(tc_track.data)
-        tc._track_land_params(tc_track.data[0], land_geom)
+        land_geom = tc._calc_land_geom(tc_track.columns)
         with self.assertLogs('climada.hazard.tc_tracks', level='INFO') as cm:
             tc_track._calc_land_decay(land_geom)
         self.assertIn('No historical track with landfall.', cm.output[0])
@@ -298,8 +458,7 @@ class TestFuncs(unittest.TestCase):
         """ Test _calc_land_decay with environmental pressure function."""
         tc_track = TCTracks()
         tc_track.read_processed_ibtracs_csv(TC_ANDREW_FL)
-        land_geom = tc._calc_land_geom(tc_track.data)
-        tc._track_land_params(tc_track.data[0], land_geom)
+        land_geom = tc._calc_land_geom(tc_track.columns)
         v_rel, p_rel = tc_track._calc_land_decay(land_geom)
 
         self.assertEqual(7, len(v_rel))
@@ -314,13 +473,14 @@ class TestFuncs(unittest.TestCase):
             self.assertTrue(i+1 in p_rel.keys())
 
     def test_decay_values_andrew_pass(self):
-        """ Test _decay_values with central pressure function."""
+        """ Test _columns_decay_values with central pressure function."""
         tc_track = TCTracks()
         tc_track.read_processed_ibtracs_csv(TC_ANDREW_FL)
         s_rel = False
-        land_geom = tc._calc_land_geom(tc_track.data)
-        tc._track_land_params(tc_track.data[0], land_geom)
-        v_lf, p_lf, x_val = tc._decay_values(tc_track.data[0], land_geom, s_rel)
+        columns = tc_track.columns
+        land_geom = tc._calc_land_geom(columns)
+        tc._columns_land_params(columns, land_geom)
+        v_lf, p_lf, x_val = tc._columns_decay_values(columns, np.ones(1, bool), s_rel)
 
         ss_category = 6
         s_cell_1 = 1*[1.0149413347244263]
@@ -360,12 +520,35 @@ class TestFuncs(unittest.TestCase):
 
         self.assertTrue(track.dist_since_lf.values[-1] >
                         dist_to_coast(track.lat.values[-1], track.lon.values[-1])/1000)
-        self.assertEqual(1020.5431562223974, track['dist_since_lf'].values[-1])
+        self.assertAlmostEqual(1020.5431562223974, track['dist_since_lf'].values[-1])
 
         # check distances on land always increase, in second landfall
         dist_on_land = track.dist_since_lf.values[track.on_land]
         self.assertTrue(np.all(np.diff(dist_on_land)[1:] > 0))
 
+    def test_dist_since_lf_nodes_pass(self):
+        """ Test _dist_since_lf_nodes of several tracks as track per track."""
+        tc_track = TCTracks()
+        tc_track.read_processed_ibtracs_csv(TC_ANDREW_FL)
+        track = tc_track.get_track()
+        track['on_land'] = ('time', coord_on_land(track.lat.values,
+             track.lon.values))
+        dist_ref = tc._dist_since_lf(track)
+
+        # no landfall in second track, starts on land in third
+        lat = np.tile(track.lat.values, 3)
+        lon = np.tile(track.lon.values, 3)
+        on_land = np.tile(track.on_land.values, 3)
+        on_land[track.time.size:2*track.time.size] = False
+        on_land[2*track.time.size] = True
+        offsets = np.arange(4) * track.time.size
+        dist = tc._dist_since_lf_nodes(lat, lon, on_land, offsets)
+
+        self.assertTrue(np.allclose(dist[:track.time.size], dist_ref, equal_nan=True))
+        self.assertTrue(np.all(np.isnan(dist[track.time.size:2*track.time.size])))
+        self.assertEqual(dist[2*track.time.size], 0)
+        self.assertTrue(np.allclose(dist[2*track.time.size+1:], dist_ref[1:], equal_nan=True))
+
     def test_calc_orig_lf(self):
         """ Test _calc_orig_lf for andrew tropical cyclone."""
         tc_track = TCTracks()
@@ -374,7 +557,7 @@ class TestFuncs(unittest.TestCase):
         track['on_land'] = ('time', coord_on_land(track.lat.values,
              track.lon.values))
         sea_land_idx = np.where(np.diff(track.on_land.astype(int)) == 1)[0]
-        orig_lf = tc._calc_orig_lf(track, sea_land_idx)
+        orig_lf = tc._calc_orig_lf(track.lat.values, track.lon.values, sea_land_idx)
 
         self.assertEqual(orig_lf.shape, (sea_land_idx.size, 2))
         self.assertTrue(np.array_equal(orig_lf[0], np.array([25.5, -80.25])))
@@ -410,9 +593,9 @@ class TestFuncs(unittest.TestCase):
         """ Test _apply_land_decay with no historical tracks with landfall """
         tc_track = TCTracks()
         tc_track.read_processed_ibtracs_csv(TEST_TRACK_SHORT)
-        land_geom = tc._calc_land_geom(tc_track.data)
+        land_geom = tc._calc_land_geom(tc_track.columns)
         tc._track_land_params(tc_track.data[0], land_geom)
-        tc_track.data[0]['orig_event_flag']=False
+        tc_track.data[0].attrs['orig_event_flag'] = False
         tc_ref = tc_track.data[0].copy()
         tc_track._apply_land_decay(dict(), dict(), land_geom)
 
@@ -441,9 +624,8 @@ class TestFuncs(unittest.TestCase):
 
         tc_track = TCTracks()
         tc_track.read_processed_ibtracs_csv(TC_ANDREW_FL)
-        tc_track.data[0]['orig_event_flag'] = False
-        land_geom = tc._calc_land_geom(tc_track.data)
-        tc._track_land_params(tc_track.data[0], land_geom)
+        tc_track.data[0].attrs['orig_event_flag'] = False
+        land_geom = tc._calc_land_geom(tc_track.columns)
         tc_track._apply_land_decay(v_rel, p_rel, land_geom, s_rel=True, check_plot=False)
 
         p_ref = np.array([1.010000000000000, 1.009000000000000, 1.008000000000000,
@@ -506,22 +688,6 @@ class TestFuncs(unittest.TestCase):
         self.assertTrue(np.allclose(a_coef_res[1:], np.ones((x_val.size-1,))*a_coef))
         self.assertTrue(np.isnan(a_coef_res[0]))
 
-    def test_decay_ps_value(self):
-        """Test the calculation of S in pressure decay."""
-        on_land_idx = 5
-        tr_ds = xr.Dataset()
-        tr_ds.coords['time'] = ('time', np.arange(10))
-        tr_ds['central_pressure'] = ('time', np.arange(10, 20))
-        tr_ds['environmental_pressure'] = ('time', np.arange(20, 30))
-        tr_ds['on_land'] = ('time', np.zeros((10,)).astype(bool))
-        tr_ds.on_land[on_land_idx] = True
-        p_landfall = 100
-
-        res = tc._calc_decay_ps_value(tr_ds, p_landfall, on_land_idx, s_rel=True)
-        self.assertEqual(res, float(tr_ds.environmental_pressure[on_land_idx]/p_landfall))
-        res = tc._calc_decay_ps_value(tr_ds, p_landfall, on_land_idx, s_rel=False)
-        self.assertEqual(res, float(tr_ds.central_pressure[on_land_idx]/p_landfall))
-
     def test_category_pass(self):
         """Test category computation."""
         max_sus_wind = np.array([25, 30, 35, 40, 45, 45, 45, 45, 35, 25])
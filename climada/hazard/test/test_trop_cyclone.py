@@ -20,6 +20,7 @@ Test TropCyclone class
 """
 
 import os
+import tempfile
 import unittest
 import numpy as np
 from pint import UnitRegistry
@@ -45,12 +46,12 @@ class TestReader(unittest.TestCase):
     """Test loading funcions from the TropCyclone class"""
 
     def test_set_one_pass(self):
-        """Test _tc_from_track function."""
+        """Test set_from_tracks with one track."""
         tc_track = TCTracks()
         tc_track.read_processed_ibtracs_csv(TEST_TRACK)
         tc_track.equal_timestep()
-        coastal_centr = tc.coastal_centr_idx(CENTR_TEST_BRB)
-        tc_haz = TropCyclone._tc_from_track(tc_track.data[0], CENTR_TEST_BRB, coastal_centr)
+        tc_haz = TropCyclone()
+        tc_haz.set_from_tracks(tc_track, CENTR_TEST_BRB)
 
         self.assertEqual(tc_haz.tag.haz_type, 'TC')
         self.assertEqual(tc_haz.tag.description, '')
@@ -135,17 +136,40 @@ class TestReader(unittest.TestCase):
         self.assertEqual(tc_haz.fraction.nonzero()[0].size, 0)
         self.assertEqual(tc_haz.intensity.nonzero()[0].size, 0)
 
+    def test_set_pool_pass(self):
+        """ Test set_from_tracks in a pool of processes equals sequential. """
+        from pathos.pools import ProcessPool as Pool
+        tc_track = TCTracks()
+        tc_track.read_processed_ibtracs_csv([TEST_TRACK] * 4)
+        tc_track.equal_timestep()
+        for i_track, track in enumerate(tc_track.data):
+            track['lat'] = track.lat - 0.2 * i_track
+
+        tc_seq = TropCyclone()
+        tc_seq.set_from_tracks(tc_track, CENTR_TEST_BRB)
+        pool = Pool()
+        tc_par = TropCyclone(pool)
+        tc_par.set_from_tracks(tc_track, CENTR_TEST_BRB)
+        pool.close()
+        pool.join()
+
+        self.assertEqual(tc_par.intensity.shape, (4, 296))
+        self.assertTrue(tc_par.intensity.nnz > 0)
+        self.assertEqual(tc_par.intensity.nnz, tc_seq.intensity.nnz)
+        self.assertEqual((tc_par.intensity != tc_seq.intensity).nnz, 0)
+        self.assertTrue(np.array_equal(tc_par.frequency, tc_seq.frequency))
+        self.assertEqual(tc_par.event_name, tc_seq.event_name)
+
 class TestModel(unittest.TestCase):
     """Test modelling of tropical cyclone"""
 
     def test_extra_rad_max_wind_pass(self):
         """ Test _extra_rad_max_wind function. Compare to MATLAB reference."""
-        ureg = UnitRegistry()
         tc_track = TCTracks()
         tc_track.read_processed_ibtracs_csv(TEST_TRACK)
         tc_track.equal_timestep()
         rad_max_wind = tc._extra_rad_max_wind(tc_track.data[0].central_pressure.values,
-            tc_track.data[0].radius_max_wind.values, ureg)
+            tc_track.data[0].radius_max_wind.values)
 
         self.assertEqual(rad_max_wind[0], 75.536713749999905)
         self.assertAlmostEqual(rad_max_wind[10], 75.592659583328057)
@@ -226,7 +250,7 @@ class TestModel(unittest.TestCase):
         tc_track.equal_timestep()
         tc_track.data[0]['radius_max_wind'] = ('time', tc._extra_rad_max_wind(
             tc_track.data[0].central_pressure.values,
-            tc_track.data[0].radius_max_wind.values, ureg))
+            tc_track.data[0].radius_max_wind.values))
         r_arr = np.array([286.4938638337190, 290.5930935802884,
                           295.0271327746536, 299.7811253637995,
                           296.8484825705515, 274.9892882245964])
@@ -258,7 +282,7 @@ class TestModel(unittest.TestCase):
         tc_track.equal_timestep()
 
         v_trans = tc._vtrans(tc_track.data[0].lat.values, tc_track.data[0].lon.values,
-                tc_track.data[0].time_step.values, ureg)
+                tc_track.data[0].time_step.values)
 
         to_kn = (1* ureg.meter / ureg.second).to(ureg.knot).magnitude
 
@@ -274,7 +298,7 @@ class TestModel(unittest.TestCase):
         tc_track.equal_timestep()
         tc_track.data[0]['radius_max_wind'] = ('time', tc._extra_rad_max_wind(
             tc_track.data[0].central_pressure.values,
-            tc_track.data[0].radius_max_wind.values, ureg))
+            tc_track.data[0].radius_max_wind.values))
         r_arr = np.array([286.4938638337190, 290.5930935802884,
                           295.0271327746536, 299.7811253637995,
                           296.8484825705515, 274.9892882245964])
@@ -296,17 +320,20 @@ class TestModel(unittest.TestCase):
         self.assertAlmostEqual(v_ang[5] * to_kn, 11.305188714213809)
 
     def test_windfield(self):
-        """ Test _windfield function. Compare to MATLAB reference. """
+        """ Test _windfield_close function. Compare to MATLAB reference. """
         ureg = UnitRegistry()
         tc_track = TCTracks()
         tc_track.read_processed_ibtracs_csv(TEST_TRACK)
         tc_track.equal_timestep()
         tc_track.data[0]['radius_max_wind'] = ('time', tc._extra_rad_max_wind(
             tc_track.data[0].central_pressure.values,
-            tc_track.data[0].radius_max_wind.values, ureg))
+            tc_track.data[0].radius_max_wind.values))
         coast_centr = tc.coastal_centr_idx(CENTR_TEST_BRB)
 
-        wind = tc._windfield(tc_track.data[0], CENTR_TEST_BRB.coord, coast_centr, model=0)
+        wind = np.zeros(CENTR_TEST_BRB.size)
+        tc._windfield_close(tc._track_arrays(tc_track.data[0]),
+                            CENTR_TEST_BRB.spatial_index, np.unique(coast_centr),
+                            0, wind)
 
         to_kn = (1* ureg.meter / ureg.second).to(ureg.knot).magnitude
         self.assertEqual(wind.shape, (CENTR_TEST_BRB.size,))
@@ -319,6 +346,24 @@ class TestModel(unittest.TestCase):
         self.assertAlmostEqual(wind[200] * to_kn, 57.28814245245439)
         self.assertAlmostEqual(wind[220] * to_kn, 69.62477194818004)
 
+    def test_windfield_spatial_index(self):
+        """ Test _windfield_close with a new and with the centroids spatial
+        index. """
+        tc_track = TCTracks()
+        tc_track.read_processed_ibtracs_csv(TEST_TRACK)
+        tc_track.equal_timestep()
+        coast_centr = np.unique(tc.coastal_centr_idx(CENTR_TEST_BRB))
+        track_arr = tc._track_arrays(tc_track.data[0])
+
+        wind = np.zeros(CENTR_TEST_BRB.size)
+        tc._windfield_close(track_arr, tc.SpatialIndex(CENTR_TEST_BRB.coord),
+                            coast_centr, 0, wind)
+        wind_idx = np.zeros(CENTR_TEST_BRB.size)
+        tc._windfield_close(track_arr, CENTR_TEST_BRB.spatial_index,
+                            coast_centr, 0, wind_idx)
+        self.assertEqual(np.nonzero(wind_idx)[0].size, 280)
+        self.assertTrue(np.array_equal(wind, wind_idx))
+
     def test_gust_from_track(self):
         """ Test gust_from_track function. Compare to MATLAB reference. """
         tc_track = TCTracks()
@@ -338,6 +383,47 @@ class TestModel(unittest.TestCase):
         self.assertAlmostEqual(intensity[0, 250], 34.26311998266044)
         self.assertAlmostEqual(intensity[0, 295], 44.273964728810924)
 
+    def test_gust_from_tracks(self):
+        """ Test gust_from_tracks function with several tracks. """
+        tc_track = TCTracks()
+        tc_track.read_processed_ibtracs_csv([TEST_TRACK, TEST_TRACK_SHORT, TEST_TRACK])
+        tc_track.equal_timestep()
+        tc_track.data[2]['lon'] = tc_track.data[2].lon + 0.5
+        intensity = tc.gust_from_tracks(tc_track.data, CENTR_TEST_BRB)
+
+        self.assertTrue(isinstance(intensity, sparse.csr.csr_matrix))
+        self.assertEqual(intensity.shape, (3, 296))
+        self.assertTrue(intensity.has_sorted_indices)
+        self.assertEqual(intensity[0, :].nonzero()[0].size, 280)
+        self.assertEqual(intensity[1, :].nonzero()[0].size, 0)
+        self.assertAlmostEqual(intensity[0, 100], 38.84863159321016)
+        for i_track, track in enumerate(tc_track.data):
+            self.assertEqual((intensity[i_track, :] != \
+                tc.gust_from_track(track, CENTR_TEST_BRB)).nnz, 0)
+
+    def test_gust_shared_centroids(self):
+        """ Test gusts computed with centroids shared through files. """
+        tc_track = TCTracks()
+        tc_track.read_processed_ibtracs_csv([TEST_TRACK, TEST_TRACK])
+        tc_track.equal_timestep()
+        tc_track.data[1]['lat'] = tc_track.data[1].lat - 0.5
+        coastal_idx = tc.coastal_centr_idx(CENTR_TEST_BRB)
+        intensity = tc.gust_from_tracks(tc_track.data, CENTR_TEST_BRB, coastal_idx)
+
+        with tempfile.TemporaryDirectory() as shared_dir:
+            tc._write_shared_centroids(shared_dir, CENTR_TEST_BRB.spatial_index,
+                                       coastal_idx)
+            sp_index, coastal_read = tc._read_shared_centroids(shared_dir)
+            self.assertTrue(np.array_equal(sp_index.coord, CENTR_TEST_BRB.coord))
+            self.assertTrue(np.array_equal(coastal_read, coastal_idx))
+            self.assertTrue(np.array_equal(sp_index.cos_lat,
+                                           CENTR_TEST_BRB.spatial_index.cos_lat))
+            csr_buf = tc._gust_csr_shared([tc._track_arrays(track) \
+                for track in tc_track.data], shared_dir, 0)
+        intensity_shared = sparse.csr_matrix(csr_buf, shape=intensity.shape)
+        self.assertEqual(intensity.nnz, intensity_shared.nnz)
+        self.assertEqual((intensity != intensity_shared).nnz, 0)
+
 
 class TestClimateSce(unittest.TestCase):
 
@@ -21,26 +21,27 @@ Define TropCyclone class.
 
 __all__ = ['TropCyclone']
 
+import os
 import itertools
 import logging
 import copy
 import time
+import tempfile
 import datetime as dt
 import numpy as np
-from numpy import linalg as LA
+import h5py
 from scipy import sparse
 import matplotlib.animation as animation
-from pint import UnitRegistry
-from numba import jit
+from numba import jit, prange
 from tqdm import tqdm
 
 from climada.hazard.base import Hazard
 from climada.hazard.tag import Tag as TagHazard
-from climada.hazard.tc_tracks import TCTracks
+from climada.hazard.tc_tracks import TCTracks, TrackColumns
 from climada.hazard.tc_clim_change import get_knutson_criterion, calc_scale_knutson
 from climada.hazard.centroids.centr import Centroids
 from climada.util.constants import GLB_CENTROIDS_MAT
-from climada.util.interpolation import dist_approx
+from climada.util.interpolation import dist_approx, SpatialIndex
 import climada.util.plot as u_plot
 
 LOGGER = logging.getLogger(__name__)
@@ -58,6 +59,15 @@ MODEL_VANG = {'H08': 0
              }
 """ Enumerate different symmetric wind field calculation."""
 
+NM_TO_KM = 1.852
+""" Nautical miles to km """
+
+KMH_TO_MS = 1000 / 3600
+""" km/h to m/s """
+
+KN_TO_MS = 1852 / 3600
+""" Knots to m/s """
+
 class TropCyclone(Hazard):
     """Contains tropical cyclone events.
     Attributes:
@@ -111,7 +121,6 @@ class TropCyclone(Hazard):
         Raises:
             ValueError
         """
-        num_tracks = tracks.size
         if centroids is None:
             centroids = Centroids()
             centroids.read_mat(GLB_CENTROIDS_MAT)
@@ -121,25 +130,21 @@ class TropCyclone(Hazard):
             coastal_idx = coastal_centr_idx(centroids)
         if not centroids.coord.size:
             centroids.set_meta_to_lat_lon()
+        # search structures shared by all the tracks
+        centroids.spatial_index.build()
 
         LOGGER.info('Mapping %s tracks to %s centroids.', str(tracks.size),
                     str(centroids.size))
         if self.pool:
-            chunksize = min(num_tracks//self.pool.ncpus, 1000)
-            tc_haz = self.pool.map(self._tc_from_track, tracks.data,
-                                   itertools.repeat(centroids, num_tracks),
-                                   itertools.repeat(coastal_idx, num_tracks),
-                                   itertools.repeat(model, num_tracks),
-                                   chunksize=chunksize)
+            intensity = _gust_from_tracks_pool(self.pool, tracks.columns,
+                                               centroids, coastal_idx, model)
         else:
-            tc_haz = list()
-            for track in tracks.data:
-                tc_haz.append(self._tc_from_track(track, centroids, coastal_idx,
-                                                  model))
-        LOGGER.debug('Append events.')
-        self._append_all(tc_haz)
+            intensity = gust_from_tracks(tracks.columns, centroids, coastal_idx,
+                                         model)
+        LOGGER.debug('Set events.')
+        self._set_events(tracks.columns, intensity, centroids)
         LOGGER.debug('Compute frequency.')
-        self._set_frequency(tracks.data)
+        self._set_frequency(tracks.columns)
         self.tag.description = description
 
     def set_climate_scenario_knu(self, ref_year=2050, rcp_scenario=45):
@@ -233,16 +238,46 @@ class TropCyclone(Hazard):
             pbar.close()
         return tc_list, tr_coord
 
+    def _set_events(self, tracks, intensity, centroids):
+        """Clear and set one event per track with the given intensity.
+        Parameters:
+            tracks (TrackColumns): tropical cyclone tracks
+            intensity (sparse.csr_matrix): tracks x centroids wind gusts
+            centroids (Centroids): centroids of the intensity
+        """
+        pool = self.pool
+        self.clear()
+        self.pool = pool
+
+        file_name = ['IBTrACS: ' + name for name in tracks.attrs['name']]
+        if len(file_name) == 1:
+            file_name = file_name[0]
+        self.tag = TagHazard(HAZ_TYPE, file_name)
+        self.units = 'm/s'
+        self.centroids = copy.deepcopy(centroids)
+        self.event_id = np.arange(1, tracks.size+1)
+        # frequency set when all tracks available
+        self.frequency = np.ones(tracks.size)
+        self.event_name = list(tracks.attrs['sid'])
+        self.intensity = intensity
+        self.fraction = intensity.copy()
+        self.fraction.data.fill(1)
+        # store date of start
+        self.date = tracks.node['time'][tracks.offsets[:-1]]. \
+            astype('datetime64[D]').astype(int) + dt.date(1970, 1, 1).toordinal()
+        self.orig = tracks.attrs['orig_event_flag'].astype(bool)
+        self.category = tracks.attrs['category'].astype(int)
+        self.basin = list(tracks.attrs['basin'])
+
     def _set_frequency(self, tracks):
         """Set hazard frequency from tracks data.
         Parameters:
-            tracks (list(xr.Dataset))
+            tracks (TrackColumns)
         """
-        if not tracks:
+        if not tracks.size:
             return
-        delta_time = np.max([np.max(track.time.dt.year.values) \
-            for track in tracks]) - np.min([np.min(track.time.dt.year.values) \
-            for track in tracks]) + 1
+        years = tracks.node['time'].astype('datetime64[Y]').astype(int)
+        delta_time = years.max() - years.min() + 1
         num_orig = self.orig.nonzero()[0].size
         if num_orig > 0:
             ens_size = self.event_id.size / num_orig
@@ -250,43 +285,6 @@ class TropCyclone(Hazard):
             ens_size = 1
         self.frequency = np.ones(self.event_id.size) / delta_time / ens_size
 
-    @staticmethod
-    @jit
-    def _tc_from_track(track, centroids, coastal_centr, model='H08'):
-        """ Set hazard from input file. If centroids are not provided, they are
-        read from the same file.
-        Parameters:
-            track (xr.Dataset): tropical cyclone track.
-            centroids (Centroids): Centroids instance. Use global
-                centroids if not provided.
-            coastal_centr (np.array): indeces of centroids close to coast.
-            model (str, optional): model to compute gust. Default Holland2008.
-        Raises:
-            ValueError, KeyError
-        Returns:
-            TropCyclone
-        """
-        new_haz = TropCyclone()
-        new_haz.tag = TagHazard(HAZ_TYPE, 'IBTrACS: ' + track.name)
-        new_haz.intensity = gust_from_track(track, centroids, coastal_centr,
-                                            model)
-        new_haz.units = 'm/s'
-        new_haz.centroids = centroids
-        new_haz.event_id = np.array([1])
-        # frequency set when all tracks available
-        new_haz.frequency = np.array([1])
-        new_haz.event_name = [track.sid]
-        new_haz.fraction = new_haz.intensity.copy()
-        new_haz.fraction.data.fill(1)
-        # store date of start
-        new_haz.date = np.array([dt.datetime(
-            track.time.dt.year[0], track.time.dt.month[0],
-            track.time.dt.day[0]).toordinal()])
-        new_haz.orig = np.array([track.orig_event_flag])
-        new_haz.category = np.array([track.category])
-        new_haz.basin = [track.basin]
-        return new_haz
-
     def _apply_criterion(self, criterion, scale):
         """ Apply changes defined in criterion with a given scale
         Parameters:
@@ -315,16 +313,19 @@ class TropCyclone(Hazard):
                 setattr(haz_cc, chg['variable'], new_val)
         return haz_cc
 
-def coastal_centr_idx(centroids, lat_max=61):
+def coastal_centr_idx(centroids, lat_max=61, precomputed=False):
     """ Compute centroids indices which are inside INLAND_MAX_DIST_KM and
     with lat < lat_max.
     Parameters:
         lat_max (float, optional): Maximum latitude to consider. Default: 61.
+        precomputed (bool, optional): if the centroids have no dist_coast,
+            interpolate it from the global distance to coast grid instead of
+            computing it exactly. Default: False
     Returns:
         np.array
     """
     if not centroids.dist_coast.size:
-        centroids.set_dist_coast()
+        centroids.set_dist_coast(precomputed=precomputed)
     return np.logical_and(centroids.dist_coast < INLAND_MAX_DIST_KM*1000,
                           centroids.lat < lat_max).nonzero()[0]
 
@@ -339,6 +340,20 @@ def gust_from_track(track, centroids, coastal_idx=None, model='H08'):
     Returns:
         sparse.csr_matrix
     """
+    return gust_from_tracks([track], centroids, coastal_idx, model)
+
+def gust_from_tracks(tracks, centroids, coastal_idx=None, model='H08'):
+    """ Compute wind gusts at centroids from several tracks. The nonzero
+    gusts of every track are written directly in the buffers of the
+    resulting sparse matrix. Tracks are interpolated to configured time step.
+    Parameters:
+        tracks (list(xr.Dataset) or TrackColumns): tracks infomation
+        centroids (Centroids): centroids where gusts are computed
+        coastal_idx (np.array): indices of centroids which are close to coast
+        model (str, optional): model to compute gust. Default Holland2008
+    Returns:
+        sparse.csr_matrix (tracks x centroids)
+    """
     if coastal_idx is None:
         coastal_idx = coastal_centr_idx(centroids)
     try:
@@ -346,55 +361,240 @@ def gust_from_track(track, centroids, coastal_idx=None, model='H08'):
     except KeyError:
         LOGGER.error('Not implemented model %s.', model)
         raise ValueError
-    # Compute wind gusts
-    intensity = _windfield(track, centroids.coord, coastal_idx, mod_id)
-    return sparse.csr_matrix(intensity)
-
-@jit
-def _windfield(track, centroids, coastal_idx, model):
-    """ Compute windfields (in m/s) in centroids using Holland model 08.
+    track_arrays = _tracks_arrays(tracks)
+    return sparse.csr_matrix(_gust_csr(track_arrays, centroids.spatial_index,
+                                       np.unique(coastal_idx), mod_id),
+                             shape=(len(track_arrays), centroids.size))
+
+def _gust_from_tracks_pool(pool, tracks, centroids, coastal_idx, model):
+    """ Compute wind gusts at centroids from several tracks in a pool of
+    processes. The centroids are written once in a temporary directory and
+    memory-mapped by every process, so that only the track arrays are sent
+    to the processes and only the sparse gusts are sent back.
+    Parameters:
+        pool (pathos.pools): pool of processes
+        tracks (list(xr.Dataset) or TrackColumns): tracks infomation
+        centroids (Centroids): centroids where gusts are computed
+        coastal_idx (np.array): indices of centroids which are close to coast
+        model (str): model to compute gust
+    Returns:
+        sparse.csr_matrix (tracks x centroids)
+    """
+    try:
+        mod_id = MODEL_VANG[model]
+    except KeyError:
+        LOGGER.error('Not implemented model %s.', model)
+        raise ValueError
+    track_arrays = _tracks_arrays(tracks)
+    num_tracks = len(track_arrays)
+    # several chunks per process to balance the load
+    chunksize = max(min(num_tracks//(4*pool.ncpus), 1000), 1)
+    track_chunks = [track_arrays[i_chk:i_chk+chunksize] \
+                    for i_chk in range(0, num_tracks, chunksize)]
+    with tempfile.TemporaryDirectory() as shared_dir:
+        _write_shared_centroids(shared_dir, centroids.spatial_index,
+                                np.unique(coastal_idx))
+        intensity = pool.map(_gust_csr_shared, track_chunks,
+                             itertools.repeat(shared_dir, len(track_chunks)),
+                             itertools.repeat(mod_id, len(track_chunks)))
+    return sparse.vstack([sparse.csr_matrix(csr_buf, shape=(len(track_chk), \
+        centroids.size)) for csr_buf, track_chk in zip(intensity, track_chunks)],
+                         format='csr')
+
+def _write_shared_centroids(shared_dir, sp_index, coastal_idx):
+    """ Write the centroids coordinates, their spatial index and the coastal
+    centroids to be read by other processes with _read_shared_centroids.
+    Parameters:
+        shared_dir (str): existing directory where the files are written
+        sp_index (SpatialIndex): spatial index of the centroids, built
+        coastal_idx (np.array): increasing indices of the coastal centroids
+    """
+    np.save(os.path.join(shared_dir, 'coord.npy'), sp_index.coord)
+    np.save(os.path.join(shared_dir, 'cos_lat.npy'), sp_index.cos_lat)
+    with h5py.File(os.path.join(shared_dir, 'centroids.h5'), 'w') as hf_data:
+        hf_data.create_dataset('coastal_idx', data=coastal_idx)
+        sp_index.write_hdf5(hf_data)
+
+def _read_shared_centroids(shared_dir):
+    """ Read the centroids written with _write_shared_centroids. The
+    coordinates are memory-mapped, so their files stay open as long as the
+    returned spatial index is used.
+    Parameters:
+        shared_dir (str): directory of the files
+    Returns:
+        SpatialIndex, np.array (coastal centroids)
+    """
+    sp_index = SpatialIndex(
+        np.asarray(np.load(os.path.join(shared_dir, 'coord.npy'), mmap_mode='r')),
+        np.asarray(np.load(os.path.join(shared_dir, 'cos_lat.npy'), mmap_mode='r')))
+    with h5py.File(os.path.join(shared_dir, 'centroids.h5'), 'r') as hf_data:
+        coastal_idx = hf_data['coastal_idx'][:]
+        sp_index.read_hdf5(hf_data)
+    return sp_index, coastal_idx
+
+def _gust_csr_shared(track_arrays, shared_dir, model):
+    """ _gust_csr with the centroids written in shared_dir. The centroids
+    are read for every chunk of tracks and released at its end, so that no
+    process keeps the files open once the pool is done. """
+    sp_index, coastal_idx = _read_shared_centroids(shared_dir)
+    return _gust_csr(track_arrays, sp_index, coastal_idx, model)
+
+def _gust_csr(track_arrays, sp_index, coastal_idx, model):
+    """ Compute the wind gusts of several tracks as sparse matrix buffers.
+    Parameters:
+        track_arrays (list(tuple)): _track_arrays() of every track
+        sp_index (SpatialIndex): spatial index of the centroids
+        coastal_idx (np.array): increasing indices of the coastal centroids
+        model (int): Holland model selection according to MODEL_VANG
+    Returns:
+        data (np.array), indices (np.array), indptr (np.array) of the CSR
+        matrix tracks x centroids
+    """
+    num_centr = sp_index.size
+    # maximum wind per centroid of the current track, reset after every track
+    intensity = np.zeros((num_centr, ))
+    indptr = np.zeros(len(track_arrays)+1, int)
+    data = np.zeros(num_centr)
+    indices = np.zeros(num_centr, int)
+    for i_track, track_arr in enumerate(track_arrays):
+        close_centr = _windfield_close(track_arr, sp_index, coastal_idx, model,
+                                       intensity)
+        close_centr = close_centr[intensity[close_centr] > 0]
+        indptr[i_track+1] = indptr[i_track] + close_centr.size
+        if indptr[i_track+1] > data.size:
+            new_size = max(2*data.size, indptr[i_track+1])
+            data = np.append(data, np.zeros(new_size - data.size))
+            indices = np.append(indices, np.zeros(new_size - indices.size, int))
+        data[indptr[i_track]:indptr[i_track+1]] = intensity[close_centr]
+        indices[indptr[i_track]:indptr[i_track+1]] = close_centr
+        intensity[close_centr] = 0
+
+    return data[:indptr[-1]], indices[:indptr[-1]], indptr
+
+def _track_arrays(track):
+    """ Arrays of a track needed to compute its windfield. The central
+    pressure is limited by the environmental pressure and the radius of
+    maximum wind is extrapolated from the central pressure. The track is
+    not modified.
 
     Parameters:
         track (xr.Dataset): track infomation
-        centroids (2d np.array): each row is a centroid [lat, lon]
-        coastal_idx (1d np.array): centroids indices that are close to coast
-        model (int): Holland model selection according to MODEL_VANG
 
     Returns:
-        np.array
+        tuple: latitude, longitude, time step, radius of maximum wind (km),
+        environmental pressure and central pressure arrays, and number of
+        nodes where the windfield is computed
     """
-    np.warnings.filterwarnings('ignore')
+    t_env = track.environmental_pressure.values
     # Make sure that CentralPressure never exceeds EnvironmentalPressure
-    up_pr = np.argwhere(track.central_pressure.values >
-                        track.environmental_pressure.values)
-    track.central_pressure.values[up_pr] = \
-        track.environmental_pressure.values[up_pr]
+    t_cen = np.where(track.central_pressure.values > t_env, t_env,
+                     track.central_pressure.values)
 
     # Extrapolate RadiusMaxWind from pressure if not given
-    ureg = UnitRegistry()
-    track['radius_max_wind'] = ('time', _extra_rad_max_wind( \
-        track.central_pressure.values, track.radius_max_wind.values, ureg))
+    t_rad = _extra_rad_max_wind(t_cen, track.radius_max_wind.values.copy())
+
+    return (track.lat.values, track.lon.values, track.time_step.values, t_rad,
+            t_env, t_cen, track.attrs.get('n_nodes', track.lat.size))
+
+def _tracks_arrays(tracks):
+    """ _track_arrays() of several tracks. With TrackColumns, the pressures
+    and radius of maximum wind of all the nodes are computed at once and the
+    arrays of every track are views of them.
+
+    Parameters:
+        tracks (list(xr.Dataset) or TrackColumns): tracks infomation
+
+    Returns:
+        list(tuple)
+    """
+    if not isinstance(tracks, TrackColumns):
+        return [_track_arrays(track) for track in tracks]
+    t_env = tracks.node['environmental_pressure']
+    t_cen = np.where(tracks.node['central_pressure'] > t_env, t_env,
+                     tracks.node['central_pressure'])
+    t_rad = _extra_rad_max_wind(t_cen, tracks.node['radius_max_wind'].copy())
+    n_nodes = tracks.attrs.get('n_nodes', tracks.num_nodes)
+    track_arrays = list()
+    for i_track in range(tracks.size):
+        node_sl = slice(tracks.offsets[i_track], tracks.offsets[i_track+1])
+        track_arrays.append((tracks.node['lat'][node_sl], tracks.node['lon'][node_sl],
+                             tracks.node['time_step'][node_sl], t_rad[node_sl],
+                             t_env[node_sl], t_cen[node_sl], n_nodes[i_track]))
+    return track_arrays
+
+def _windfield_close(track_arr, sp_index, coastal_idx, model, intensity):
+    """ Compute windfields (in m/s) in the centroids close to the track
+    using Holland model 08 and keep the maximum in intensity.
+
+    Parameters:
+        track_arr (tuple): track arrays as returned by _track_arrays
+        sp_index (SpatialIndex): spatial index of the centroids where the
+            centroids close to every node are searched
+        coastal_idx (1d np.array): increasing centroids indices that are
+            close to coast
+        model (int): Holland model selection according to MODEL_VANG
+        intensity (np.array): winds at every centroid, updated with the
+            maximum winds of the track
+
+    Returns:
+        np.array: increasing indices of the centroids close to the track.
+        Intensity is only modified at these centroids.
+    """
+    t_lat, t_lon, t_tstep, t_rad, t_env, t_cen, n_nodes = track_arr
 
     # Track translational speed at every node
-    v_trans = _vtrans(track.lat.values, track.lon.values,
-                      track.time_step.values, ureg)
+    v_trans = _vtrans(t_lat, t_lon, t_tstep)
+
+    # Coastal centroids close to every node
+    close_ptr, close_idx = _close_centr_node(sp_index, coastal_idx, \
+        t_lat[:n_nodes], t_lon[:n_nodes])
 
     # Compute windfield
-    intensity = np.zeros((centroids.shape[0], ))
-    intensity[coastal_idx] = _wind_per_node(centroids[coastal_idx, :], track,
-                                            v_trans, model)
+    _wind_per_node(sp_index.coord[:, 0], sp_index.coord[:, 1],
+                   sp_index.cos_lat, t_lat, t_lon, t_rad, t_env, t_cen,
+                   t_tstep, v_trans, model, TropCyclone.intensity_thres,
+                   close_ptr, close_idx, intensity)
+
+    return np.unique(close_idx)
+
+def _close_centr_node(sp_index, coastal_idx, t_lat, t_lon):
+    """ Compute the coastal centroids within CENTR_NODE_MAX_DIST_KM of every
+    track node but the first one.
+
+    Parameters:
+        sp_index (SpatialIndex): spatial index of all the centroids
+        coastal_idx (1d np.array): increasing centroids indices that are
+            close to coast
+        t_lat (np.array): track latitudes
+        t_lon (np.array): track longitudes
 
-    return intensity
+    Returns:
+        close_ptr (np.array), close_idx (np.array): centroids indices close
+        to node i are close_idx[close_ptr[i]:close_ptr[i+1]], in increasing
+        order
+    """
+    close_ptr = np.zeros(t_lat.size + 1, int)
+    if t_lat.size < 2 or not coastal_idx.size:
+        return close_ptr, np.array([], int)
+    node_ptr, close_idx = sp_index.within_aprox_many(t_lat[1:], t_lon[1:],
+                                                     CENTR_NODE_MAX_DIST_KM)
+    # keep coastal centroids
+    coastal_pos = np.minimum(np.searchsorted(coastal_idx, close_idx),
+                             coastal_idx.size - 1)
+    is_coastal = coastal_idx[coastal_pos] == close_idx
+    node_pos = np.repeat(np.arange(t_lat.size - 1), np.diff(node_ptr))
+    close_ptr[2:] = np.cumsum(np.bincount(node_pos[is_coastal],
+                                          minlength=t_lat.size - 1))
+    return close_ptr, close_idx[is_coastal]
 
-@jit
-def _vtrans(t_lat, t_lon, t_tstep, ureg):
+@jit(nopython=True)
+def _vtrans(t_lat, t_lon, t_tstep):
     """ Translational spped at every track node.
 
     Parameters:
         t_lat (np.array): track latitudes
         t_lon (np.array): track longitudes
         t_tstep (np.array): track time steps
-        ureg (UnitRegistry): units handler
 
     Returns:
         np.array
@@ -402,21 +602,20 @@ def _vtrans(t_lat, t_lon, t_tstep, ureg):
     v_trans = dist_approx(t_lat[:-1], t_lon[:-1],
                           np.cos(np.radians(t_lat[:-1])), t_lat[1:],
                           t_lon[1:]) / t_tstep[1:]
-    v_trans = (v_trans * ureg.km/ureg.hour).to(ureg.meter/ureg.second).magnitude
+    v_trans = v_trans * KMH_TO_MS
 
     # nautical miles/hour, limit to 30 nmph
-    v_max = (30*ureg.knot).to(ureg.meter/ureg.second).magnitude
+    v_max = 30 * KN_TO_MS
     v_trans[v_trans > v_max] = v_max
     return v_trans
 
-@jit
-def _extra_rad_max_wind(t_cen, t_rad, ureg):
+@jit(nopython=True)
+def _extra_rad_max_wind(t_cen, t_rad):
     """ Extrapolate RadiusMaxWind from pressure and change to km.
 
     Parameters:
         t_cen (np.array): track central pressures
         t_rad (np.array): track radius of maximum wind
-        ureg (UnitRegistry): units handler
 
     Returns:
         np.array
@@ -426,57 +625,56 @@ def _extra_rad_max_wind(t_cen, t_rad, ureg):
     rmax_1, rmax_2, rmax_3 = 15, 25, 50
     # pressure in mb
     pres_1, pres_2, pres_3 = 950, 980, 1020
-    t_rad[t_cen <= pres_1] = rmax_1
-
-    to_change = np.logical_and(t_cen > pres_1, t_cen <= pres_2).nonzero()[0]
-    t_rad[to_change] = (t_cen[to_change] - pres_1) * \
-        (rmax_2 - rmax_1)/(pres_2 - pres_1) + rmax_1
-
-    to_change = np.argwhere(t_cen > pres_2).squeeze()
-    t_rad[to_change] = (t_cen[to_change] - pres_2) * \
-        (rmax_3 - rmax_2)/(pres_3 - pres_2) + rmax_2
-
-    return (t_rad * ureg.nautical_mile).to(ureg.kilometer).magnitude
-
-@jit(parallel=True)
-def _wind_per_node(coastal_centr, track, v_trans, model):
-    """ Compute sustained winds at each centroid.
+    for i_node in range(t_cen.size):
+        if t_cen[i_node] <= pres_1:
+            t_rad[i_node] = rmax_1
+        elif t_cen[i_node] <= pres_2:
+            t_rad[i_node] = (t_cen[i_node] - pres_1) * \
+                (rmax_2 - rmax_1)/(pres_2 - pres_1) + rmax_1
+        elif t_cen[i_node] > pres_2:
+            t_rad[i_node] = (t_cen[i_node] - pres_2) * \
+                (rmax_3 - rmax_2)/(pres_3 - pres_2) + rmax_2
+
+    return t_rad * NM_TO_KM
+
+@jit(nopython=True, parallel=True)
+def _wind_per_node(centr_lat, centr_lon, centr_cos_lat, t_lat, t_lon, t_rad,
+                   t_env, t_cen, t_tstep, v_trans, model, inten_thres,
+                   close_ptr, close_idx, intensity):
+    """ Compute sustained winds at the centroids close to every track node
+    and keep the maximum at every centroid. Nodes are computed in parallel.
 
     Parameters:
-        coastal_centr (2d np.array): centroids
-        track (xr.Dataset): track latitudes
+        centr_lat (np.array): centroids latitudes
+        centr_lon (np.array): centroids longitudes
+        centr_cos_lat (np.array): cos(lat) of the centroids
+        t_lat (np.array): track latitudes
+        t_lon (np.array): track longitudes
+        t_rad (np.array): track radius of maximum wind in km
+        t_env (np.array): track environmental pressures
+        t_cen (np.array): track central pressures
+        t_tstep (np.array): track time steps
         v_trans (np.array): track translational velocity
         model (int): Holland model selection according to MODEL_VANG
-
-    Returns:
-        2d np.array
+        inten_thres (float): winds below are set to 0
+        close_ptr (np.array): centroids close to node i are
+            close_idx[close_ptr[i]:close_ptr[i+1]]
+        close_idx (np.array): centroids indices close to every node
+        intensity (np.array): maximum wind at every centroid, filled
     """
-
-    t_lat, t_lon = track.lat.values, track.lon.values
-    t_rad, t_env = track.radius_max_wind.values, track.environmental_pressure.values
-    t_cen, t_tstep = track.central_pressure.values, track.time_step.values
-
-    centr_cos_lat = np.cos(np.radians(coastal_centr[:, 0]))
-    intensity = np.zeros((coastal_centr.shape[0],))
-
-    n_nodes = t_lat.size
-    if 'n_nodes' in track.attrs:
-        n_nodes = track.attrs['n_nodes']
-
-    for i_node in range(1, n_nodes):
-        # compute distance to all centroids
-        r_arr = dist_approx(coastal_centr[:, 0], coastal_centr[:, 1], \
-            centr_cos_lat, t_lat[i_node], t_lon[i_node])
-
-        # Choose centroids that are close enough
-        close_centr = np.argwhere(r_arr < CENTR_NODE_MAX_DIST_KM).reshape(-1,)
-        r_arr = r_arr[close_centr]
+    v_node = np.zeros(close_idx.size)
+    for i_node in prange(1, close_ptr.size - 1):
+        close_centr = close_idx[close_ptr[i_node]:close_ptr[i_node+1]]
+        r_arr = dist_approx(centr_lat[close_centr], centr_lon[close_centr], \
+            centr_cos_lat[close_centr], t_lat[i_node], t_lon[i_node])
 
         # translational component
         if i_node < t_lat.size-1:
+            close_coord = np.empty((close_centr.size, 2))
+            close_coord[:, 0] = centr_lat[close_centr]
+            close_coord[:, 1] = centr_lon[close_centr]
             v_trans_corr = _vtrans_correct(t_lat[i_node:i_node+2], \
-                t_lon[i_node:i_node+2], t_rad[i_node], \
-                coastal_centr[close_centr, :], r_arr)
+                t_lon[i_node:i_node+2], t_rad[i_node], close_coord, r_arr)
         else:
             v_trans_corr = np.zeros((r_arr.size,))
 
@@ -487,14 +685,15 @@ def _wind_per_node(coastal_centr, track, v_trans, model):
 
         v_full = v_trans[i_node-1] * v_trans_corr + v_ang
         v_full[np.isnan(v_full)] = 0
-        v_full[v_full < TropCyclone.intensity_thres] = 0
+        v_full[v_full < inten_thres] = 0
+        v_node[close_ptr[i_node]:close_ptr[i_node+1]] = v_full
 
-        # keep maximum instantaneous wind
-        intensity[close_centr] = np.maximum(intensity[close_centr], v_full)
+    # keep maximum instantaneous wind
+    for i_close in range(close_idx.size):
+        intensity[close_idx[i_close]] = max(intensity[close_idx[i_close]],
+                                            v_node[i_close])
 
-    return intensity
-
-@jit
+@jit(nopython=True)
 def _vtrans_correct(t_lats, t_lons, t_rad, close_centr, r_arr):
     """ Compute Hollands translational wind corrections. Returns factor.
 
@@ -526,7 +725,8 @@ def _vtrans_correct(t_lats, t_lons, t_rad, close_centr, r_arr):
 
     # scalar product, a*b=|a|*|b|*cos(phi), phi angle between vectors
     cos_phi = (centroids_dlon * node_dx + centroids_dlat * node_dy) / \
-        LA.norm([centroids_dlon, centroids_dlat], axis=0) / LA.norm([node_dx, node_dy])
+        np.sqrt(centroids_dlon**2 + centroids_dlat**2) / \
+        np.sqrt(node_dx**2 + node_dy**2)
 
     # southern hemisphere
     if lat < 0:
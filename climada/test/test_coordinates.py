@@ -0,0 +1,62 @@
+"""
+This file is part of CLIMADA.
+
+Copyright (C) 2017 ETH Zurich, CLIMADA contributors listed in AUTHORS.
+
+CLIMADA is free software: you can redistribute it and/or modify it under the
+terms of the GNU Lesser General Public License as published by the Free
+Software Foundation, version 3.
+
+CLIMADA is distributed in the hope that it will be useful, but WITHOUT ANY
+WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS FOR A
+PARTICULAR PURPOSE.  See the GNU Lesser General Public License for more details.
+
+You should have received a copy of the GNU Lesser General Public License along
+with CLIMADA. If not, see <https://www.gnu.org/licenses/>.
+
+---
+
+Test global grids of coordinates functions at default resolution
+"""
+
+import unittest
+import numpy as np
+
+from climada.util.coordinates import coord_on_land, dist_to_coast_raster, \
+get_country_code
+
+class TestGlobalGrids(unittest.TestCase):
+    """ Test the global grids computed at default resolution and stored in
+    the system directory """
+
+    def test_on_land_precomputed_pass(self):
+        """ Test points on land with the global land mask """
+        lat = np.array([28.203216, 28.555994, 28.860875])
+        lon = np.array([-16.567489, -18.554130, -9.532476])
+        res = coord_on_land(lat, lon, precomputed=True)
+        self.assertEqual(res.size, 3)
+        self.assertTrue(res[0])
+        self.assertFalse(res[1])
+        self.assertTrue(res[2])
+
+    def test_dist_to_coast_raster(self):
+        """ Test interpolated distances are close to the exact ones """
+        lat = np.array([13.208333333333329, -12.497529])
+        lon = np.array([-59.625000000000014, -58.849505])
+        res = dist_to_coast_raster(lat, lon)
+        self.assertEqual(res.size, 2)
+        self.assertAlmostEqual(2594.2071059573445, res[0], delta=2000)
+        self.assertAlmostEqual(1382985.2459744606, res[1], delta=15000)
+
+    def test_country_code_precomputed_pass(self):
+        """ Test country codes from the global grid """
+        lat = np.array([46.8, 51.0, 0.0, 13.2])
+        lon = np.array([8.2, 10.0, -30.0, -59.55])
+        region_id = get_country_code(lat, lon, precomputed=True)
+        self.assertTrue(np.array_equal(region_id, [756, 276, 0, 52]))
+        self.assertTrue(np.array_equal(region_id, get_country_code(lat, lon)))
+
+# Execute Tests
+if __name__ == "__main__":
+    TESTS = unittest.TestLoader().loadTestsFromTestCase(TestGlobalGrids)
+    unittest.TextTestRunner(verbosity=2).run(TESTS)
@@ -24,7 +24,8 @@ import datetime as dt
 import numpy as np
 from netCDF4 import Dataset
 
-from climada.hazard.tc_tracks import TCTracks, _calc_land_geom, _apply_decay_coeffs
+from climada.hazard.tc_tracks import TCTracks, TrackColumns, _calc_land_geom, \
+    _columns_land_params, _columns_apply_decay
 from climada.util.constants import SYSTEM_DIR
 
 DATA_DIR = os.path.join(os.path.dirname(__file__), 'data')
@@ -209,9 +210,11 @@ class TestIBTracs(unittest.TestCase):
         track_gen.attrs['orig_event_flag'] = False
 
         cp_ref = np.array([1012., 1012.])
-        land_geom = _calc_land_geom([track_gen])
-        track_res = _apply_decay_coeffs(track_gen, v_rel, p_rel, land_geom, True)
-        self.assertTrue(np.array_equal(cp_ref, track_res.central_pressure[9:11]))
+        columns = TrackColumns.from_datasets([track_gen])
+        land_geom = _calc_land_geom(columns)
+        _columns_land_params(columns, land_geom)
+        _columns_apply_decay(columns, np.ones(1, bool), v_rel, p_rel, True)
+        self.assertTrue(np.array_equal(cp_ref, columns.node['central_pressure'][9:11]))
 
 # Execute Tests
 if __name__ == "__main__":
@@ -19,14 +19,18 @@ with CLIMADA. If not, see <https://www.gnu.org/licenses/>.
 Define functions to handle with coordinates
 """
 import os
+import glob
 import copy
 import logging
+import hashlib
+import functools
 from multiprocessing import cpu_count
 import math
 import numpy as np
 from cartopy.io import shapereader
 import shapely.vectorized
 import shapely.ops
+import shapely.wkb
 from shapely.geometry import Polygon, MultiPolygon, Point, box
 from fiona.crs import from_epsg
 import geopandas as gpd
@@ -38,9 +42,10 @@ from rasterio.warp import reproject, Resampling, calculate_default_transform
 from rasterio.features import rasterize
 import dask.dataframe as dd
 import pandas as pd
+from scipy.spatial import cKDTree
 
 
-from climada.util.constants import DEF_CRS, SYSTEM_DIR
+from climada.util.constants import DEF_CRS, SYSTEM_DIR, EARTH_RADIUS_KM
 
 pd.options.mode.chained_assignment = None
 
@@ -61,6 +66,29 @@ DEM_NODATA = -9999
 MAX_DEM_TILES_DOWN = 300
 """ Maximum DEM tiles to dowload """
 
+DIST_COAST_DIR = os.path.join(SYSTEM_DIR, 'dist_coast')
+""" Folder where computed distances to coast and global grids are stored """
+
+DIST_COAST_CACHE_MAX_MB = 1000
+""" Maximum size in MB of the distances to coast of points stored by
+dist_to_coast_cached. The least recently used distances are removed when it
+is exceeded. """
+
+DIST_COAST_GRID_RES = 0.1
+""" Default resolution in degrees of the global distance to coast grid """
+
+LAND_MASK_GRID_RES = 0.02
+""" Default resolution in degrees of the global land mask """
+
+NE_GEOM_DIR = os.path.join(SYSTEM_DIR, 'nat_earth_geom')
+""" Folder where the unions of Natural Earth geometries are stored """
+
+NE_CACHE_SIZE = 32
+""" Maximum number of Natural Earth files and geometries kept in memory """
+
+COUNTRY_GRID_RES = 0.05
+""" Default resolution in degrees of the global grid of country codes """
+
 def grid_is_regular(coord):
     """Return True if grid is regular. If True, returns height and width.
 
@@ -91,12 +119,8 @@ def get_coastlines(bounds=None, resolution=110):
     Returns:
         GeoDataFrame
     """
-    resolution = nat_earth_resolution(resolution)
-    shp_file = shapereader.natural_earth(resolution=resolution,
-                                         category='physical',
-                                         name='coastline')
-    coast_df = gpd.read_file(shp_file)
-    coast_df.crs = NE_CRS
+    coast_df = _nat_earth_gdf(nat_earth_resolution(resolution), 'physical',
+                              'coastline')
     if bounds is None:
         return coast_df[['geometry']]
     ex_box = box(bounds[0], bounds[1], bounds[2], bounds[3])
@@ -130,7 +154,7 @@ def convert_wgs_to_utm(lon, lat):
         epsg_code = '327' + utm_band
     return int(epsg_code)
 
-def dist_to_coast(coord_lat, lon=None):
+def dist_to_coast(coord_lat, lon=None, precomputed=False):
     """ Comput distance to coast from input points in meters.
 
     Parameters:
@@ -143,6 +167,8 @@ def dist_to_coast(coord_lat, lon=None):
         lon (np.array or float, optional):
             - np.array with one dimension containing longitudes in epsg:4326
             - float with a longitude value in epsg:4326
+        precomputed (bool, optional): interpolate the distances from a global
+            grid with dist_to_coast_raster. Default: False
 
     Returns:
         np.array
@@ -176,15 +202,224 @@ def dist_to_coast(coord_lat, lon=None):
         geom = gpd.GeoDataFrame(geometry=list(map(Point, [lon], [coord_lat])),
                                 crs=NE_CRS)
 
+    if precomputed:
+        return dist_to_coast_raster(geom.geometry.y.values, geom.geometry.x.values)
+
     to_crs = from_epsg(convert_wgs_to_utm(geom.geometry.iloc[0].x, geom.geometry.iloc[0].y))
     coast = get_coastlines(geom.total_bounds, 10).unary_union
     coast = gpd.GeoDataFrame(geometry=[coast], crs=NE_CRS).to_crs(to_crs)
     return geom.to_crs(to_crs).distance(coast.geometry[0]).values
 
 
+def dist_to_coast_cached(lat, lon, cache_dir=DIST_COAST_DIR):
+    """ Compute distance to coast in meters as dist_to_coast, storing the
+    result on disk. The file name is a hash of the coordinates and of the
+    coastlines resolution, so that the distances of the same points are only
+    computed once.
+
+    Parameters:
+        lat (np.array): latitude of points in epsg:4326
+        lon (np.array): longitude of points in epsg:4326
+        cache_dir (str, optional): folder where distances are stored.
+            Default: DIST_COAST_DIR
+
+    Returns:
+        np.array
+    """
+    lat = np.asarray(lat, dtype=float).reshape(-1)
+    lon = np.asarray(lon, dtype=float).reshape(-1)
+    if lat.size != lon.size:
+        LOGGER.error('Wrong size input coordinates: %s != %s.', lat.size,
+                     lon.size)
+        raise ValueError
+    file_name = os.path.join(cache_dir, 'dist_coast_%s.npy' % \
+                             _coord_hash(lat, lon, 'ne_10m'))
+    if os.path.isfile(file_name):
+        LOGGER.debug('Reading distance to coast from %s', file_name)
+        os.utime(file_name)
+        return np.load(file_name)
+    dist = dist_to_coast(lat, lon)
+    try:
+        _save_file(file_name, lambda file: np.save(file, dist))
+    except OSError as err:
+        LOGGER.warning('Distance to coast not stored: %s', err)
+        return dist
+    cache_files = sorted(_dist_coast_cache_files(cache_dir), key=os.path.getmtime,
+                         reverse=True)
+    cache_size = np.cumsum([os.path.getsize(file) for file in cache_files])
+    for file in np.array(cache_files)[1:][cache_size[1:] > DIST_COAST_CACHE_MAX_MB*2**20]:
+        LOGGER.info('Removing %s', file)
+        os.remove(file)
+    return dist
+
+def clear_dist_coast_cache(cache_dir=DIST_COAST_DIR):
+    """ Remove the distances to coast stored by dist_to_coast_cached. The
+    global grids of dist_to_coast_raster are kept.
+
+    Parameters:
+        cache_dir (str, optional): folder where distances are stored.
+            Default: DIST_COAST_DIR
+    """
+    for file in _dist_coast_cache_files(cache_dir):
+        LOGGER.info('Removing %s', file)
+        os.remove(file)
+
+def _dist_coast_cache_files(cache_dir):
+    """ Files of the distances stored by dist_to_coast_cached in cache_dir """
+    return [file for file in glob.glob(os.path.join(cache_dir, 'dist_coast_*.npy'))
+            if not os.path.basename(file).startswith('dist_coast_grid_')]
+
+def _save_file(file_name, save_func):
+    """ Write a file through a temporary file in the same folder, so that
+    other processes only see the complete file.
+
+    Parameters:
+        file_name (str): final file name. Its folder is created if needed
+        save_func (function): writes the content into the given binary file
+    """
+    os.makedirs(os.path.dirname(file_name), exist_ok=True)
+    tmp_file = '%s.%s.tmp' % (file_name, os.getpid())
+    try:
+        with open(tmp_file, 'wb') as file:
+            save_func(file)
+        os.replace(tmp_file, file_name)
+    finally:
+        if os.path.isfile(tmp_file):
+            os.remove(tmp_file)
+
+def dist_to_coast_raster(lat, lon, res=DIST_COAST_GRID_RES):
+    """ Compute distance to coast in meters by bilinear interpolation of a
+    global grid of distances to the Natural Earth coastlines. The grid is
+    computed the first time a resolution is used and stored in DIST_COAST_DIR.
+    The error with respect to dist_to_coast is of the order of the grid
+    resolution.
+
+    Parameters:
+        lat (np.array): latitude of points in epsg:4326
+        lon (np.array): longitude of points in epsg:4326
+        res (float, optional): resolution of the grid in degrees.
+            Default: DIST_COAST_GRID_RES
+
+    Returns:
+        np.array
+    """
+    lat = np.asarray(lat, dtype=float).reshape(-1)
+    lon = np.asarray(lon, dtype=float).reshape(-1)
+    if lat.size != lon.size:
+        LOGGER.error('Wrong size input coordinates: %s != %s.', lat.size,
+                     lon.size)
+        raise ValueError
+    return _interp_global_grid(_dist_coast_grid(res), lat, lon)
+
+def _coord_hash(lat, lon, *args):
+    """ Hexadecimal hash of coordinates and additional parameters. """
+    coord_hash = hashlib.sha1(np.ascontiguousarray(lat, dtype=float).tobytes())
+    coord_hash.update(np.ascontiguousarray(lon, dtype=float).tobytes())
+    coord_hash.update(repr(args).encode())
+    return coord_hash.hexdigest()
+
+def _global_grid_size(res):
+    """ Number of latitudes and longitudes of a global grid of resolution res
+    in degrees, both poles and the antimeridian included. """
+    if res <= 0 or res > 90:
+        LOGGER.error('Wrong grid resolution: %s.', res)
+        raise ValueError
+    return int(round(180 / res)) + 1, int(round(360 / res)) + 1
+
+def _dist_coast_grid(res):
+    """ Global grid of distances to coast in meters at resolution res in
+    degrees. It is read from DIST_COAST_DIR (memory-mapped) or computed and
+    written there if it does not exist.
+
+    Parameters:
+        res (float): resolution in degrees
+
+    Returns:
+        np.array (lat x lon), latitudes from -90 to 90, longitudes from -180
+        to 180
+    """
+    num_lat, num_lon = _global_grid_size(res)
+    file_name = os.path.join(DIST_COAST_DIR, 'dist_coast_grid_%sx%s.npy' % \
+                             (num_lat, num_lon))
+    if not os.path.isfile(file_name):
+        LOGGER.info('Computing global distance to coast grid of %s x %s '
+                    'points ...', num_lat, num_lon)
+        coast = _coast_points(max_step=res / 4)
+        tree = cKDTree(_sphere_xyz(coast[:, 0], coast[:, 1]))
+        grid_lat = np.linspace(-90, 90, num_lat)
+        grid_lon = np.linspace(-180, 180, num_lon)
+        dist = np.zeros((num_lat, num_lon), dtype=np.float32)
+        chunk = max(1, 2000000 // num_lon)
+        for i_lat in range(0, num_lat, chunk):
+            row_lat, row_lon = np.meshgrid(grid_lat[i_lat:i_lat + chunk],
+                                           grid_lon, indexing='ij')
+            chord, _ = tree.query(_sphere_xyz(row_lat.reshape(-1),
+                                              row_lon.reshape(-1)))
+            dist[i_lat:i_lat + chunk, :] = (2 * EARTH_RADIUS_KM * 1000 * \
+                np.arcsin(np.minimum(chord / 2, 1))).reshape(row_lat.shape)
+        _save_file(file_name, lambda file: np.save(file, dist))
+    return np.load(file_name, mmap_mode='r')
+
+def _coast_points(max_step, resolution=10):
+    """ Vertices of the Natural Earth coastlines, with additional points
+    interpolated on the segments longer than max_step.
+
+    Parameters:
+        max_step (float): maximum distance in degrees between two points
+        resolution (float, optional): Natural Earth resolution. Default: 10
+
+    Returns:
+        np.array (points x 2), latitude and longitude
+    """
+    coast = list()
+    for geom in get_coastlines(resolution=resolution).geometry:
+        for line in getattr(geom, 'geoms', [geom]):
+            lon_lat = np.array(line.coords)[:, :2]
+            seg_len = np.sqrt(np.sum(np.diff(lon_lat, axis=0)**2, axis=1))
+            num_pts = np.maximum(np.ceil(seg_len / max_step).astype(int), 1)
+            seg_idx = np.repeat(np.arange(num_pts.size), num_pts)
+            seg_frac = (np.arange(seg_idx.size) - \
+                np.repeat(np.cumsum(num_pts) - num_pts, num_pts)) / num_pts[seg_idx]
+            coast.append(lon_lat[seg_idx] + seg_frac[:, np.newaxis] * \
+                (lon_lat[seg_idx + 1] - lon_lat[seg_idx]))
+            coast.append(lon_lat[-1:])
+    return np.concatenate(coast)[:, ::-1]
+
+def _sphere_xyz(lat, lon):
+    """ Cartesian coordinates on the unit sphere. """
+    lat, lon = np.radians(lat), np.radians(lon)
+    return np.stack([np.cos(lat) * np.cos(lon), np.cos(lat) * np.sin(lon),
+                     np.sin(lat)], axis=1)
+
+def _interp_global_grid(grid, lat, lon):
+    """ Bilinear interpolation of a global grid at given coordinates.
+
+    Parameters:
+        grid (np.array): values lat x lon, latitudes from -90 to 90 and
+            longitudes from -180 to 180 equally spaced
+        lat (np.array): latitude of points in epsg:4326
+        lon (np.array): longitude of points in epsg:4326
+
+    Returns:
+        np.array
+    """
+    num_lat, num_lon = grid.shape
+    pos_lat = (np.clip(lat, -90, 90) + 90) / 180 * (num_lat - 1)
+    pos_lon = np.mod(lon + 180, 360) / 360 * (num_lon - 1)
+    idx_lat = np.minimum(np.floor(pos_lat).astype(int), num_lat - 2)
+    idx_lon = np.minimum(np.floor(pos_lon).astype(int), num_lon - 2)
+    w_lat = pos_lat - idx_lat
+    w_lon = pos_lon - idx_lon
+    return (1 - w_lat) * (1 - w_lon) * grid[idx_lat, idx_lon] \
+        + (1 - w_lat) * w_lon * grid[idx_lat, idx_lon + 1] \
+        + w_lat * (1 - w_lon) * grid[idx_lat + 1, idx_lon] \
+        + w_lat * w_lon * grid[idx_lat + 1, idx_lon + 1]
+
+
 def get_land_geometry(country_names=None, extent=None, resolution=10):
     """Get union of all the countries or the provided ones or the points inside
-    the extent.
+    the extent. The union is stored in NE_GEOM_DIR and kept in memory, so
+    that it is only computed once for the same input.
 
     Parameters:
         country_names (list, optional): list with ISO3 names of countries, e.g
@@ -196,11 +431,42 @@ def get_land_geometry(country_names=None, extent=None, resolution=10):
     Returns:
         shapely.geometry.multipolygon.MultiPolygon
     """
-    resolution = nat_earth_resolution(resolution)
+    if isinstance(country_names, str):
+        country_names = [country_names]
+    if country_names is not None:
+        country_names = tuple(sorted(country_names))
+    if country_names:
+        extent = None
+    elif extent is not None:
+        extent = tuple(float(val) for val in extent)
+    return _land_geometry(nat_earth_resolution(resolution), country_names,
+                          extent)
+
+@functools.lru_cache(maxsize=NE_CACHE_SIZE)
+def _land_geometry(resolution, country_names, extent):
+    """ Union of the countries as in get_land_geometry, read from NE_GEOM_DIR
+    if it has already been computed.
+
+    Parameters:
+        resolution (str): Natural Earth resolution, e.g. '10m'
+        country_names (tuple): sorted ISO3 names of countries or None
+        extent (tuple): (min_lon, max_lon, min_lat, max_lat) or None
+
+    Returns:
+        shapely.geometry.multipolygon.MultiPolygon
+    """
     shp_file = shapereader.natural_earth(resolution=resolution,
                                          category='cultural',
                                          name='admin_0_countries')
-    reader = shapereader.Reader(shp_file)
+    file_name = os.path.join(NE_GEOM_DIR, 'land_geom_%s.wkb' % hashlib.sha1( \
+        repr((shp_file, os.path.getsize(shp_file), country_names, extent)) \
+        .encode()).hexdigest())
+    if os.path.isfile(file_name):
+        LOGGER.debug('Reading land geometry from %s', file_name)
+        with open(file_name, 'rb') as file:
+            return shapely.wkb.loads(file.read())
+
+    reader = nat_earth_reader(resolution, 'cultural', 'admin_0_countries')
     if (country_names is None) and (extent is None):
         LOGGER.info("Computing earth's land geometry ...")
         geom = [cntry_geom for cntry_geom in reader.geometries()]
@@ -225,17 +491,72 @@ def get_land_geometry(country_names=None, extent=None, resolution=10):
         geom = shapely.ops.cascaded_union(geom)
     if not isinstance(geom, MultiPolygon):
         geom = MultiPolygon([geom])
+    _save_file(file_name, lambda file: file.write(shapely.wkb.dumps(geom)))
     return geom
 
-def coord_on_land(lat, lon, land_geom=None):
+def nat_earth_reader(resolution=10, category='cultural', name='admin_0_countries'):
+    """ Records of a Natural Earth shape file. The file is only parsed the
+    first time and the records are kept in memory.
+
+    Parameters:
+        resolution (float or str, optional): 10, 50 or 110, or Natural Earth
+            resolution string, e.g. '10m'. Default: 10
+        category (str, optional): Natural Earth category. Default: 'cultural'
+        name (str, optional): Natural Earth file name.
+            Default: 'admin_0_countries'
+
+    Returns:
+        object with the records() and geometries() iterators of
+        cartopy.io.shapereader.Reader
+    """
+    if not isinstance(resolution, str):
+        resolution = nat_earth_resolution(resolution)
+    return _nat_earth_reader(resolution, category, name)
+
+class _NatEarthRecords():
+    """ Records of a shape file read at once """
+
+    def __init__(self, reader):
+        self._records = list(reader.records())
+
+    def records(self):
+        """ Iterator over the records """
+        return iter(self._records)
+
+    def geometries(self):
+        """ Iterator over the geometries of the records """
+        return (record.geometry for record in self._records)
+
+@functools.lru_cache(maxsize=NE_CACHE_SIZE)
+def _nat_earth_reader(resolution, category, name):
+    """ Cached records of nat_earth_reader. """
+    shp_file = shapereader.natural_earth(resolution=resolution,
+                                         category=category, name=name)
+    return _NatEarthRecords(shapereader.Reader(shp_file))
+
+@functools.lru_cache(maxsize=NE_CACHE_SIZE)
+def _nat_earth_gdf(resolution, category, name):
+    """ Natural Earth shape file as GeoDataFrame, kept in memory. Copy it
+    before modifying it. """
+    shp_file = shapereader.natural_earth(resolution=resolution,
+                                         category=category, name=name)
+    nat_earth = gpd.read_file(shp_file, encoding='UTF-8')
+    if not nat_earth.crs:
+        nat_earth.crs = NE_CRS
+    return nat_earth
+
+def coord_on_land(lat, lon, land_geom=None, precomputed=False):
     """Check if point is on land (True) or water (False) of provided coordinates.
     All globe considered if no input countries.
 
     Parameters:
         lat (np.array): latitude of points in epsg:4326
         lon (np.array): longitude of points in epsg:4326
-        land_geom (shapely.geometry.multipolygon.MultiPolygon, optional):
-            profiles of land.
+        land_geom (shapely.geometry.multipolygon.MultiPolygon or np.array,
+            optional): profiles of land, or land mask of get_land_mask.
+        precomputed (bool, optional): look the points up in the global land
+            mask of get_land_mask instead of the land geometry, which is
+            accurate to LAND_MASK_GRID_RES. Default: False
 
     Returns:
         np.array(bool)
@@ -244,6 +565,10 @@ def coord_on_land(lat, lon, land_geom=None):
         LOGGER.error('Wrong size input coordinates: %s != %s.', lat.size,
                      lon.size)
         raise ValueError
+    if precomputed and land_geom is None:
+        land_geom = get_land_mask()
+    if isinstance(land_geom, np.ndarray):
+        return _land_mask_lookup(land_geom, lat, lon)
     delta_deg = 1
     if land_geom is None:
         land_geom = get_land_geometry(extent=(np.min(lon)-delta_deg, \
@@ -251,6 +576,79 @@ def coord_on_land(lat, lon, land_geom=None):
             np.max(lat)+delta_deg), resolution=10)
     return shapely.vectorized.contains(land_geom, lon, lat)
 
+def get_land_mask(res=LAND_MASK_GRID_RES):
+    """ Global land mask rasterized from the Natural Earth countries at
+    1:10.000.000. The mask is computed the first time a resolution is used and
+    stored in DIST_COAST_DIR. Every cell is one bit (see np.packbits), so
+    that the mask is read at once from disk.
+
+    Parameters:
+        res (float, optional): resolution of the cells in degrees.
+            Default: LAND_MASK_GRID_RES
+
+    Returns:
+        np.array (lat x lon/8) of np.uint8, rows from north to south and
+        columns from longitude -180 eastwards
+    """
+    num_lat = _global_grid_size(res)[0] - 1
+    num_lon = 2 * num_lat
+    file_name = os.path.join(DIST_COAST_DIR, 'land_mask_grid_%sx%s.npy' % \
+                             (num_lat, num_lon))
+    if not os.path.isfile(file_name):
+        LOGGER.info('Computing global land mask of %s x %s cells ...',
+                    num_lat, num_lon)
+        land_geom = list(nat_earth_reader(10, 'cultural',
+                                          'admin_0_countries').geometries())
+        cell_res = 180 / num_lat
+        land_mask = np.zeros((num_lat, num_lon // 8 + (num_lon % 8 > 0)),
+                             dtype=np.uint8)
+        chunk = max(1, 50000000 // num_lon)
+        for i_lat in range(0, num_lat, chunk):
+            num_rows = min(chunk, num_lat - i_lat)
+            land_rows = rasterize([(geom, 1) for geom in land_geom],
+                                  out_shape=(num_rows, num_lon), fill=0,
+                                  transform=from_origin(-180, 90 - i_lat * cell_res,
+                                                        cell_res, cell_res),
+                                  dtype=np.uint8)
+            land_mask[i_lat:i_lat + num_rows, :] = np.packbits(land_rows, axis=1)
+        _save_file(file_name, lambda file: np.save(file, land_mask))
+    return np.load(file_name)
+
+def _land_mask_lookup(land_mask, lat, lon):
+    """ Values of a land mask of get_land_mask at given coordinates.
+
+    Parameters:
+        land_mask (np.array): bit packed land mask
+        lat (np.array): latitude of points in epsg:4326
+        lon (np.array): longitude of points in epsg:4326
+
+    Returns:
+        np.array(bool)
+    """
+    row, col = _global_cell_index(land_mask.shape[0], lat, lon)
+    return ((land_mask[row, col >> 3] >> (7 - (col & 7)).astype(np.uint8)) & 1) \
+        .astype(bool)
+
+def _global_cell_index(num_lat, lat, lon):
+    """ Row and column of the cells containing the points in a global grid of
+    num_lat x 2*num_lat cells, rows from north to south and columns from
+    longitude -180 eastwards.
+
+    Parameters:
+        num_lat (int): number of cells in latitude
+        lat (np.array): latitude of points in epsg:4326
+        lon (np.array): longitude of points in epsg:4326
+
+    Returns:
+        np.array(int), np.array(int)
+    """
+    num_lon = 2 * num_lat
+    row = np.clip(np.floor((90 - np.asarray(lat)) / 180 * num_lat).astype(int),
+                  0, num_lat - 1)
+    col = np.minimum(np.floor(np.mod(np.asarray(lon) + 180, 360) / 360 * \
+                              num_lon).astype(int), num_lon - 1)
+    return row, col
+
 def nat_earth_resolution(resolution):
     """Check if resolution is available in Natural Earth. Build string.
 
@@ -290,14 +688,8 @@ def get_country_geometries(country_names=None, extent=None, resolution=10):
     Returns:
         GeoDataFrame
     """
-    resolution = nat_earth_resolution(resolution)
-    shp_file = shapereader.natural_earth(resolution=resolution,
-                                         category='cultural',
-                                         name='admin_0_countries')
-    nat_earth = gpd.read_file(shp_file, encoding='UTF-8')
-
-    if not nat_earth.crs:
-        nat_earth.crs = NE_CRS
+    nat_earth = _nat_earth_gdf(nat_earth_resolution(resolution), 'cultural',
+                               'admin_0_countries')
 
     if country_names:
         if isinstance(country_names, str):
@@ -316,29 +708,78 @@ def get_country_geometries(country_names=None, extent=None, resolution=10):
         out = gpd.overlay(nat_earth, bbox, how="intersection")
 
     else:
-        out = nat_earth
+        out = nat_earth.copy()
 
     return out
 
-def get_country_code(lat, lon):
-    """ Provide numeric country iso code for every point.
+def get_country_code(lat, lon, precomputed=False):
+    """ Provide numeric country iso code for every point. Every country is
+    only tested against the points inside its bounds.
 
     Parameters:
         lat (np.array): latitude of points in epsg:4326
         lon (np.array): longitude of points in epsg:4326
+        precomputed (bool, optional): look the points up in a global grid of
+            country codes of resolution COUNTRY_GRID_RES instead of testing
+            them against the country geometries. Default: False
 
     Returns:
         np.array(int)
     """
     LOGGER.debug('Setting region_id %s points.', str(lat.size))
-    countries = get_country_geometries(extent=(lon.min()-0.001, lon.max()+0.001,
-                                               lat.min()-0.001, lat.max()+0.001))
+    if precomputed:
+        country_grid = _country_code_grid(COUNTRY_GRID_RES)
+        return country_grid[_global_cell_index(country_grid.shape[0], lat, lon)] \
+            .astype(int)
+
+    countries = _nat_earth_gdf(nat_earth_resolution(10), 'cultural',
+                               'admin_0_countries')
+    bounds = countries.geometry.bounds.values
+    in_ext = (bounds[:, 0] <= lon.max()+0.001) & (bounds[:, 2] >= lon.min()-0.001) \
+        & (bounds[:, 1] <= lat.max()+0.001) & (bounds[:, 3] >= lat.min()-0.001)
+    lon_sort = np.argsort(lon, kind='stable')
+    lon_sorted = lon[lon_sort]
     region_id = np.zeros(lon.size, dtype=int)
-    for geom in zip(countries.geometry, countries.ISO_N3):
-        select = shapely.vectorized.contains(geom[0], lon, lat)
-        region_id[select] = int(geom[1])
+    for geom, iso_n3, geom_bounds in zip(countries.geometry[in_ext],
+                                         countries.ISO_N3[in_ext], bounds[in_ext]):
+        # points in the bounds of the country, contains prepares the geometry
+        cand = lon_sort[np.searchsorted(lon_sorted, geom_bounds[0], 'left'):
+                        np.searchsorted(lon_sorted, geom_bounds[2], 'right')]
+        cand = cand[(lat[cand] >= geom_bounds[1]) & (lat[cand] <= geom_bounds[3])]
+        if cand.size:
+            select = shapely.vectorized.contains(geom, lon[cand], lat[cand])
+            region_id[cand[select]] = int(iso_n3)
     return region_id
 
+def _country_code_grid(res):
+    """ Global grid of numeric country iso codes rasterized from the Natural
+    Earth countries at 1:10.000.000. It is read from NE_GEOM_DIR
+    (memory-mapped) or computed and written there if it does not exist.
+
+    Parameters:
+        res (float): resolution in degrees
+
+    Returns:
+        np.array (lat x lon) of np.int16, rows from north to south and
+        columns from longitude -180 eastwards
+    """
+    num_lat = _global_grid_size(res)[0] - 1
+    file_name = os.path.join(NE_GEOM_DIR, 'country_code_grid_%sx%s.npy' % \
+                             (num_lat, 2 * num_lat))
+    if not os.path.isfile(file_name):
+        LOGGER.info('Computing global grid of country codes of %s x %s cells ...',
+                    num_lat, 2 * num_lat)
+        countries = _nat_earth_gdf(nat_earth_resolution(10), 'cultural',
+                                   'admin_0_countries')
+        cell_res = 180 / num_lat
+        country_grid = rasterize([(geom, int(iso_n3)) for geom, iso_n3 in \
+                                  zip(countries.geometry, countries.ISO_N3)],
+                                 out_shape=(num_lat, 2 * num_lat), fill=0,
+                                 transform=from_origin(-180, 90, cell_res, cell_res),
+                                 dtype=np.int16)
+        _save_file(file_name, lambda file: np.save(file, country_grid))
+    return np.load(file_name, mmap_mode='r')
+
 def get_resolution(lat, lon, min_resol=1.0e-8):
     """ Compute resolution of points in lat and lon
 
@@ -0,0 +1,172 @@
+"""
+This file is part of CLIMADA.
+
+Copyright (C) 2017 ETH Zurich, CLIMADA contributors listed in AUTHORS.
+
+CLIMADA is free software: you can redistribute it and/or modify it under the
+terms of the GNU Lesser General Public License as published by the Free
+Software Foundation, version 3.
+
+CLIMADA is distributed in the hope that it will be useful, but WITHOUT ANY
+WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS FOR A
+PARTICULAR PURPOSE.  See the GNU Lesser General Public License for more details.
+
+You should have received a copy of the GNU Lesser General Public License along
+with CLIMADA. If not, see <https://www.gnu.org/licenses/>.
+
+---
+
+Define functions to compute local exceedance values for return periods.
+"""
+
+__all__ = ['local_exceedance',
+           'cen_exceedance']
+
+import logging
+import itertools
+import warnings
+import numpy as np
+from scipy import sparse
+from numba import jit, prange
+
+LOGGER = logging.getLogger(__name__)
+
+def local_exceedance(values, frequency, threshold, return_periods, pool=None):
+    """ Compute exceedance values of every column (e.g. centroid or exposure)
+    of a sparse matrix events x columns for given return periods. The values
+    above threshold of each column are sorted and fitted linearly against the
+    logarithm of their cumulative frequency, as in cen_exceedance(). Only the
+    nonzero values of every column are sorted, and the fit is computed in
+    closed form for all the columns in parallel.
+
+    Parameters:
+        values (sparse.csr_matrix or sparse.csc_matrix): events x columns
+        frequency (np.array): frequency of every event
+        threshold (float): only values above threshold are fitted
+        return_periods (np.array): return periods to consider
+        pool (pathos.pools, optional): pool of processes where chunks of
+            columns are computed. Default: sequential
+
+    Returns:
+        np.array (return_periods x columns)
+    """
+    return_periods = np.asarray(return_periods, dtype=float)
+    values = sparse.csc_matrix(values)
+    if pool:
+        num_proc = getattr(pool, 'ncpus', None) or pool.nthreads
+        col_chunks = np.array_split(np.arange(values.shape[1]), num_proc)
+        col_chunks = [col_chk for col_chk in col_chunks if col_chk.size]
+        if len(col_chunks) > 1:
+            return np.hstack(pool.map(local_exceedance, \
+                [values[:, col_chk[0]:col_chk[-1]+1] for col_chk in col_chunks], \
+                itertools.repeat(frequency, len(col_chunks)), \
+                itertools.repeat(threshold, len(col_chunks)), \
+                itertools.repeat(return_periods, len(col_chunks))))
+    exc_val = np.zeros((return_periods.size, values.shape[1]))
+    wrong_fit = np.zeros(values.shape[1], bool)
+    _exceedance_fit(values.indptr, values.indices, values.data.astype(float),
+                    np.asarray(frequency, dtype=float), float(threshold),
+                    return_periods, exc_val, wrong_fit)
+
+    # least squares solutions where the closed form is singular
+    for col_idx in np.argwhere(wrong_fit).reshape(-1):
+        col_val = values[:, col_idx].toarray().reshape(-1)
+        sort_pos = np.argsort(col_val)[::-1]
+        exc_val[:, col_idx] = cen_exceedance(col_val[sort_pos], \
+            np.cumsum(np.asarray(frequency)[sort_pos]), threshold, return_periods)
+    return exc_val
+
+def cen_exceedance(values, freq, threshold, return_periods):
+    """ From ordered values and cummulative frequency at a centroid, get
+    exceedance values at input return periods.
+
+    Parameters:
+        values (np.array): sorted values at centroid, in descending order
+        freq (np.array): cummulative frequency at centroid
+        threshold (float): only values above threshold are fitted
+        return_periods (np.array): return periods
+
+    Returns:
+        np.array
+    """
+    val_th = np.asarray(values > threshold).squeeze()
+    val_cen = values[val_th]
+    freq_cen = freq[val_th]
+    if not val_cen.size:
+        return np.zeros((return_periods.size,))
+    try:
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore")
+            pol_coef = np.polyfit(np.log(freq_cen), val_cen, deg=1)
+    except ValueError:
+        pol_coef = np.polyfit(np.log(freq_cen), val_cen, deg=0)
+    val_fit = np.polyval(pol_coef, np.log(1/return_periods))
+    wrong_val = np.logical_and(return_periods > np.max(1/freq_cen), \
+            np.isnan(val_fit))
+    val_fit[wrong_val] = 0.
+
+    return val_fit
+
+@jit(nopython=True, parallel=True)
+def _exceedance_fit(indptr, indices, data, frequency, threshold,
+                    return_periods, exc_val, wrong_fit):
+    """ Fit the exceedance values of every column of a CSC matrix. Columns
+    where the least squares problem is singular are flagged in wrong_fit
+    and left to np.polyfit.
+
+    Parameters:
+        indptr (np.array): CSC column pointers
+        indices (np.array): CSC row indices
+        data (np.array): CSC values
+        frequency (np.array): frequency of every event
+        threshold (float): only values above threshold are fitted
+        return_periods (np.array): return periods
+        exc_val (np.array): exceedance values return_periods x columns, filled
+        wrong_fit (np.array): columns with singular fit, filled
+    """
+    num_ev = frequency.size
+    log_rp = np.log(1 / return_periods)
+    for col_idx in prange(indptr.size - 1):
+        col_val = data[indptr[col_idx]:indptr[col_idx+1]]
+        col_ev = indices[indptr[col_idx]:indptr[col_idx+1]]
+        if threshold < 0:
+            # implicit zeros are above threshold
+            dense_val = np.zeros(num_ev)
+            dense_val[col_ev] = col_val
+            col_val = dense_val
+            col_ev = np.arange(num_ev).astype(indices.dtype)
+        above = col_val > threshold
+        col_val = col_val[above]
+        col_ev = col_ev[above]
+        num_val = col_val.size
+        if num_val == 0:
+            continue
+
+        # values in descending order and their cummulative frequency
+        sort_pos = np.argsort(col_val, kind='mergesort')[::-1]
+        col_val = col_val[sort_pos]
+        cum_freq = np.cumsum(frequency[col_ev[sort_pos]])
+        log_freq = np.log(cum_freq)
+        if num_val == 1:
+            # minimum norm solution of np.polyfit with one point
+            if log_freq[0] == 0 or not np.isfinite(log_freq[0]):
+                wrong_fit[col_idx] = True
+                continue
+            slope = col_val[0] / (2 * log_freq[0])
+            intercept = col_val[0] / 2
+        else:
+            mean_freq = np.mean(log_freq)
+            mean_val = np.mean(col_val)
+            var_freq = np.sum((log_freq - mean_freq)**2)
+            if var_freq == 0 or not np.isfinite(var_freq):
+                wrong_fit[col_idx] = True
+                continue
+            slope = np.sum((log_freq - mean_freq) * (col_val - mean_val)) / var_freq
+            intercept = mean_val - slope * mean_freq
+
+        max_rp = 1 / cum_freq[0]
+        for rp_idx in range(log_rp.size):
+            val_fit = slope * log_rp[rp_idx] + intercept
+            if return_periods[rp_idx] > max_rp and np.isnan(val_fit):
+                val_fit = 0.
+            exc_val[rp_idx, col_idx] = val_fit
@@ -29,10 +29,10 @@ import warnings
 import zipfile
 import numpy as np
 import pandas as pd
-from cartopy.io import shapereader
 
 from climada.util.files_handler import download_file
 from climada.util.constants import SYSTEM_DIR
+from climada.util.coordinates import nat_earth_reader
 
 # solve version problem in pandas-datareader-0.6.0. see:
 # https://stackoverflow.com/questions/50394873/import-pandas-datareader-gives-
@@ -76,9 +76,7 @@ Credit Suisse's Global Wealth Report 2017 (household wealth)"""
 
 def _nat_earth_shp(resolution='10m', category='cultural',
                    name='admin_0_countries'):
-    shp_file = shapereader.natural_earth(resolution=resolution,
-                                         category=category, name=name)
-    return shapereader.Reader(shp_file)
+    return nat_earth_reader(resolution, category, name)
 
 def net_present_value(years, disc_rates, val_years):
     """Compute net present value.
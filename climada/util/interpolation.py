@@ -20,16 +20,22 @@ Define interpolation functions using different metrics.
 """
 
 __all__ = ['interpol_index',
+           'SpatialIndex',
            'dist_sqr_approx',
            'DIST_DEF',
            'METHOD']
 
 import logging
+import itertools
+import hashlib
+import h5py
 import numpy as np
 from numba import jit
 
+from scipy.spatial import cKDTree
 from sklearn.neighbors import BallTree
 from climada.util.constants import ONE_LAT_KM, EARTH_RADIUS_KM
+from climada.util.config import CONFIG
 
 LOGGER = logging.getLogger(__name__)
 
@@ -43,6 +49,18 @@ THRESHOLD = 100
 """ Distance threshold in km. Nearest neighbors with greater distances are
 not considered. """
 
+NN_COS_BAND = 0.9
+""" Minimum ratio between the cos(lat) of the centroids in one latitude band
+of the approximate nearest neighbor search. """
+
+NN_NUM_BANDS = 64
+""" Maximum number of latitude bands of the approximate nearest neighbor
+search. """
+
+NN_GRID_ROWS = 5
+""" Maximum number of rows around the closest grid cell searched for the
+approximate nearest neighbor on regular grids. """
+
 @jit(nopython=True, parallel=True)
 def dist_approx(lats1, lons1, cos_lats1, lats2, lons2):
     """Compute equirectangular approximation distance in km."""
@@ -64,8 +82,9 @@ def interpol_index(centroids, coordinates, method=METHOD[0], \
     interpolation.
 
     Parameters:
-        centroids (2d array): First column contains latitude, second
-            column contains longitude. Each row is a geographic point
+        centroids (2d array or SpatialIndex): First column contains latitude,
+            second column contains longitude. Each row is a geographic point.
+            A SpatialIndex of the centroids reuses its search structures.
         coordinates (2d array): First column contains latitude, second
             column contains longitude. Each row is a geographic point
         method (str, optional): interpolation method to use. NN default.
@@ -93,11 +112,14 @@ def interpol_index(centroids, coordinates, method=METHOD[0], \
 def index_nn_aprox(centroids, coordinates, threshold=THRESHOLD):
     """ Compute the nearest centroid for each coordinate using the
     euclidian distance d = ((dlon)cos(lat))^2+(dlat)^2. For distant points
-    (e.g. more than 100km apart) use the haversine distance.
+    (e.g. more than 100km apart) use the haversine distance. If the centroids
+    are a regular lat/lon grid, the neighbors are found directly from the grid
+    position. Otherwise, a k-d tree per latitude band of the centroids is
+    used.
 
     Parameters:
-        centroids (2d array): First column contains latitude, second
-            column contains longitude. Each row is a geographic point
+        centroids (2d array or SpatialIndex): First column contains latitude,
+            second column contains longitude. Each row is a geographic point
         coordinates (2d array): First column contains latitude, second
             column contains longitude. Each row is a geographic point
         threshold (float): distance threshold in km over which no neighbor will
@@ -107,42 +129,17 @@ def index_nn_aprox(centroids, coordinates, threshold=THRESHOLD):
         array with so many rows as coordinates containing the centroids
             indexes
     """
-
-    # Compute only for the unique coordinates. Copy the results for the
-    # not unique coordinates
-    _, idx, inv = np.unique(coordinates, axis=0, return_index=True,
-                            return_inverse=True)
-    # Compute cos(lat) for all centroids
-    centr_cos_lat = np.cos(np.radians(centroids[:, 0]))
-    assigned = np.zeros(coordinates.shape[0], int)
-    num_warn = 0
-    for icoord, iidx in enumerate(idx):
-        dist = dist_sqr_approx(centroids[:, 0], centroids[:, 1],
-                               centr_cos_lat, coordinates[iidx, 0],
-                               coordinates[iidx, 1])
-        min_idx = dist.argmin()
-        # Raise a warning if the minimum distance is greater than the
-        # threshold and set an unvalid index -1
-        if np.sqrt(dist.min()) * ONE_LAT_KM > threshold:
-            num_warn += 1
-            min_idx = -1
-
-        # Assign found centroid index to all the same coordinates
-        assigned[inv == icoord] = min_idx
-
-    if num_warn:
-        LOGGER.warning('Distance to closest centroid is greater than %s' \
-            'km for %s coordinates.', threshold, num_warn)
-
-    return assigned
+    if not isinstance(centroids, SpatialIndex):
+        centroids = SpatialIndex(centroids)
+    return centroids.nn_aprox(coordinates, threshold)
 
 def index_nn_haversine(centroids, coordinates, threshold=THRESHOLD):
     """ Compute the neareast centroid for each coordinate using a Ball
     tree with haversine distance.
 
     Parameters:
-        centroids (2d array): First column contains latitude, second
-            column contains longitude. Each row is a geographic point
+        centroids (2d array or SpatialIndex): First column contains latitude,
+            second column contains longitude. Each row is a geographic point
         coordinates (2d array): First column contains latitude, second
             column contains longitude. Each row is a geographic point
         threshold (float): distance threshold in km over which no neighbor will
@@ -152,24 +149,501 @@ def index_nn_haversine(centroids, coordinates, threshold=THRESHOLD):
         array with so many rows as coordinates containing the centroids
             indexes
     """
-    # Construct tree from centroids
-    tree = BallTree(np.radians(centroids), metric='haversine')
-    # Select unique exposures coordinates
-    _, idx, inv = np.unique(coordinates, axis=0, return_index=True,
-                            return_inverse=True)
-
-    # query the k closest points of the n_points using dual tree
-    dist, assigned = tree.query(np.radians(coordinates[idx]), k=1, \
-                                return_distance=True, dualtree=True, \
-                                breadth_first=False)
-
-    # Raise a warning if the minimum distance is greater than the
-    # threshold and set an unvalid index -1
-    num_warn = np.sum(dist*EARTH_RADIUS_KM > threshold)
-    if num_warn:
-        LOGGER.warning('Distance to closest centroid is greater than %s' \
-            'km for %s coordinates.', threshold, num_warn)
-        assigned[dist*EARTH_RADIUS_KM > threshold] = -1
-
-    # Copy result to all exposures and return value
-    return np.squeeze(assigned[inv])
+    if not isinstance(centroids, SpatialIndex):
+        centroids = SpatialIndex(centroids)
+    return centroids.nn_haversine(coordinates, threshold)
+
+class SpatialIndex():
+    """ Search structures of geographic points (e.g. centroids) for their
+    nearest neighbors and for the points within a distance. Every structure
+    is built the first time it is needed and kept for the next searches.
+
+    Attributes:
+        coord (2d array): First column contains latitude, second column
+            contains longitude. Each row is a geographic point
+    """
+
+    def __init__(self, coord, cos_lat=None):
+        """ Initialize without search structures.
+
+        Parameters:
+            coord (2d array): latitude and longitude of the points
+            cos_lat (np.array, optional): cos(lat) of the points, if already
+                computed. Default: computed when first needed
+        """
+        self.coord = coord
+        self._cos_lat = cos_lat
+        self._grid = None
+        self._bands = None
+        self._ball_tree = None
+        self._planar_tree = None
+
+    @property
+    def size(self):
+        """ Number of points """
+        return self.coord.shape[0]
+
+    @property
+    def cos_lat(self):
+        """ cos(lat) of the points """
+        if self._cos_lat is None:
+            self._cos_lat = np.cos(np.radians(self.coord[:, 0]))
+        return self._cos_lat
+
+    def nn_aprox(self, coordinates, threshold=THRESHOLD):
+        """ Compute the nearest point for each coordinate using the
+        approximate distance. See index_nn_aprox().
+
+        Parameters:
+            coordinates (2d array): latitude and longitude of every coordinate
+            threshold (float): distance threshold in km over which no neighbor
+                will be found. Those are assigned with a -1 index
+
+        Returns:
+            np.array
+        """
+        # Compute only for the unique coordinates. Copy the results for the
+        # not unique coordinates
+        _, idx, inv = np.unique(coordinates, axis=0, return_index=True,
+                                return_inverse=True)
+        coord_uni = coordinates[idx]
+
+        min_idx = np.zeros(coord_uni.shape[0], int)
+        in_grid = np.zeros(coord_uni.shape[0], bool)
+        if self._get_grid():
+            in_grid = _nn_aprox_grid(self.coord, self.cos_lat, coord_uni,
+                                     min_idx, self._grid)
+        if not np.all(in_grid):
+            min_idx[~in_grid] = _nn_aprox_tree(self.coord, self.cos_lat, \
+                coord_uni[~in_grid], threshold, self._get_bands())
+
+        # Raise a warning if the minimum distance is greater than the
+        # threshold and set an unvalid index -1
+        dist = dist_sqr_approx(self.coord[min_idx, 0], self.coord[min_idx, 1],
+                               self.cos_lat[min_idx], coord_uni[:, 0],
+                               coord_uni[:, 1])
+        far_idx = np.logical_or(min_idx < 0, np.sqrt(dist) * ONE_LAT_KM > threshold)
+        num_warn = np.sum(far_idx)
+        if num_warn:
+            LOGGER.warning('Distance to closest centroid is greater than %s' \
+                'km for %s coordinates.', threshold, num_warn)
+            min_idx[far_idx] = -1
+
+        # Assign found centroid index to all the same coordinates
+        return min_idx[inv.reshape(-1)]
+
+    def nn_haversine(self, coordinates, threshold=THRESHOLD):
+        """ Compute the nearest point for each coordinate using the haversine
+        distance. See index_nn_haversine().
+
+        Parameters:
+            coordinates (2d array): latitude and longitude of every coordinate
+            threshold (float): distance threshold in km over which no neighbor
+                will be found. Those are assigned with a -1 index
+
+        Returns:
+            np.array
+        """
+        # Select unique exposures coordinates
+        _, idx, inv = np.unique(coordinates, axis=0, return_index=True,
+                                return_inverse=True)
+
+        # query the k closest points of the n_points using dual tree
+        dist, assigned = self._get_ball_tree().query(np.radians(coordinates[idx]), \
+            k=1, return_distance=True, dualtree=True, breadth_first=False)
+
+        # Raise a warning if the minimum distance is greater than the
+        # threshold and set an unvalid index -1
+        num_warn = np.sum(dist*EARTH_RADIUS_KM > threshold)
+        if num_warn:
+            LOGGER.warning('Distance to closest centroid is greater than %s' \
+                'km for %s coordinates.', threshold, num_warn)
+            assigned[dist*EARTH_RADIUS_KM > threshold] = -1
+
+        # Copy result to all exposures and return value
+        return np.squeeze(assigned[inv])
+
+    def nn_planar(self, lat, lon):
+        """ Compute the nearest point of one coordinate using the euclidean
+        distance of latitude and longitude. The point with lowest index is
+        returned if several are at the same distance.
+
+        Parameters:
+            lat (float): latitude
+            lon (float): longitude
+
+        Returns:
+            int
+        """
+        if self._planar_tree is None:
+            self._planar_tree = cKDTree(self.coord[:, ::-1])
+        dist, _ = self._planar_tree.query([lon, lat])
+        cand = np.array(self._planar_tree.query_ball_point([lon, lat], \
+            dist * (1 + 1e-6) + 1e-12), int)
+        cand_dist = np.hypot(self.coord[cand, 1] - lon, self.coord[cand, 0] - lat)
+        return cand[np.lexsort((cand, cand_dist))[0]]
+
+    def within_aprox(self, lat, lon, radius):
+        """ Compute the points whose approximate distance to one coordinate
+        is smaller than a radius.
+
+        Parameters:
+            lat (float): latitude
+            lon (float): longitude
+            radius (float): distance in km
+
+        Returns:
+            np.array: indexes of the points in increasing order
+        """
+        return self.within_aprox_many(np.array([lat]), np.array([lon]), radius)[1]
+
+    def within_aprox_many(self, lats, lons, radius):
+        """ Compute for several coordinates the points whose approximate
+        distance to the coordinate is smaller than a radius.
+
+        Parameters:
+            lats (np.array): latitudes
+            lons (np.array): longitudes
+            radius (float): distance in km
+
+        Returns:
+            np.array, np.array: pointers and indexes. The points close to
+            coordinate i are indexes[pointers[i]:pointers[i+1]], in
+            increasing order
+        """
+        lats, lons = np.asarray(lats, float), np.asarray(lons, float)
+        bands = self._get_bands()
+        rad_deg = radius / ONE_LAT_KM * (1 + 1e-6)
+        coord_pos, cand = [np.array([], int)], [np.array([], int)]
+        for i_band, tree in enumerate(bands['tree']):
+            band_coord = np.argwhere(_band_dist(bands['lo'][i_band], \
+                bands['hi'][i_band], np.abs(lats)) <= rad_deg).reshape(-1)
+            if not band_coord.size:
+                continue
+            band_cand = tree.query_ball_point(np.column_stack(( \
+                lons[band_coord] * bands['cos'][i_band], lats[band_coord])), \
+                rad_deg)
+            num_cand = np.array([len(coord_cand) for coord_cand in band_cand], int)
+            coord_pos.append(np.repeat(band_coord, num_cand))
+            cand.append(bands['cen'][i_band][np.fromiter( \
+                itertools.chain.from_iterable(band_cand), int, num_cand.sum())])
+        coord_pos, cand = np.concatenate(coord_pos), np.concatenate(cand)
+        close = dist_approx(self.coord[cand, 0], self.coord[cand, 1], \
+            self.cos_lat[cand], lats[coord_pos], lons[coord_pos]) < radius
+        coord_pos, cand = coord_pos[close], cand[close]
+        sort_pos = np.lexsort((cand, coord_pos))
+        pointers = np.zeros(lats.size + 1, int)
+        pointers[1:] = np.cumsum(np.bincount(coord_pos, minlength=lats.size))
+        return pointers, cand[sort_pos]
+
+    def build(self, distance=DIST_DEF[0]):
+        """ Build the search structures of a distance now instead of in the
+        first search, e.g. before sending the index to other processes.
+
+        Parameters:
+            distance (str, optional): one of DIST_DEF. Default: approx
+        """
+        if distance == DIST_DEF[0]:
+            self._get_grid()
+            self._get_bands()
+        elif distance == DIST_DEF[1]:
+            self._get_ball_tree()
+
+    def write_hdf5(self, file_data, var_name='spatial_index'):
+        """ Write the built grid and latitude bands into an hdf5 group. Only
+        numeric arrays are written, the trees are built again when read.
+
+        Parameters:
+            file_data (h5): h5 file or group where the group is generated
+            var_name (str, optional): name of the group
+        """
+        hf_idx = file_data.create_group(var_name)
+        hf_idx.attrs['size'] = self.size
+        hf_idx.attrs['coord_sha1'] = self._coord_checksum()
+        if self._grid is not None:
+            hf_grid = hf_idx.create_group('grid')
+            for key, val in self._grid.items():
+                if key == 'idx':
+                    hf_grid.create_dataset(key, data=val)
+                else:
+                    hf_grid.attrs[key] = val
+        if self._bands is not None:
+            hf_bands = hf_idx.create_group('bands')
+            hf_bands.create_dataset('cen', data=np.concatenate( \
+                [np.array([], int)] + self._bands['cen']))
+            hf_bands.create_dataset('ptr', data=np.cumsum( \
+                [0] + [band_cen.size for band_cen in self._bands['cen']]))
+            for key in ('cos', 'lo', 'hi'):
+                hf_bands.create_dataset(key, data=np.array(self._bands[key], float))
+
+    def read_hdf5(self, file_data, var_name='spatial_index'):
+        """ Read the grid and latitude bands written with write_hdf5() and
+        build their trees. They are ignored if written for other points.
+
+        Parameters:
+            file_data (h5): h5 file or group containing the group
+            var_name (str, optional): name of the group
+        """
+        hf_idx = file_data.get(var_name)
+        if hf_idx is None:
+            return
+        if not isinstance(hf_idx, h5py.Group) or hf_idx.attrs['size'] != self.size \
+        or hf_idx.attrs['coord_sha1'] != self._coord_checksum():
+            LOGGER.warning('Spatial index ignored: written in another format or '
+                           'for other points.')
+            return
+        if 'grid' in hf_idx:
+            self._grid = {key: val for key, val in hf_idx['grid'].attrs.items()}
+            if 'idx' in hf_idx['grid']:
+                self._grid['idx'] = hf_idx['grid']['idx'][:]
+        if 'bands' in hf_idx:
+            cen, ptr = hf_idx['bands']['cen'][:], hf_idx['bands']['ptr'][:]
+            bands = {key: hf_idx['bands'][key][:] for key in ('lo', 'hi')}
+            bands['cos'] = hf_idx['bands']['cos'][:].tolist()
+            bands['cen'] = [cen[ptr[i_band]:ptr[i_band + 1]] \
+                            for i_band in range(ptr.size - 1)]
+            bands['tree'] = [_band_tree(self.coord, band_cen, band_cos) \
+                             for band_cen, band_cos in zip(bands['cen'], bands['cos'])]
+            self._bands = bands
+
+    def _coord_checksum(self):
+        """ SHA-1 of the coordinates, to check the points of a written index. """
+        return hashlib.sha1(np.ascontiguousarray(self.coord, float).tobytes()).hexdigest()
+
+    def _get_grid(self):
+        """ Regular grid structure of the points, None if they are not a
+        regular grid. """
+        if self._grid is None:
+            self._grid = _grid_index(self.coord)
+        return self._grid
+
+    def _get_bands(self):
+        """ k-d trees of the points in every latitude band. """
+        if self._bands is None:
+            self._bands = _band_index(self.coord, self.cos_lat)
+        return self._bands
+
+    def _get_ball_tree(self):
+        """ Ball tree of the points with haversine metric. """
+        if self._ball_tree is None:
+            self._ball_tree = BallTree(np.radians(self.coord), metric='haversine')
+        return self._ball_tree
+
+def _grid_index(centroids):
+    """ Build the position of the centroids in a regular lat/lon grid. The
+    candidates of a coordinate are the centroids of its closest grid cell and
+    of as many rows around it as can be closer than that cell.
+
+    Parameters:
+        centroids (2d array): latitude and longitude of the centroids
+
+    Returns:
+        dict with the grid origin 'lat_0', 'lon_0', resolution 'res_lat',
+        'res_lon', 'num_rows' rows to search around the closest cell and
+        centroid index 'idx' of every grid cell. Empty dict if the centroids
+        are not a full regular grid.
+    """
+    lat_uni, lat_pos = np.unique(centroids[:, 0], return_inverse=True)
+    lon_uni, lon_pos = np.unique(centroids[:, 1], return_inverse=True)
+    if lat_uni.size < 2 or lon_uni.size < 2 or \
+    lat_uni.size * lon_uni.size != centroids.shape[0]:
+        return dict()
+    res_lat = (lat_uni[-1] - lat_uni[0]) / (lat_uni.size - 1)
+    res_lon = (lon_uni[-1] - lon_uni[0]) / (lon_uni.size - 1)
+    if not np.allclose(np.diff(lat_uni), res_lat, rtol=1e-5, atol=0) or \
+    not np.allclose(np.diff(lon_uni), res_lon, rtol=1e-5, atol=0):
+        return dict()
+    # rows further than (m - 1/2)*res_lat with
+    # (m - 1/2)^2 > 1/4 + (res_lon/res_lat)^2/4 can not be the nearest
+    num_rows = int(np.floor(0.5 + np.sqrt(0.25 + 0.25 * \
+        (res_lon / res_lat)**2))) + 1
+    if num_rows > NN_GRID_ROWS:
+        return dict()
+    grid_idx = np.full((lat_uni.size, lon_uni.size), -1, int)
+    grid_idx[lat_pos.reshape(-1), lon_pos.reshape(-1)] = \
+        np.arange(centroids.shape[0])
+    if np.any(grid_idx < 0):
+        return dict()
+    return {'lat_0': lat_uni[0], 'lon_0': lon_uni[0], 'res_lat': res_lat,
+            'res_lon': res_lon, 'num_rows': num_rows, 'idx': grid_idx}
+
+def _band_index(centroids, centr_cos_lat):
+    """ Build a k-d tree for every latitude band of the centroids. The tree of
+    a band scales the longitudes with the smallest cos(lat) of its centroids,
+    so that tree distances are lower bounds of the approximate distances.
+
+    Parameters:
+        centroids (2d array): latitude and longitude of the centroids
+        centr_cos_lat (np.array): cos(lat) of the centroids
+
+    Returns:
+        dict with lists of centroid indexes 'cen', cos(lat) 'cos' and 'tree'
+        of every band, and arrays with the minimum 'lo' and maximum 'hi'
+        absolute latitude of every band, in increasing order
+    """
+    band = np.log(np.clip(centr_cos_lat, NN_COS_BAND**NN_NUM_BANDS, 1))
+    band = np.floor(band / np.log(NN_COS_BAND)).astype(int)
+    _, band_pos = np.unique(band, return_inverse=True)
+    band_pos = band_pos.reshape(-1)
+    cen_abs_lat = np.abs(centroids[:, 0])
+    bands = {'cen': [], 'cos': [], 'tree': [], 'lo': [], 'hi': []}
+    for i_band in range(band_pos.max() + 1 if band_pos.size else 0):
+        band_cen = np.argwhere(band_pos == i_band).reshape(-1)
+        band_cos = max(centr_cos_lat[band_cen].min(), 0)
+        bands['cen'].append(band_cen)
+        bands['cos'].append(band_cos)
+        bands['tree'].append(_band_tree(centroids, band_cen, band_cos))
+        bands['lo'].append(cen_abs_lat[band_cen].min())
+        bands['hi'].append(cen_abs_lat[band_cen].max())
+    bands['lo'], bands['hi'] = np.array(bands['lo']), np.array(bands['hi'])
+    return bands
+
+def _band_tree(centroids, band_cen, band_cos):
+    """ k-d tree of the centroids of a latitude band, see _band_index().
+
+    Parameters:
+        centroids (2d array): latitude and longitude of the centroids
+        band_cen (np.array): centroid indexes of the band
+        band_cos (float): cos(lat) scaling the longitudes of the band
+
+    Returns:
+        cKDTree
+    """
+    return cKDTree(np.column_stack((centroids[band_cen, 1] * band_cos,
+                                    centroids[band_cen, 0])))
+
+def _nn_aprox_grid(centroids, centr_cos_lat, coordinates, min_idx, grid):
+    """ Compute the nearest centroid of the coordinates which are inside a
+    regular lat/lon grid of centroids.
+
+    Parameters:
+        centroids (2d array): latitude and longitude of the centroids
+        centr_cos_lat (np.array): cos(lat) of the centroids
+        coordinates (2d array): latitude and longitude of the coordinates
+        min_idx (np.array): nearest centroid of every coordinate, filled for
+            the coordinates inside the grid
+        grid (dict): grid of the centroids, see _grid_index()
+
+    Returns:
+        np.array(bool): coordinates whose nearest centroid has been computed
+    """
+    n_lat, n_lon = grid['idx'].shape
+    in_grid = (coordinates[:, 0] >= grid['lat_0'] - grid['res_lat'] / 2) & \
+        (coordinates[:, 0] <= grid['lat_0'] + (n_lat - 0.5) * grid['res_lat']) & \
+        (coordinates[:, 1] >= grid['lon_0'] - grid['res_lon'] / 2) & \
+        (coordinates[:, 1] <= grid['lon_0'] + (n_lon - 0.5) * grid['res_lon'])
+    coord_grid = np.argwhere(in_grid).reshape(-1)
+    off_row = np.arange(-grid['num_rows'], grid['num_rows'] + 1).reshape(1, -1, 1)
+    off_col = np.arange(-1, 2).reshape(1, 1, -1)
+    num_cand = off_row.size * off_col.size
+    chunk_size = max(int(CONFIG['global']['max_matrix_size'] // num_cand), 1)
+    for chk_ini in range(0, coord_grid.size, chunk_size):
+        coord_chk = coordinates[coord_grid[chk_ini:chk_ini + chunk_size]]
+        row = np.rint((coord_chk[:, 0] - grid['lat_0']) / grid['res_lat']).astype(int)
+        col = np.rint((coord_chk[:, 1] - grid['lon_0']) / grid['res_lon']).astype(int)
+        cand_row = np.clip(row.reshape(-1, 1, 1) + off_row, 0, n_lat - 1)
+        cand_col = np.clip(col.reshape(-1, 1, 1) + off_col, 0, n_lon - 1)
+        min_idx[coord_grid[chk_ini:chk_ini + chunk_size]] = _nn_aprox_select( \
+            centroids, centr_cos_lat, coord_chk, \
+            np.repeat(np.arange(coord_chk.shape[0]), num_cand), \
+            grid['idx'][cand_row, cand_col].reshape(-1))
+    return in_grid
+
+def _nn_aprox_tree(centroids, centr_cos_lat, coordinates, threshold, bands):
+    """ Compute the nearest centroid of every coordinate with the k-d trees
+    of the latitude bands of the centroids. The candidates of a coordinate are
+    all the centroids whose tree distance is lower than the distance to a
+    first neighbor found in its closest band, or than the threshold.
+
+    Parameters:
+        centroids (2d array): latitude and longitude of the centroids
+        centr_cos_lat (np.array): cos(lat) of the centroids
+        coordinates (2d array): latitude and longitude of the coordinates
+        threshold (float): distance threshold in km
+        bands (dict): latitude bands of the centroids, see _band_index()
+
+    Returns:
+        np.array: nearest centroid of every coordinate, -1 if there is none
+            within the threshold
+    """
+    num_bands = len(bands['tree'])
+    # latitude difference is a lower bound of the distance to every band
+    abs_lat = np.abs(coordinates[:, 0])
+    home = np.clip(np.searchsorted(bands['lo'], abs_lat, 'right') - 1, 0,
+                   num_bands - 1)
+    home_next = np.minimum(home + 1, num_bands - 1)
+    home = np.where(_band_dist(bands['lo'][home_next], bands['hi'][home_next], \
+        abs_lat) < _band_dist(bands['lo'][home], bands['hi'][home], abs_lat), \
+        home_next, home)
+
+    # first neighbor in closest band
+    max_dist = np.zeros(coordinates.shape[0])
+    for i_band in range(num_bands):
+        coord_band = np.argwhere(home == i_band).reshape(-1)
+        if not coord_band.size:
+            continue
+        _, pos = bands['tree'][i_band].query(np.column_stack(( \
+            coordinates[coord_band, 1] * bands['cos'][i_band], \
+            coordinates[coord_band, 0])))
+        cen_pos = bands['cen'][i_band][pos]
+        max_dist[coord_band] = dist_sqr_approx(centroids[cen_pos, 0], \
+            centroids[cen_pos, 1], centr_cos_lat[cen_pos], \
+            coordinates[coord_band, 0], coordinates[coord_band, 1])
+    max_dist = np.sqrt(np.minimum(max_dist, (threshold / ONE_LAT_KM)**2))
+    max_dist = max_dist * (1 + 1e-6) + 1e-9
+
+    # all centroids within the distance to the first neighbor
+    coord_pos, cen_pos = [np.array([], int)], [np.array([], int)]
+    for i_band in range(num_bands):
+        coord_band = np.argwhere(_band_dist(bands['lo'][i_band], \
+            bands['hi'][i_band], abs_lat) <= max_dist).reshape(-1)
+        if not coord_band.size:
+            continue
+        neigh = bands['tree'][i_band].query_ball_point(np.column_stack(( \
+            coordinates[coord_band, 1] * bands['cos'][i_band], \
+            coordinates[coord_band, 0])), max_dist[coord_band])
+        num_neigh = np.fromiter(map(len, neigh), int, coord_band.size)
+        coord_pos.append(np.repeat(coord_band, num_neigh))
+        cen_pos.append(bands['cen'][i_band][np.concatenate( \
+            [np.array([], int)] + list(neigh)).astype(int)])
+    return _nn_aprox_select(centroids, centr_cos_lat, coordinates,
+                            np.concatenate(coord_pos), np.concatenate(cen_pos))
+
+def _band_dist(band_lo, band_hi, abs_lat):
+    """ Absolute latitude difference between coordinates and bands. """
+    return np.maximum(np.maximum(band_lo - abs_lat, abs_lat - band_hi), 0)
+
+def _nn_aprox_select(centroids, centr_cos_lat, coordinates, coord_pos, cen_pos):
+    """ Select for every coordinate the closest of its candidate centroids,
+    the one with lowest index if several are at the same distance.
+
+    Parameters:
+        centroids (2d array): latitude and longitude of the centroids
+        centr_cos_lat (np.array): cos(lat) of the centroids
+        coordinates (2d array): latitude and longitude of the coordinates
+        coord_pos (np.array): coordinate index of every candidate
+        cen_pos (np.array): centroid index of every candidate
+
+    Returns:
+        np.array: nearest centroid of every coordinate, -1 if it has no
+            candidates
+    """
+    min_idx = np.full(coordinates.shape[0], -1, int)
+    if not cen_pos.size:
+        return min_idx
+    dist = dist_sqr_approx(centroids[cen_pos, 0], centroids[cen_pos, 1],
+                           centr_cos_lat[cen_pos], coordinates[coord_pos, 0],
+                           coordinates[coord_pos, 1])
+    _select_min(coord_pos, cen_pos, dist, min_idx, np.full(min_idx.size, np.inf))
+    return min_idx
+
+@jit(nopython=True)
+def _select_min(coord_pos, cen_pos, dist, min_idx, min_dist):
+    """ Keep for every coordinate the candidate with smallest distance and
+    lowest centroid index. """
+    for i_cand in range(coord_pos.size):
+        i_coord = coord_pos[i_cand]
+        if dist[i_cand] < min_dist[i_coord] or (dist[i_cand] == min_dist[i_coord] \
+        and cen_pos[i_cand] < min_idx[i_coord]) or min_idx[i_coord] < 0:
+            min_dist[i_coord] = dist[i_cand]
+            min_idx[i_coord] = cen_pos[i_cand]
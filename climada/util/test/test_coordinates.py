@@ -22,6 +22,8 @@ Test coordinates module.
 from cartopy.io import shapereader
 from fiona.crs import from_epsg
 import geopandas as gpd
+import os
+import tempfile
 import unittest
 import numpy as np
 import shapely
@@ -32,15 +34,28 @@ from rasterio.warp import Resampling
 from rasterio import Affine
 
 from climada.util.constants import HAZ_DEMO_FL, DEF_CRS
+import climada.util.coordinates as u_coord
 from climada.util.coordinates import grid_is_regular, get_coastlines, \
 get_land_geometry, nat_earth_resolution, coord_on_land, dist_to_coast, \
 get_country_geometries, get_resolution, pts_to_raster_meta, read_vector, \
 read_raster, NE_EPSG, equal_crs, set_df_geometry_points, points_to_raster, \
-get_country_code, convert_wgs_to_utm, DEM_NODATA
+get_country_code, convert_wgs_to_utm, DEM_NODATA, dist_to_coast_cached, \
+dist_to_coast_raster, clear_dist_coast_cache, _interp_global_grid, \
+_land_mask_lookup, _save_file, get_land_mask
 
 class TestFunc(unittest.TestCase):
     '''Test the auxiliary used with plot functions'''
 
+    def _tmp_grid_dir(self):
+        """ Store the global grids computed by the test in a temporary
+        directory instead of the system directory. """
+        tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp_dir.cleanup)
+        for var_name in ('DIST_COAST_DIR', 'NE_GEOM_DIR'):
+            self.addCleanup(setattr, u_coord, var_name, getattr(u_coord, var_name))
+            setattr(u_coord, var_name, tmp_dir.name)
+        return tmp_dir.name
+
     def test_is_regular_pass(self):
         """ Test is_regular function. """
         coord = np.array([[1, 2], [4.4, 5.4], [4, 5]])
@@ -164,6 +179,13 @@ class TestFunc(unittest.TestCase):
         self.assertAlmostEqual(res.bounds[2], np.max(lon))
         self.assertAlmostEqual(res.bounds[3], np.max(lat))
 
+    def test_get_land_geometry_cached_pass(self):
+        """get_land_geometry computes the union once for the same input."""
+        res = get_land_geometry(['FRA', 'ESP'], resolution=110)
+        res_cached = get_land_geometry(['ESP', 'FRA'], resolution=110)
+        self.assertIs(res, res_cached)
+        self.assertIsInstance(res, shapely.geometry.multipolygon.MultiPolygon)
+
     def test_get_land_geometry_all_pass(self):
         """get_land_geometry with all earth."""
         res = get_land_geometry(resolution=110)
@@ -180,6 +202,30 @@ class TestFunc(unittest.TestCase):
         self.assertFalse(res[1])
         self.assertTrue(res[2])
 
+    def test_on_land_precomputed_pass(self):
+        """ Test points on land with a coarse global land mask """
+        tmp_dir = self._tmp_grid_dir()
+        lat = np.array([46.8, 0.4, -25.3])
+        lon = np.array([8.2, -30.3, 134.6])
+        land_mask = get_land_mask(res=1)
+        self.assertEqual(land_mask.shape, (180, 45))
+        self.assertEqual(os.listdir(tmp_dir), ['land_mask_grid_180x360.npy'])
+        res = coord_on_land(lat, lon, land_geom=land_mask, precomputed=True)
+        self.assertTrue(np.array_equal(res, [True, False, True]))
+
+    def test_land_mask_lookup_pass(self):
+        """ Test bit packed land mask values at coordinates """
+        land = np.zeros((4, 8), bool)
+        land[0, 0] = True
+        land[1, 6] = True
+        land[3, 7] = True
+        land_mask = np.packbits(land, axis=1)
+        lat = np.array([89, 60, 46, 44, -89, -90, 0])
+        lon = np.array([-179, 120, 100, 100, 179, 180, 0])
+        res = _land_mask_lookup(land_mask, lat, lon)
+        self.assertTrue(np.array_equal(res, [True, False, False, True, True,
+                                             False, False]))
+
     def test_dist_to_coast(self):
         """ Test point in coast and point not in coast """
         res = dist_to_coast(13.208333333333329, -59.625000000000014)
@@ -188,6 +234,54 @@ class TestFunc(unittest.TestCase):
         res = dist_to_coast(-12.497529, -58.849505)
         self.assertAlmostEqual(1382985.2459744606, res[0])
 
+    def test_dist_to_coast_cached(self):
+        """ Test distances are written once and read afterwards """
+        lat = np.array([13.208333333333329, -12.497529])
+        lon = np.array([-59.625000000000014, -58.849505])
+        with tempfile.TemporaryDirectory() as cache_dir:
+            res = dist_to_coast_cached(lat, lon, cache_dir)
+            self.assertEqual(len(os.listdir(cache_dir)), 1)
+            res_read = dist_to_coast_cached(lat, lon, cache_dir)
+            self.assertEqual(len(os.listdir(cache_dir)), 1)
+            clear_dist_coast_cache(cache_dir)
+            self.assertEqual(len(os.listdir(cache_dir)), 0)
+        self.assertAlmostEqual(2594.2071059573445, res[0])
+        self.assertAlmostEqual(1382985.2459744606, res[1])
+        self.assertTrue(np.array_equal(res, res_read))
+
+    def test_save_file(self):
+        """ Test files are written complete or not at all """
+        with tempfile.TemporaryDirectory() as cache_dir:
+            file_name = os.path.join(cache_dir, 'sub', 'test.npy')
+            _save_file(file_name, lambda file: np.save(file, np.arange(3)))
+            self.assertTrue(np.array_equal(np.load(file_name), np.arange(3)))
+            def save_fail(file):
+                file.write(b'incomplete')
+                raise ValueError
+            with self.assertRaises(ValueError):
+                _save_file(file_name + '2', save_fail)
+            self.assertEqual(os.listdir(os.path.dirname(file_name)), ['test.npy'])
+
+    def test_dist_to_coast_raster(self):
+        """ Test interpolated distances are close to the exact ones """
+        lat = np.array([13.208333333333329, -12.497529])
+        lon = np.array([-59.625000000000014, -58.849505])
+        tmp_dir = self._tmp_grid_dir()
+        res = dist_to_coast_raster(lat, lon, res=1)
+        self.assertEqual(os.listdir(tmp_dir), ['dist_coast_grid_181x361.npy'])
+        self.assertEqual(res.size, 2)
+        # error of the order of the grid resolution
+        self.assertAlmostEqual(2594.2071059573445, res[0], delta=111000)
+        self.assertAlmostEqual(1382985.2459744606, res[1], delta=111000)
+
+    def test_interp_global_grid_pass(self):
+        """ Test bilinear interpolation in a global grid """
+        grid = np.tile(np.arange(5.), (3, 1)) + np.arange(3.)[:, np.newaxis] * 10
+        lat = np.array([-90, 0, 90, 45, 0])
+        lon = np.array([-180, 180, 0, -45, 179])
+        res = _interp_global_grid(grid, lat, lon)
+        self.assertTrue(np.allclose(res, [0, 10, 22, 16.5, 13.98888889]))
+
     def test_get_country_geometries_country_pass(self):
         """ get_country_geometries with selected countries. issues with the
         natural earth data should be caught by test_get_land_geometry_* since
@@ -410,6 +504,18 @@ class TestFunc(unittest.TestCase):
         self.assertEqual(np.count_nonzero(region_id), 6)
         self.assertTrue(np.allclose(region_id[:6], np.ones(6)*52)) # 052 for barbados
 
+    def test_country_code_precomputed_pass(self):
+        """ Test country codes from a coarse global grid """
+        tmp_dir = self._tmp_grid_dir()
+        self.addCleanup(setattr, u_coord, 'COUNTRY_GRID_RES', u_coord.COUNTRY_GRID_RES)
+        u_coord.COUNTRY_GRID_RES = 1
+        lat = np.array([46.8, 51.3, 0.4, -10.3])
+        lon = np.array([8.2, 10.4, -30.3, -55.4])
+        region_id = get_country_code(lat, lon, precomputed=True)
+        self.assertEqual(os.listdir(tmp_dir), ['country_code_grid_180x360.npy'])
+        self.assertTrue(np.array_equal(region_id, [756, 276, 0, 76]))
+        self.assertTrue(np.array_equal(region_id, get_country_code(lat, lon)))
+
     def test_convert_wgs_to_utm_pass(self):
         """ Test convert_wgs_to_utm """
         lat, lon = 17.346597, -62.768669
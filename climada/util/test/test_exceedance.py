@@ -0,0 +1,77 @@
+"""
+This file is part of CLIMADA.
+
+Copyright (C) 2017 ETH Zurich, CLIMADA contributors listed in AUTHORS.
+
+CLIMADA is free software: you can redistribute it and/or modify it under the
+terms of the GNU Lesser General Public License as published by the Free
+Software Foundation, version 3.
+
+CLIMADA is distributed in the hope that it will be useful, but WITHOUT ANY
+WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS FOR A
+PARTICULAR PURPOSE.  See the GNU Lesser General Public License for more details.
+
+You should have received a copy of the GNU Lesser General Public License along
+with CLIMADA. If not, see <https://www.gnu.org/licenses/>.
+
+---
+
+Test exceedance module.
+"""
+import unittest
+import numpy as np
+from scipy import sparse
+
+import climada.util.exceedance as u_exc
+
+def dense_exceedance(values, frequency, threshold, return_periods):
+    """ Exceedance values sorting every dense column """
+    values = values.toarray()
+    exc_val = np.zeros((return_periods.size, values.shape[1]))
+    for col_idx in range(values.shape[1]):
+        sort_pos = np.argsort(values[:, col_idx], kind='mergesort')[::-1]
+        exc_val[:, col_idx] = u_exc.cen_exceedance(values[sort_pos, col_idx], \
+            np.cumsum(frequency[sort_pos]), threshold, return_periods)
+    return exc_val
+
+class TestLocalExceedance(unittest.TestCase):
+    """Test local_exceedance against the fit of every column"""
+
+    def test_random_pass(self):
+        """ Compare sparse and dense computations """
+        return_periods = np.array([5, 25, 50, 100, 250, 1000])
+        rnd_gen = np.random.RandomState(8)
+        for density in [0.005, 0.05, 0.5]:
+            values = sparse.random(300, 200, density=density, format='csr',
+                                   random_state=rnd_gen) * 60
+            frequency = rnd_gen.random_sample(300) / 100
+            for threshold in [0, 20, -5]:
+                exc_val = u_exc.local_exceedance(values, frequency, threshold,
+                                                 return_periods)
+                self.assertEqual(exc_val.shape, (6, 200))
+                self.assertTrue(np.allclose(exc_val, dense_exceedance( \
+                    values, frequency, threshold, return_periods)))
+
+    def test_one_value_pass(self):
+        """ Columns with zero or one value above threshold """
+        return_periods = np.array([10, 100])
+        values = sparse.csr_matrix(np.array([[0, 3, 5], [0, 0, 1]]))
+        frequency = np.array([0.5, 0.01])
+        exc_val = u_exc.local_exceedance(values, frequency, 2, return_periods)
+        self.assertTrue(np.array_equal(exc_val[:, 0], np.zeros(2)))
+        self.assertTrue(np.allclose(exc_val[:, 1], np.polyval(np.polyfit( \
+            np.log([0.5]), [3], deg=1), np.log(1/return_periods))))
+        self.assertTrue(np.allclose(exc_val[:, 1], exc_val[:, 2] * 3 / 5))
+
+    def test_singular_fit_pass(self):
+        """ Value with cumulative frequency of one is fitted with polyfit """
+        return_periods = np.array([10, 100])
+        values = sparse.csr_matrix(np.array([[0, 3], [0, 0]]))
+        frequency = np.array([1, 0.5])
+        exc_val = u_exc.local_exceedance(values, frequency, 0, return_periods)
+        self.assertTrue(np.allclose(exc_val, np.array([[0, 3], [0, 3]])))
+
+# Execute Tests
+if __name__ == "__main__":
+    TESTS = unittest.TestLoader().loadTestsFromTestCase(TestLocalExceedance)
+    unittest.TextTestRunner(verbosity=2).run(TESTS)
@@ -229,6 +229,55 @@ class TestNN(unittest.TestCase):
         ''' Call repeat_coord_pass test for approxiamte distance'''
         self.repeat_coord_pass('approx')
 
+    def test_approx_brute_force_pass(self):
+        """ Compare approximate distance with a brute force search for
+        scattered centroids and regular grids """
+        def brute_force(centroids, coordinates, threshold):
+            cos_lat = np.cos(np.radians(centroids[:, 0]))
+            neighbors = np.zeros(coordinates.shape[0], int)
+            for i_coord, coord in enumerate(coordinates):
+                dist = interp.dist_sqr_approx(centroids[:, 0], centroids[:, 1],
+                                              cos_lat, coord[0], coord[1])
+                neighbors[i_coord] = dist.argmin()
+                if np.sqrt(dist.min()) * ONE_LAT_KM > threshold:
+                    neighbors[i_coord] = -1
+            return neighbors
+
+        rnd = np.random.RandomState(10)
+        coord = np.stack([rnd.uniform(-89, 89, 500), rnd.uniform(-40, 40, 500)], 1)
+        scattered = np.stack([rnd.uniform(-90, 90, 300), rnd.uniform(-30, 30, 300)], 1)
+        scattered = np.concatenate([scattered, scattered[:20], [[90, 0]]])
+        grid = np.array(np.meshgrid(np.arange(-80, 80, 2.5),
+                                    np.arange(-30, 30, 4.))).reshape(2, -1).T
+        rnd.shuffle(grid)
+        ties = np.concatenate([grid[:50] + [1.25, 0], grid[50:100] + [0, 2]])
+        for centroids in [scattered, grid]:
+            for threshold in [100, 1000, np.inf]:
+                neighbors = interp.index_nn_aprox(centroids, coord, threshold)
+                self.assertTrue(np.array_equal(neighbors, \
+                    brute_force(centroids, coord, threshold)))
+        neighbors = interp.index_nn_aprox(grid, ties, 1000)
+        self.assertTrue(np.array_equal(neighbors, brute_force(grid, ties, 1000)))
+
+    def test_spatial_index_pass(self):
+        """ Test SpatialIndex searches """
+        exposures, centroids = def_input_values()
+        sp_idx = interp.SpatialIndex(centroids)
+        self.assertTrue(np.array_equal(interp.interpol_index(sp_idx, exposures, \
+            'NN', 'approx'), def_ref()))
+        self.assertTrue(np.array_equal(interp.interpol_index(sp_idx, exposures, \
+            'NN', 'haversine'), def_ref()))
+        self.assertEqual(sp_idx.nn_planar(26.6, -80.4), 46)
+        # same distance to 35, 36, 45 and 46
+        self.assertEqual(sp_idx.nn_planar(26.5, -80.5), 35)
+
+        cos_lat = np.cos(np.radians(centroids[:, 0]))
+        for coord in exposures[::5]:
+            dist = interp.dist_approx(centroids[:, 0], centroids[:, 1], cos_lat,
+                                      coord[0], coord[1])
+            self.assertTrue(np.array_equal(sp_idx.within_aprox( \
+                coord[0], coord[1], 200), np.argwhere(dist < 200).reshape(-1)))
+
     def test_haver_normal_pass(self):
         ''' Call normal_pass test for haversine distance'''
         self.normal_pass('haversine')